@@ -1,10 +1,9 @@
 import datetime as dt
+import pathlib
 
 import matplotlib.dates as mdates
 import matplotlib.patheffects
 import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 import wamms
@@ -23,16 +22,28 @@ times = (dt.datetime(2027, 8, 1, 17), dt.datetime(2027, 8, 1, 21))
 mpo = wamms.spacecraft("mpo")
 mmo = wamms.spacecraft("mmo")
 
-region_predictions = pd.read_csv("./data/messenger_region_observations.csv")
+# This file contains the region predictions and spatial bin for the entire
+# MESSENGER mission. It was created with the script
+# resources/region_probabilities/create_messenger_dataset.py
+# Parsing the csv is slow, so the first time this is run, we convert it to a
+# binary format which is much faster to load.
+region_predictions_path = pathlib.Path("./data/messenger_region_observations")
+if not region_predictions_path.exists():
+    wamms.convert_prediction_data(
+        "./data/messenger_region_observations.csv", region_predictions_path
+    )
+region_predictions = wamms.load_prediction_data(region_predictions_path)
+
+# We only need to bin the MESSENGER data once, the resulting map can be shared
+# between spacecraft. This could also be saved with probability_map.save() and
+# reloaded later with wamms.RegionProbabilityMap.load()
+probability_map = wamms.RegionProbabilityMap.from_prediction_data(region_predictions)
 
 for spacecraft in [mpo, mmo]:
 
     spacecraft.update_trajectory(*times, dt.timedelta(minutes=1))
 
-    # This file contains the region predictions and spatial bin for the entire
-    # MESSENGER mission. It was created with the script
-    # resources/region_probabilities/create_messenger_dataset.py
-    spacecraft.prediction_data = region_predictions
+    spacecraft.probability_map = probability_map
 
     spacecraft.update_probabilities()
 
@@ -109,31 +120,8 @@ for ax in axes:
 
 # Plot trajectories
 
-# Create bins
-bin_size = 0.25
-x_bins = np.arange(-5, 5 + bin_size, bin_size)  # Radii
-cyl_bins = np.arange(0, 8 + bin_size, bin_size)  # Radii
-
-# Make histograms for each region prediction
-region_data = {"Names": ["Solar Wind", "Magnetosheath", "Magnetosphere"], "Data": {}}
-
-x_edges = []  # Just initialising to avoid LSP unbound variable errors
-y_edges = []
-for region_name in region_data["Names"]:
-
-    filtered_predictions = region_predictions.loc[
-        region_predictions["Predicted Region"] == region_name
-    ][["X MSM' (radii)", "CYL MSM' (radii)"]]
-
-    region_histogram, x_edges, y_edges = np.histogram2d(
-        filtered_predictions["X MSM' (radii)"],
-        filtered_predictions["CYL MSM' (radii)"],
-        bins=[x_bins, cyl_bins],
-    )
-
-    region_data["Data"][region_name] = region_histogram
-
-bin_totals = np.sum(list(region_data["Data"].values()), axis=0)
+x_edges = probability_map.x_edges
+y_edges = probability_map.cyl_edges
 plt.tight_layout()
 
 # Create totals (residence) plot
@@ -144,9 +132,7 @@ ax = axes[0][0]
 mesh = ax.pcolormesh(
     x_edges,
     y_edges,
-    bin_totals.T
-    * 5
-    / 3600,  # Each count here represents 5 seconds of data (as determined in the dataset generating script)
+    probability_map.residence_time.T / 3600,
     cmap="binary_r",
     shading="auto",
     norm="log",
@@ -159,7 +145,7 @@ fig.colorbar(mesh, cax=cax, label=f"Hours")
 ax.set_ylabel(
     r"$\left( Y_{\text{MSM'}}^2 + Z_{\text{MSM'}}^2 \right)^{0.5} \quad \left[ \text{R}_\text{M} \right]$"
 )
-ax.set_ylim(0, cyl_bins[-1])
+ax.set_ylim(0, y_edges[-1])
 # Set ax background hatching
 ax.axvspan(*ax.get_xlim(), color="#648FFF", alpha=0.1, zorder=-1)
 ax.set_title("MESSENGER's Residence")
@@ -168,9 +154,9 @@ ax.set_title("MESSENGER's Residence")
 all_axes = axes.flatten()
 axes = axes.flatten()[1:]
 
-for ax, region_name in zip(axes, region_data["Names"]):
-
-    region_ratio = region_data["Data"][region_name] / bin_totals
+for ax, region_name, region_ratio in zip(
+    axes, probability_map.region_names, probability_map.probabilities
+):
 
     mesh = ax.pcolormesh(
         x_edges,
@@ -199,7 +185,7 @@ for ax, region_name in zip(axes, region_data["Names"]):
     if ax in axes[1:]:
         ax.set_xlabel(r"$X_{\rm MSM'}$ [$R_M$]")
 
-    ax.set_ylim(0, cyl_bins[-1])
+    ax.set_ylim(0, y_edges[-1])
 
     # Set ax background
     ax.axvspan(*ax.get_xlim(), color="#648FFF", alpha=0.1, zorder=-1)
@@ -243,7 +229,7 @@ for ax in all_axes:
         arrowprops=dict(arrowstyle="-|>", color=wong_colours["pink"]),
     )
 
-    ax.set_xlim(x_bins[0], x_bins[-1])
+    ax.set_xlim(x_edges[0], x_edges[-1])
 
     ax.set_aspect("equal")
 
@@ -12,6 +12,8 @@ import numpy as np
 import pandas as pd
 from hermpy import mag, trajectory, utils
 
+import wamms
+
 # We want to first load the entire MESSENGER MISSION
 # It is most convenient to load the pre-saved mission file from hermpy
 # This is at one second resolution.
@@ -145,3 +147,14 @@ predicted_spatial_regions = (
 
 # Save this to file
 predicted_spatial_regions.to_csv("./messenger_region_observations.csv")
+
+# And in a binary format, which is much faster to load with
+# wamms.load_prediction_data()
+wamms.save_prediction_data(predicted_spatial_regions, "./messenger_region_observations")
+
+# We can also bin these once into a probability map, which can be loaded
+# directly with wamms.RegionProbabilityMap.load() and shared between
+# spacecraft.
+wamms.RegionProbabilityMap.from_prediction_data(
+    predicted_spatial_regions, sample_interval=downsample
+).save("./messenger_probability_map.npz")
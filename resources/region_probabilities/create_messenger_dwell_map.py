@@ -0,0 +1,48 @@
+"""
+An alternative to create_messenger_dataset.py, which creates the region
+probability map directly from the MESSENGER ephemeris and crossing list.
+
+Rather than labelling each (downsampled) ephemeris point with a region and
+histogramming these, we find the exact time MESSENGER spent in each region
+within each spatial bin. This is more accurate, and takes minutes rather than
+hours, so the map can be quickly rebuilt whenever the crossing list changes.
+
+Unlike create_messenger_dataset.py, intervals of magnetosphere ending in an
+UNPHYSICAL (MSp -> SW) crossing are included, as the misspelt region name in
+that script excludes them. The two maps therefore differ slightly in these
+bins, even at the same resolution.
+"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+from hermpy import mag, utils
+
+import wamms
+
+# Load the entire MESSENGER mission, at one second resolution. As we
+# integrate between samples, we could downsample this substantially without
+# much loss of accuracy.
+messenger_ephemeris = mag.Load_Mission(utils.User.DATA_DIRECTORIES["FULL MISSION"])
+messenger_ephemeris["Time"] = pd.to_datetime(messenger_ephemeris["date"])
+
+# Load Hollman et al. (in prep., 2025) crossing list
+crossings = pd.read_csv(
+    "/home/daraghhollman/Main/Work/mercury/Code/MESSENGER_Region_Detection/data/hollman_2025_crossing_list.csv"
+)
+crossings["Time"] = pd.to_datetime(crossings["Times"])
+
+probability_map = wamms.dwell_time_map(
+    messenger_ephemeris["Time"],
+    messenger_ephemeris["X MSM' (radii)"],
+    np.sqrt(
+        messenger_ephemeris["Y MSM' (radii)"] ** 2
+        + messenger_ephemeris["Z MSM' (radii)"] ** 2
+    ),
+    crossings[["Time", "Label"]],
+    # Any gaps in the ephemeris longer than this are not counted
+    max_gap=dt.timedelta(minutes=1),
+)
+
+probability_map.save("./messenger_dwell_time_map.npz")
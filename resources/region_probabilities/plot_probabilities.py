@@ -1,9 +1,10 @@
 import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
 from hermpy import plotting
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
+import wamms
+
 # Set limits on heliocentric distance. If either are set to -1, that bound will be ignored
 heliocentric_distance_bounds = [-1, -1]
 # heliocentric_distance_bounds = [0.3, 0.33]
@@ -12,51 +13,23 @@ heliocentric_distance_bounds = [-1, -1]
 # First load the messenger dataset
 region_predictions = pd.read_csv("./messenger_region_observations.csv")
 
-# Convert heliocentric distance from km to AU
-region_predictions["Heliocentric Distance"] = (
-    region_predictions["Heliocentric Distance"] * 6.684587e-9
+# Bin the observations once in X, CYL, and heliocentric distance. Maps for any
+# range of heliocentric distances can then be made from this cube, without
+# filtering and re-binning the dataset.
+probability_cube = wamms.RegionProbabilityCube.from_prediction_data(
+    region_predictions, distance_bin_size=0.01
 )
 
 # Limit in heliocentric distance
 if heliocentric_distance_bounds[0] == -1:
-    heliocentric_distance_bounds[0] = np.min(
-        region_predictions["Heliocentric Distance"]
-    )
+    heliocentric_distance_bounds[0] = probability_cube.distance_edges[0]
 
 if heliocentric_distance_bounds[1] == -1:
-    heliocentric_distance_bounds[1] = np.max(
-        region_predictions["Heliocentric Distance"]
-    )
-
-region_predictions = region_predictions.loc[
-    region_predictions["Heliocentric Distance"].between(*heliocentric_distance_bounds)
-]
-
-# Create bins
-bin_size = 0.25
-x_bins = np.arange(-5, 5 + bin_size, bin_size)  # Radii
-cyl_bins = np.arange(0, 8 + bin_size, bin_size)  # Radii
-
-# Make histograms for each region prediction
-region_data = {"Names": ["Solar Wind", "Magnetosheath", "Magnetosphere"], "Data": {}}
+    heliocentric_distance_bounds[1] = probability_cube.distance_edges[-1]
 
-x_edges = []  # Just initialising to avoid LSP unbound variable errors
-y_edges = []
-for region_name in region_data["Names"]:
-
-    filtered_predictions = region_predictions.loc[
-        region_predictions["Predicted Region"] == region_name
-    ][["X MSM' (radii)", "CYL MSM' (radii)"]]
-
-    region_histogram, x_edges, y_edges = np.histogram2d(
-        filtered_predictions["X MSM' (radii)"],
-        filtered_predictions["CYL MSM' (radii)"],
-        bins=[x_bins, cyl_bins],
-    )
-
-    region_data["Data"][region_name] = region_histogram
-
-bin_totals = np.sum(list(region_data["Data"].values()), axis=0)
+probability_map = probability_cube.map(heliocentric_distance_bounds)
+x_edges = probability_map.x_edges
+y_edges = probability_map.cyl_edges
 
 # Create totals (residence) plot
 fig, axes = plt.subplots(2, 2, sharex=True, sharey=True)
@@ -68,9 +41,7 @@ plotting.Format_Cylindrical_Plot(ax, size=5)
 mesh = ax.pcolormesh(
     x_edges,
     y_edges,
-    bin_totals.T
-    * 5
-    / 3600,  # Each count here represents 5 seconds of data (as determined in the dataset generating script)
+    probability_map.residence_time.T / 3600,
     cmap="binary_r",
     shading="auto",
     norm="log",
@@ -84,7 +55,7 @@ ax.set_xlabel(r"$X_{\rm MSM'}$ [$R_M$]")
 ax.set_ylabel(
     r"$\left( Y_{\text{MSM'}}^2 + Z_{\text{MSM'}}^2 \right)^{0.5} \quad \left[ \text{R}_\text{M} \right]$"
 )
-ax.set_ylim(0, cyl_bins[-1])
+ax.set_ylim(0, y_edges[-1])
 # Set ax background hatching
 ax.axvspan(*ax.get_xlim(), color="#648FFF", alpha=0.3, zorder=-1)
 ax.set_title("MESSENGER's Residence")
@@ -92,12 +63,12 @@ ax.set_title("MESSENGER's Residence")
 # Create plot
 axes = axes.flatten()[1:]
 
-for ax, region_name in zip(axes, region_data["Names"]):
+for ax, region_name, region_ratio in zip(
+    axes, probability_map.region_names, probability_map.probabilities
+):
 
     plotting.Format_Cylindrical_Plot(ax, size=5)
 
-    region_ratio = region_data["Data"][region_name] / bin_totals
-
     mesh = ax.pcolormesh(
         x_edges,
         y_edges,
@@ -125,7 +96,7 @@ for ax, region_name in zip(axes, region_data["Names"]):
     if ax in axes[1:]:
         ax.set_xlabel(r"$X_{\rm MSM'}$ [$R_M$]")
 
-    ax.set_ylim(0, cyl_bins[-1])
+    ax.set_ylim(0, y_edges[-1])
 
     # Set ax background hatching
     ax.axvspan(*ax.get_xlim(), color="#648FFF", alpha=0.3, zorder=-1)
@@ -0,0 +1,192 @@
+import numpy as np
+import pytest
+
+# The leap seconds of naif0012.tls, so that time conversions can be checked
+# without downloading any kernels.
+LEAPSECONDS_KERNEL = r"""KPL/LSK
+
+\begindata
+
+DELTET/DELTA_T_A       =   32.184
+DELTET/K               =    1.657D-3
+DELTET/EB              =    1.671D-2
+DELTET/M               = (  6.239996D0   1.99096871D-7 )
+
+DELTET/DELTA_AT        = ( 10,   @1972-JAN-1
+                           11,   @1972-JUL-1
+                           12,   @1973-JAN-1
+                           13,   @1974-JAN-1
+                           14,   @1975-JAN-1
+                           15,   @1976-JAN-1
+                           16,   @1977-JAN-1
+                           17,   @1978-JAN-1
+                           18,   @1979-JAN-1
+                           19,   @1980-JAN-1
+                           20,   @1981-JUL-1
+                           21,   @1982-JUL-1
+                           22,   @1983-JUL-1
+                           23,   @1985-JUL-1
+                           24,   @1988-JAN-1
+                           25,   @1990-JAN-1
+                           26,   @1991-JAN-1
+                           27,   @1992-JUL-1
+                           28,   @1993-JUL-1
+                           29,   @1994-JUL-1
+                           30,   @1996-JAN-1
+                           31,   @1997-JUL-1
+                           32,   @1999-JAN-1
+                           33,   @2006-JAN-1
+                           34,   @2009-JAN-1
+                           35,   @2012-JUL-1
+                           36,   @2015-JUL-1
+                           37,   @2017-JAN-1 )
+
+\begintext
+"""
+
+
+@pytest.fixture
+def leapseconds_kernel(tmp_path):
+    """Write a leap seconds kernel, returning its path"""
+
+    kernel = tmp_path / "naif0012.tls"
+    kernel.write_text(LEAPSECONDS_KERNEL)
+
+    return kernel
+
+
+@pytest.fixture
+def leapseconds(leapseconds_kernel):
+    """Load a leap seconds kernel for the duration of a test, skipping the
+    test if SPICE isn't available"""
+
+    spice = pytest.importorskip("spiceypy")
+
+    spice.furnsh(str(leapseconds_kernel))
+    yield spice
+    spice.unload(str(leapseconds_kernel))
+
+
+# A frame kernel for the frames and bodies used by wamms. The MSO frames are
+# aligned with J2000, so that positions can be checked by hand.
+FRAMES_KERNEL = r"""KPL/FK
+
+\begindata
+
+NAIF_BODY_NAME += ( 'MPO', 'MMO' )
+NAIF_BODY_CODE += ( -121, -68 )
+
+FRAME_BC_MSO = 1500001
+FRAME_1500001_NAME = 'BC_MSO'
+FRAME_1500001_CLASS = 4
+FRAME_1500001_CLASS_ID = 1500001
+FRAME_1500001_CENTER = 199
+TKFRAME_1500001_RELATIVE = 'J2000'
+TKFRAME_1500001_SPEC = 'MATRIX'
+TKFRAME_1500001_MATRIX = ( 1 0 0 0 1 0 0 0 1 )
+
+FRAME_BC_MSO_AB = 1500002
+FRAME_1500002_NAME = 'BC_MSO_AB'
+FRAME_1500002_CLASS = 4
+FRAME_1500002_CLASS_ID = 1500002
+FRAME_1500002_CENTER = 199
+TKFRAME_1500002_RELATIVE = 'J2000'
+TKFRAME_1500002_SPEC = 'MATRIX'
+TKFRAME_1500002_MATRIX = ( 1 0 0 0 1 0 0 0 1 )
+
+\begintext
+"""
+
+
+class SyntheticKernels:
+    """A metakernel in which Mercury, MPO and MMO move in straight lines,
+    for +/- 30 days around reference_et (2027-01-01T00:00:00 UTC)
+
+    Params
+    ------
+    metakernel: pathlib.Path
+        The metakernel file
+
+    reference_et: float
+        Ephemeris time of reference_utc
+    """
+
+    reference_utc = "2027-01-01T00:00:00"
+    span = 30 * 86400
+
+    # States (km, km/s) at reference_et of each body, relative to its centre, in
+    # J2000
+    states = {
+        # Relative to the Sun
+        "MERCURY": ((5.8e7, 0, 0), (10, -47, 0)),
+        # Relative to Mercury
+        "MPO": ((2000, -1000, -479), (0.5, 0.25, 0)),
+        "MMO": ((-3000, 4000, 1000), (0, -0.5, 0.1)),
+    }
+    codes = {"MERCURY": (199, 10), "MPO": (-121, 199), "MMO": (-68, 199)}
+
+    def __init__(self, metakernel, reference_et):
+        self.metakernel = metakernel
+        self.reference_et = reference_et
+
+    def position(self, name, spice_times):
+        """Position (km) of a body relative to its centre"""
+
+        position, velocity = (np.array(vector) for vector in self.states[name])
+        elapsed = np.asarray(spice_times, dtype=float) - self.reference_et
+
+        return position + elapsed[:, None] * velocity
+
+
+@pytest.fixture(scope="session")
+def synthetic_kernels(tmp_path_factory):
+    """Write SyntheticKernels, skipping if SPICE isn't available"""
+
+    spice = pytest.importorskip("spiceypy")
+
+    directory = tmp_path_factory.mktemp("kernels")
+
+    (directory / "naif0012.tls").write_text(LEAPSECONDS_KERNEL)
+    (directory / "frames.tf").write_text(FRAMES_KERNEL)
+
+    spice.furnsh(str(directory / "naif0012.tls"))
+    reference_et = spice.str2et(SyntheticKernels.reference_utc)
+    spice.unload(str(directory / "naif0012.tls"))
+
+    # Straight lines are represented exactly by linear Lagrange
+    # interpolation between the states at either end of the span
+    handle = spice.spkopn(str(directory / "ephemeris.bsp"), "wamms tests", 0)
+    start = reference_et - SyntheticKernels.span
+    for name, (position, velocity) in SyntheticKernels.states.items():
+        body, centre = SyntheticKernels.codes[name]
+        states = [
+            np.concatenate([np.add(position, elapsed * np.array(velocity)), velocity])
+            for elapsed in (-SyntheticKernels.span, SyntheticKernels.span)
+        ]
+        spice.spkw08(
+            handle,
+            body,
+            centre,
+            "J2000",
+            start,
+            reference_et + SyntheticKernels.span,
+            name,
+            1,
+            2,
+            states,
+            start,
+            2 * SyntheticKernels.span,
+        )
+    spice.spkcls(handle)
+
+    metakernel = directory / "synthetic.tm"
+    metakernel.write_text(
+        "KPL/MK\n\n\\begindata\n\nKERNELS_TO_LOAD = (\n"
+        + "".join(
+            f"    '{directory / name}'\n"
+            for name in ("naif0012.tls", "frames.tf", "ephemeris.bsp")
+        )
+        + ")\n\n\\begintext\n"
+    )
+
+    return SyntheticKernels(metakernel, reference_et)
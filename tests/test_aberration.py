@@ -0,0 +1,50 @@
+import numpy as np
+
+from wamms.aberration import aberrate_positions, aberration_angles
+from wamms.kernels import KernelSession
+
+SOLAR_WIND_SPEED_KMS = 400
+
+
+def expected_angles(synthetic_kernels, spice_times):
+    # Mercury's velocity is constant, and only its position changes
+    positions = synthetic_kernels.position("MERCURY", spice_times)
+    velocity = np.array(synthetic_kernels.states["MERCURY"][1])
+
+    radial = positions @ velocity / np.linalg.norm(positions, axis=1)
+    tangential = np.sqrt(velocity @ velocity - radial**2)
+
+    return np.arctan2(-tangential, SOLAR_WIND_SPEED_KMS - radial)
+
+
+def test_aberration_angles(synthetic_kernels):
+    grid_times = 86400 * np.arange(
+        np.ceil(synthetic_kernels.reference_et / 86400) - 5,
+        np.ceil(synthetic_kernels.reference_et / 86400) + 5,
+    )
+    midpoints = (grid_times[:-1] + grid_times[1:]) / 2
+
+    with KernelSession(str(synthetic_kernels.metakernel)):
+        angles = aberration_angles(grid_times, SOLAR_WIND_SPEED_KMS)
+        midpoint_angles = aberration_angles(midpoints, SOLAR_WIND_SPEED_KMS)
+
+    assert np.allclose(angles, expected_angles(synthetic_kernels, grid_times))
+
+    # Roughly -atan(47 / 390)
+    assert np.all((angles < -0.1) & (angles > -0.15))
+
+    # Between grid points, the angle is interpolated
+    assert np.allclose(midpoint_angles, (angles[:-1] + angles[1:]) / 2)
+
+
+def test_aberrate_positions():
+    angles = np.array([-0.1, 0, 0.3])
+    positions = np.column_stack([2 * np.cos(angles), 2 * np.sin(angles), [1, 2, 3]])
+
+    aberrated = aberrate_positions(positions, angles)
+
+    # Positions along the apparent solar wind direction end up along +X
+    assert np.allclose(aberrated, [[2, 0, 1], [2, 0, 2], [2, 0, 3]])
+    assert np.allclose(
+        np.linalg.norm(aberrated, axis=1), np.linalg.norm(positions, axis=1)
+    )
@@ -0,0 +1,63 @@
+import numpy as np
+
+from wamms.adaptive import probabilities_differ, refine_samples
+
+
+def test_refine_samples_around_steps():
+    # A step from 0 to 1 between indices 436 and 437
+    evaluated = []
+
+    def evaluate(indices):
+        evaluated.append(len(indices))
+        return (np.asarray(indices) >= 437).astype(float)[:, None]
+
+    def needs_refinement(start_values, end_values):
+        return np.any(start_values != end_values, axis=1)
+
+    indices, values = refine_samples(1000, 64, evaluate, needs_refinement)
+
+    assert np.all(np.diff(indices) > 0)
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.array_equal(values[:, 0], indices >= 437)
+
+    # The step is resolved to neighbouring indices
+    assert {436, 437} <= set(indices)
+
+    # One coarse pass, then one sample per level of bisection
+    assert evaluated == [17, 1, 1, 1, 1, 1, 1]
+
+
+def probabilities_differ_zero(start_values, end_values):
+    return probabilities_differ(start_values, end_values, threshold=0)
+
+
+def test_refine_samples_without_changes():
+    indices, values = refine_samples(
+        10, 4, lambda indices: np.zeros((len(indices), 3)), probabilities_differ_zero
+    )
+
+    assert np.array_equal(indices, [0, 4, 8, 9])
+    assert values.shape == (4, 3)
+
+
+def test_refine_no_samples():
+    indices, values = refine_samples(
+        0, 4, lambda indices: np.zeros((len(indices), 3)), probabilities_differ_zero
+    )
+
+    assert len(indices) == 0
+    assert values.shape == (0, 3)
+
+
+def test_probabilities_differ():
+    start = np.array(
+        [[0.5, 0.3, 0.2], [0.5, 0.3, 0.2], [0.5, 0.45, 0.05], [np.nan] * 3]
+    )
+    end = np.array([[0.52, 0.28, 0.2], [0.2, 0.6, 0.2], [0.45, 0.5, 0.05], [1, 0, 0]])
+
+    assert list(probabilities_differ(start, end, threshold=0.1)) == [
+        False,  # Small change
+        True,  # Large change
+        True,  # Most probable region changes
+        True,  # Enters the map
+    ]
@@ -0,0 +1,126 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from wamms.builders import build_map_chunked, dwell_time_map, region_intervals
+
+START = np.datetime64("2012-01-01T00:00:00", "ns")
+
+
+def seconds(values):
+    return START + np.asarray(values) * np.timedelta64(1, "s")
+
+
+def test_region_intervals_drop_inconsistent_crossings():
+    crossings = pd.DataFrame(
+        {
+            "Time": seconds([0, 35, 100, 200]),
+            # MP_OUT then BS_IN disagree on the region between them
+            "Label": ["BS_IN", "MP_IN", "MP_OUT", "BS_IN"],
+        }
+    )
+
+    intervals = region_intervals(crossings)
+
+    assert list(intervals["Region"]) == ["Magnetosheath", "Magnetosphere"]
+    assert np.array_equal(intervals["Start Time"], seconds([0, 35]))
+    assert np.array_equal(intervals["End Time"], seconds([35, 100]))
+
+
+def test_unphysical_crossings_end_magnetosphere_intervals():
+    crossings = pd.DataFrame(
+        {
+            "Time": seconds([0, 100, 150]),
+            "Label": ["MP_IN", "UNPHYSICAL (MSp -> SW)", "BS_IN"],
+        }
+    )
+
+    intervals = region_intervals(crossings)
+
+    assert list(intervals["Region"]) == ["Magnetosphere", "Solar Wind"]
+
+
+def dwell_time_example(sample_seconds):
+    # The spacecraft moves along X from -0.55 to 0.45 radii over 100 s,
+    # crossing the bin edge at X = 0 after 55 s, with an MP_IN crossing at
+    # 35 s.
+    sample_seconds = np.asarray(sample_seconds, dtype=float)
+
+    crossings = pd.DataFrame(
+        {"Time": seconds([0, 35, 100]), "Label": ["BS_IN", "MP_IN", "MP_OUT"]}
+    )
+
+    return dwell_time_map(
+        seconds(sample_seconds),
+        -0.55 + sample_seconds / 100,
+        np.full(len(sample_seconds), 0.5),
+        crossings,
+        bin_size=1,
+        max_gap=dt.timedelta(seconds=15),
+    )
+
+
+def test_dwell_time_splits_at_bin_edges_and_crossings():
+    probability_map = dwell_time_example(np.arange(0, 101, 10))
+
+    magnetosheath, magnetosphere = 1, 2
+    x_below, x_above = 4, 5
+
+    assert probability_map.sample_interval == 1
+    assert np.isclose(probability_map.counts[magnetosheath, x_below, 0], 35)
+    assert np.isclose(probability_map.counts[magnetosphere, x_below, 0], 20)
+    assert np.isclose(probability_map.counts[magnetosphere, x_above, 0], 45)
+    assert np.isclose(probability_map.counts.sum(), 100)
+
+
+def test_dwell_time_skips_data_gaps():
+    # Without the samples at 60 and 70 s, the 30 s from 50 to 80 s is a gap
+    probability_map = dwell_time_example([0, 10, 20, 30, 40, 50, 80, 90, 100])
+
+    assert np.isclose(probability_map.counts[2, 4, 0], 15)
+    assert np.isclose(probability_map.counts[2, 5, 0], 20)
+    assert np.isclose(probability_map.counts.sum(), 70)
+
+
+def chunked_example(chunk_sizes, **kwargs):
+    sample_seconds = np.arange(0, 101, 10)
+
+    ephemeris = pd.DataFrame(
+        {
+            "Time": seconds(sample_seconds),
+            "X MSM' (radii)": -0.55 + sample_seconds / 100,
+            "Y MSM' (radii)": np.full(len(sample_seconds), 0.3),
+            "Z MSM' (radii)": np.full(len(sample_seconds), 0.4),
+        }
+    )
+    chunk_starts = np.cumsum([0] + chunk_sizes[:-1])
+    chunks = [
+        ephemeris.iloc[start : start + size]
+        for start, size in zip(chunk_starts, chunk_sizes)
+    ]
+
+    crossings = pd.DataFrame(
+        {"Time": seconds([0, 35, 100]), "Label": ["BS_IN", "MP_IN", "MP_OUT"]}
+    )
+
+    return build_map_chunked(chunks, crossings, bin_size=1, **kwargs)
+
+
+def test_chunked_dwell_time_matches_single_pass():
+    probability_map = chunked_example(
+        [3, 1, 5, 2], method="dwell", max_gap=dt.timedelta(seconds=15)
+    )
+
+    assert np.allclose(
+        probability_map.counts, dwell_time_example(np.arange(0, 101, 10)).counts
+    )
+
+
+def test_chunked_samples():
+    probability_map = chunked_example([4, 7], sample_interval=10)
+
+    # The sample at 100 s is at the end of the last interval, so isn't counted
+    assert probability_map.sample_interval == 10
+    assert np.array_equal(probability_map.counts[:, 4, 0], [0, 4, 2])
+    assert np.array_equal(probability_map.counts[:, 5, 0], [0, 0, 4])
@@ -0,0 +1,97 @@
+import os
+import pathlib
+
+import numpy as np
+
+from wamms.cache import EphemerisCache
+
+
+def positions(n_samples):
+    return np.arange(3 * n_samples, dtype=float).reshape(n_samples, 3)
+
+
+def test_round_trip(tmp_path):
+    cache = EphemerisCache(tmp_path / "cache")
+    metakernel = tmp_path / "metakernel.tm"
+    metakernel.write_text("kernels")
+
+    key = cache.key(metakernel, target="mpo", start="2027-01-01")
+
+    assert cache.get(key) is None
+
+    cache.put(key, positions(10))
+
+    assert np.array_equal(cache.get(key), positions(10))
+    assert cache.key(metakernel, start="2027-01-01", target="mpo") == key
+    assert cache.key(metakernel, target="mmo", start="2027-01-01") != key
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = EphemerisCache(tmp_path)
+
+    cache.put("a", positions(100))
+    cache.put("b", positions(100))
+    cache.max_size = 2.5 * cache.size / 2
+
+    # "a" was written first, but read since "b" was written
+    os.utime(tmp_path / "a.npz", (1000, 1000))
+    os.utime(tmp_path / "b.npz", (2000, 2000))
+    cache.get("a")
+
+    cache.put("c", positions(100))
+
+    assert [path.stem for path in cache.entries()] == ["a", "c"]
+    assert cache.get("b") is None
+
+
+def test_prune_removes_stale_entries(tmp_path):
+    cache = EphemerisCache(tmp_path / "cache")
+    metakernel = tmp_path / "metakernel.tm"
+
+    metakernel.write_text("old kernels")
+    old_key = cache.key(metakernel, target="mpo")
+    cache.put(old_key, positions(10))
+
+    metakernel.write_text("new kernels, released later")
+    new_key = cache.key(metakernel, target="mpo")
+    cache.put(new_key, positions(10))
+
+    assert new_key != old_key
+
+    cache.prune(metakernel)
+
+    assert cache.get(old_key) is None
+    assert cache.get(new_key) is not None
+
+
+def test_vanished_entries_are_skipped(tmp_path):
+    cache = EphemerisCache(tmp_path)
+    cache.put("a", positions(10))
+
+    # An entry which disappears between being listed and being read
+    (tmp_path / "b.npz").symlink_to(tmp_path / "missing.npz")
+
+    assert [path.stem for path in cache.entries()] == ["a"]
+    assert cache.size == (tmp_path / "a.npz").stat().st_size
+
+    cache.max_size = 0
+    cache.evict()
+
+    assert cache.entries() == []
+
+
+def test_entry_removed_after_reading(tmp_path, monkeypatch):
+    cache = EphemerisCache(tmp_path)
+    cache.put("a", positions(10))
+
+    # Another process evicts the entry between it being read and touched
+    utime = os.utime
+
+    def evict_then_utime(path, *args, **kwargs):
+        pathlib.Path(path).unlink()
+        utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "utime", evict_then_utime)
+
+    assert np.array_equal(cache.get("a"), positions(10))
+    assert cache.entries() == []
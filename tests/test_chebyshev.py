@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from wamms.chebyshev import ChebyshevEphemeris
+
+PERIOD = 2.3 * 3600
+
+
+def orbit(spice_times):
+    # An eccentric orbit, which moves fastest near t = 0, PERIOD, ...
+    spice_times = np.asarray(spice_times, dtype=float)
+    eccentric_anomaly = 2 * np.pi * spice_times / PERIOD
+    eccentric_anomaly = eccentric_anomaly + 0.5 * np.sin(eccentric_anomaly)
+
+    return np.column_stack(
+        [
+            4000 * np.cos(eccentric_anomaly),
+            3000 * np.sin(eccentric_anomaly),
+            np.full(len(spice_times), 479),
+        ]
+    )
+
+
+def test_fit_is_within_tolerance():
+    ephemeris = ChebyshevEphemeris.fit(orbit, 0, 86400, tolerance=1e-3)
+
+    assert ephemeris.start == 0
+    assert ephemeris.end == 86400
+    assert np.array_equal(ephemeris.segment_starts[1:], ephemeris.segment_ends[:-1])
+
+    spice_times = np.random.default_rng(0).uniform(0, 86400, 100_000)
+    errors = np.linalg.norm(
+        ephemeris.evaluate(spice_times) - orbit(spice_times), axis=1
+    )
+
+    # The fit is only checked between its nodes, so allow some margin
+    assert np.max(errors) < 2e-3
+
+
+def test_evaluate_outside_of_span():
+    ephemeris = ChebyshevEphemeris.fit(orbit, 0, 3600, tolerance=1)
+
+    with pytest.raises(ValueError):
+        ephemeris.evaluate([3601])
+
+
+def test_fit_fails_for_discontinuities():
+    def jump(spice_times):
+        return orbit(spice_times) + 100 * (np.asarray(spice_times) > 1800)[:, None]
+
+    with pytest.raises(RuntimeError):
+        ChebyshevEphemeris.fit(jump, 0, 3600, tolerance=1)
+
+
+def test_fit_is_saved(tmp_path):
+    ephemeris = ChebyshevEphemeris.fit(orbit, 0, 86400, tolerance=1e-3)
+    ephemeris.save(tmp_path / "fit.npz")
+
+    loaded = ChebyshevEphemeris.load(tmp_path / "fit.npz")
+
+    spice_times = np.linspace(0, 86400, 1000)
+    assert np.array_equal(loaded.evaluate(spice_times), ephemeris.evaluate(spice_times))
+    assert loaded.tolerance == ephemeris.tolerance
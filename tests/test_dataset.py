@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from wamms.dataset import (
+    convert_prediction_data,
+    load_prediction_data,
+    save_prediction_data,
+)
+
+
+def prediction_data_example(n_rows=1000):
+    rng = np.random.default_rng(0)
+
+    return pd.DataFrame(
+        {
+            "Time": pd.date_range("2012-01-01", periods=n_rows, freq="5s"),
+            "Predicted Region": rng.choice(
+                ["Solar Wind", "Magnetosheath", "Magnetosphere"], n_rows
+            ),
+            "Heliocentric Distance": rng.uniform(0.3, 0.47, n_rows),
+            "X MSM' (radii)": rng.uniform(-5, 5, n_rows),
+            "CYL MSM' (radii)": rng.uniform(0, 8, n_rows),
+        }
+    )
+
+
+def assert_matches(loaded, prediction_data):
+    assert list(loaded.columns) == [
+        "Predicted Region",
+        "Heliocentric Distance",
+        "X MSM' (radii)",
+        "CYL MSM' (radii)",
+    ]
+    assert list(loaded["Predicted Region"]) == list(prediction_data["Predicted Region"])
+
+    for column in loaded.columns[1:]:
+        assert np.allclose(loaded[column], prediction_data[column], rtol=1e-6)
+
+
+def test_convert_round_trip(tmp_path):
+    prediction_data = prediction_data_example()
+    prediction_data.to_csv(tmp_path / "observations.csv", index=False)
+
+    # Several chunks, the last of which is partial
+    convert_prediction_data(
+        tmp_path / "observations.csv", tmp_path / "converted", chunksize=300
+    )
+
+    for mmap in (True, False):
+        loaded = load_prediction_data(tmp_path / "converted", mmap=mmap)
+
+        assert_matches(loaded, prediction_data)
+        assert isinstance(loaded["Predicted Region"].dtype, pd.CategoricalDtype)
+
+
+def test_save_round_trip(tmp_path):
+    prediction_data = prediction_data_example()
+
+    save_prediction_data(prediction_data, tmp_path)
+
+    assert_matches(load_prediction_data(tmp_path), prediction_data)
+
+
+def test_unknown_regions_are_missing(tmp_path):
+    prediction_data = prediction_data_example(3)
+    prediction_data["Predicted Region"] = ["Solar Wind", "Unknown", "Magnetosphere"]
+
+    save_prediction_data(prediction_data, tmp_path)
+    loaded = load_prediction_data(tmp_path)
+
+    assert loaded["Predicted Region"].isna().tolist() == [False, True, False]
@@ -0,0 +1,30 @@
+import numpy as np
+
+from wamms.events import bisect_transitions, transition_label
+
+
+def test_transition_labels():
+    assert transition_label("Solar Wind", "Magnetosheath") == "BS_IN"
+    assert transition_label("Magnetosheath", "Magnetosphere") == "MP_IN"
+    assert transition_label("Magnetosphere", "Magnetosheath") == "MP_OUT"
+    assert transition_label("Magnetosheath", "Solar Wind") == "BS_OUT"
+
+
+def test_bisect_transitions():
+    # States change at 12.3 s (0 -> 1) and 47.9 s (1 -> 2)
+    def state_at(times):
+        return np.digitize(times, [12.3, 47.9])
+
+    times, states_before, states_after = bisect_transitions(
+        state_at, [10, 40], [20, 50], [0, 1], [1, 2], tolerance=0.01
+    )
+
+    assert np.allclose(times, [12.3, 47.9], atol=0.01)
+    assert np.array_equal(states_before, [0, 1])
+    assert np.array_equal(states_after, [1, 2])
+
+
+def test_bisect_no_transitions():
+    times, _, _ = bisect_transitions(np.sign, [], [], [], [], tolerance=1)
+
+    assert len(times) == 0
@@ -0,0 +1,56 @@
+import datetime as dt
+
+import numpy as np
+
+from wamms.fleets import fleet
+from wamms.maps import RegionProbabilityMap
+
+MERCURY_RADIUS_KM = 2439.7
+DIPOLE_OFFSET_KM = 479
+
+
+def test_joint_trajectory(synthetic_kernels):
+    # Dayside and nightside bins, with different region probabilities
+    counts = np.array([[[1], [3]], [[1], [1]], [[2], [0]]])
+    probability_map = RegionProbabilityMap([-5, 0, 5], [0, 8], counts)
+
+    bepicolombo = fleet(
+        ["mpo", "mmo"],
+        str(synthetic_kernels.metakernel),
+        probability_map=probability_map,
+    )
+
+    start = dt.datetime(2027, 1, 1)
+    trajectory = bepicolombo.joint_trajectory(
+        start, start + dt.timedelta(hours=1), dt.timedelta(minutes=10), aberrate=False
+    )
+
+    assert len(trajectory) == 6
+    assert trajectory["Time"].iloc[-1] == np.datetime64("2027-01-01T00:50:00")
+
+    spice_times = synthetic_kernels.reference_et + np.arange(6) * 600
+    positions = {}
+    for name in ["mpo", "mmo"]:
+        positions[name] = synthetic_kernels.position(name.upper(), spice_times)
+        positions[name][:, 2] += DIPOLE_OFFSET_KM
+        positions[name] /= MERCURY_RADIUS_KM
+
+        for i, axis in enumerate("XYZ"):
+            assert np.allclose(
+                trajectory[f"{name} {axis} MSM'"], positions[name][:, i], atol=1e-6
+            )
+
+    assert np.allclose(
+        trajectory["mpo-mmo Separation"],
+        np.linalg.norm(positions["mpo"] - positions["mmo"], axis=1),
+    )
+
+    # MPO stays on the dayside, and MMO on the nightside
+    assert np.allclose(trajectory["mpo Solar Wind"], 0.75)
+    assert np.allclose(trajectory["mmo Magnetosphere"], 0.5)
+    assert np.allclose(trajectory["mpo Solar Wind & mmo Magnetosphere"], 0.375)
+    assert np.allclose(trajectory["mpo Magnetosphere & mmo Solar Wind"], 0)
+
+    joint_columns = [column for column in trajectory.columns if " & " in column]
+    assert len(joint_columns) == 9
+    assert np.allclose(trajectory[joint_columns].sum(axis=1), 1)
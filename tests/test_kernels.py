@@ -0,0 +1,40 @@
+import pytest
+
+from wamms.kernels import KernelSession
+
+
+def test_sessions_share_one_load(leapseconds_kernel):
+    spice = pytest.importorskip("spiceypy")
+    loaded_before = spice.ktotal("ALL")
+
+    first = KernelSession(leapseconds_kernel).open()
+    second = KernelSession(leapseconds_kernel).open()
+
+    # Opening a session twice doesn't count it twice
+    first.open()
+
+    assert spice.ktotal("ALL") == loaded_before + 1
+    assert KernelSession._reference_counts[first.kernels] == 2
+
+    first.close()
+    first.close()
+
+    assert spice.ktotal("ALL") == loaded_before + 1
+    assert second.is_open
+
+    second.close()
+
+    assert spice.ktotal("ALL") == loaded_before
+    assert first.kernels not in KernelSession._reference_counts
+
+
+def test_session_context_manager(leapseconds_kernel):
+    spice = pytest.importorskip("spiceypy")
+    loaded_before = spice.ktotal("ALL")
+
+    with KernelSession(leapseconds_kernel) as session:
+        assert session.is_open
+        assert spice.ktotal("ALL") == loaded_before + 1
+
+    assert not session.is_open
+    assert spice.ktotal("ALL") == loaded_before
@@ -0,0 +1,298 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wamms.constants import load_constants
+from wamms.main import spacecraft
+from wamms.maps import RegionProbabilityCube, RegionProbabilityMap
+
+START = dt.datetime(2027, 1, 1)
+
+
+def make_mpo(synthetic_kernels):
+    # Only the bin from X = 1 to 2 radii is likely magnetosheath
+    counts = np.zeros((3, 3, 1))
+    counts[:, 1, 0] = [1, 9, 0]
+    counts[0, [0, 2], 0] = 1
+
+    return spacecraft(
+        "mpo",
+        str(synthetic_kernels.metakernel),
+        probability_map=RegionProbabilityMap([-5, 1, 2, 5], [0, 8], counts),
+    )
+
+
+def utc(seconds):
+    return np.datetime64(START, "ns") + np.round(seconds * 1e9).astype(
+        "timedelta64[ns]"
+    )
+
+
+def test_find_intervals(synthetic_kernels):
+    # MPO moves along X at 0.5 km/s from 2000 km, so crosses X = 1 radius
+    # (2439.7 km) after 879.4 s, and X = 2 radii after 5758.8 s
+    starts, ends = make_mpo(synthetic_kernels).find_intervals(
+        START, START + dt.timedelta(hours=3), "Magnetosheath", 0.8
+    )
+
+    assert len(starts) == 1
+    assert abs(starts[0] - utc(879.4)) < np.timedelta64(1, "s")
+    assert abs(ends[0] - utc(5758.8)) < np.timedelta64(1, "s")
+
+
+def test_find_intervals_min_duration(synthetic_kernels):
+    mpo = make_mpo(synthetic_kernels)
+
+    starts, _ = mpo.find_intervals(
+        START,
+        START + dt.timedelta(hours=3),
+        "Magnetosheath",
+        0.8,
+        min_duration=dt.timedelta(hours=1, minutes=30),
+    )
+    assert len(starts) == 0
+
+    # The probability is never above 0.9
+    starts, _ = mpo.find_intervals(
+        START, START + dt.timedelta(hours=3), "Magnetosheath", 0.9
+    )
+    assert len(starts) == 0
+
+
+def test_find_intervals_are_clipped(synthetic_kernels):
+    start = START + dt.timedelta(minutes=30)
+    end = START + dt.timedelta(hours=1)
+
+    starts, ends = make_mpo(synthetic_kernels).find_intervals(
+        start, end, "Magnetosheath", 0.8
+    )
+
+    assert np.array_equal(starts, [np.datetime64(start, "ns")])
+    assert np.array_equal(ends, [np.datetime64(end, "ns")])
+
+
+def test_find_intervals_reversed_range(synthetic_kernels):
+    with pytest.raises(ValueError):
+        make_mpo(synthetic_kernels).find_intervals(
+            START + dt.timedelta(hours=1), START, "Magnetosheath", 0.8
+        )
+
+
+def test_find_transitions(synthetic_kernels):
+    mpo = make_mpo(synthetic_kernels)
+    end = START + dt.timedelta(hours=3)
+
+    transitions = mpo.find_transitions(START, end)
+
+    assert list(transitions["Label"]) == ["BS_IN", "BS_OUT"]
+    assert list(transitions["Region After"]) == ["Magnetosheath", "Solar Wind"]
+    assert np.all(
+        np.abs(transitions["Time"] - utc(np.array([879.4, 5758.8])))
+        < np.timedelta64(1, "s")
+    )
+
+    transitions = mpo.find_transitions(
+        START, end, region="Magnetosheath", threshold=0.8
+    )
+    assert list(transitions["Label"]) == ["ENTRY", "EXIT"]
+
+
+def test_find_transitions_reversed_range(synthetic_kernels):
+    with pytest.raises(ValueError):
+        make_mpo(synthetic_kernels).find_transitions(
+            START + dt.timedelta(hours=1), START
+        )
+
+
+def test_probability_bands_follow_the_map(synthetic_kernels):
+    mpo = make_mpo(synthetic_kernels)
+    mpo.probability_bands = True
+    mpo.probability_map.dirichlet_posterior(n_draws=100)
+
+    mpo.update_trajectory(
+        START, START + dt.timedelta(hours=1), dt.timedelta(minutes=10)
+    )
+    mpo.update_probabilities()
+
+    assert "Magnetosheath Posterior Lower" in mpo.region_probabilities
+    assert "Magnetosheath Bootstrap Lower" not in mpo.region_probabilities
+
+    # Adding bands to the map looks up every row again
+    mpo.probability_map.bootstrap(n_resamples=100)
+    mpo.update_probabilities()
+
+    assert not np.any(
+        np.isnan(mpo.region_probabilities["Magnetosheath Bootstrap Lower"])
+    )
+
+
+def test_iter_trajectory_matches_update_trajectory(synthetic_kernels):
+    # 21 s at 2 s resolution rounds to 10 samples. Counting the samples of
+    # each chunk separately would round the last chunk up.
+    end = START + dt.timedelta(seconds=21)
+    res = dt.timedelta(seconds=2)
+
+    mpo = make_mpo(synthetic_kernels)
+    chunks = list(mpo.iter_trajectory(START, end, res, chunk=3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1]
+
+    mpo.update_trajectory(START, end, res)
+    mpo.update_probabilities()
+
+    combined = pd.concat(chunks, ignore_index=True)
+    expected = pd.concat(
+        [mpo.trajectory, mpo.region_probabilities.drop(columns="Time")], axis=1
+    )
+
+    pd.testing.assert_frame_equal(combined, expected, check_dtype=False)
+
+
+def test_parallel_trajectory_matches_serial(synthetic_kernels):
+    end = START + dt.timedelta(hours=2)
+    res = dt.timedelta(seconds=7)
+
+    serial = make_mpo(synthetic_kernels)
+    serial.update_trajectory(START, end, res)
+
+    parallel = make_mpo(synthetic_kernels)
+    parallel.update_trajectory(START, end, res, processes=2)
+
+    pd.testing.assert_frame_equal(parallel.trajectory, serial.trajectory)
+    assert parallel.process_pool is None
+
+
+def test_process_pool_is_kept_open(synthetic_kernels):
+    # Each hour is a whole number of samples, so the two queries together
+    # cover the same grid as one
+    res = dt.timedelta(seconds=6)
+
+    serial = make_mpo(synthetic_kernels)
+    serial.update_trajectory(START, START + dt.timedelta(hours=2), res)
+
+    with make_mpo(synthetic_kernels).open(processes=2) as mpo:
+        pool = mpo.process_pool
+
+        mpo.update_trajectory(START, START + dt.timedelta(hours=1), res)
+        mpo.update_trajectory(
+            START + dt.timedelta(hours=1), START + dt.timedelta(hours=2), res
+        )
+
+        assert mpo.process_pool is pool
+        pd.testing.assert_frame_equal(mpo.trajectory, serial.trajectory)
+
+    assert mpo.process_pool is None
+    assert pool.executor is None
+
+
+def test_cube_lookup_follows_heliocentric_distance(synthetic_kernels):
+    # Mercury moves away from the Sun at 10 km/s. Split the cube at MPO's
+    # heliocentric distance 35 minutes in: solar wind before, and
+    # magnetosheath after.
+    spice_times = synthetic_kernels.reference_et + np.array([35 * 60.0])
+    position = synthetic_kernels.position(
+        "MERCURY", spice_times
+    ) + synthetic_kernels.position("MPO", spice_times)
+    split = np.linalg.norm(position) / load_constants()["AU_KM"]
+
+    counts = np.zeros((3, 1, 1, 2))
+    counts[0, ..., 0] = 1
+    counts[1, ..., 1] = 1
+
+    mpo = make_mpo(synthetic_kernels)
+    mpo.probability_map = RegionProbabilityCube(
+        [-5, 5], [0, 8], [0.3, split, 0.48], counts
+    )
+
+    end = START + dt.timedelta(hours=1)
+    res = dt.timedelta(minutes=10)
+
+    mpo.update_trajectory(START, end, res)
+    mpo.update_probabilities()
+
+    after_split = mpo.trajectory["Time"] > utc(35 * 60)
+    assert np.array_equal(mpo.region_probabilities["Solar Wind"], ~after_split)
+    assert np.array_equal(mpo.region_probabilities["Magnetosheath"], after_split)
+
+    chunks = pd.concat(mpo.iter_trajectory(START, end, res, chunk=4))
+    assert np.array_equal(chunks["Magnetosheath"], after_split)
+
+
+def expected_msm(synthetic_kernels, spice_times):
+    # The synthetic frames are identical to J2000
+    constants = load_constants()
+    position = synthetic_kernels.position("MPO", spice_times)
+    position[:, 2] += constants["DIPOLE_OFFSET_KM"]
+
+    return position / constants["MERCURY_RADIUS_KM"]
+
+
+def test_positions_at_keeps_input_order_across_batches(synthetic_kernels):
+    # Unsorted, and split over three batches
+    elapsed = np.array([3000, 0, 7200, 600, 5000, 60, 9000.0])
+    spice_times = synthetic_kernels.reference_et + elapsed
+
+    positions = make_mpo(synthetic_kernels).positions_at(spice_times, batch_size=3)
+
+    assert np.array_equal(positions["ET"], spice_times)
+    assert np.allclose(
+        positions[["X MSM'", "Y MSM'", "Z MSM'"]],
+        expected_msm(synthetic_kernels, spice_times),
+    )
+
+    # Only the bin from X = 1 to 2 radii is likely magnetosheath
+    in_bin = (positions["X MSM'"] >= 1) & (positions["X MSM'"] < 2)
+    assert np.allclose(positions["Magnetosheath"], np.where(in_bin, 0.9, 0))
+
+
+def test_positions_at_utc_and_et_inputs_agree(synthetic_kernels):
+    elapsed = np.array([5000, 0, 600.0])
+    mpo = make_mpo(synthetic_kernels)
+
+    from_et = mpo.positions_at(synthetic_kernels.reference_et + elapsed)
+    from_utc = mpo.positions_at(utc(elapsed))
+
+    assert np.array_equal(from_utc["Time"], utc(elapsed))
+    pd.testing.assert_frame_equal(
+        from_utc.drop(columns="Time"), from_et.drop(columns="ET"), atol=1e-9
+    )
+
+    # Timezone-aware times are converted to UTC
+    local_times = pd.DatetimeIndex(utc(elapsed)).tz_localize("UTC")
+    from_local = mpo.positions_at(local_times.tz_convert("Asia/Tokyo"))
+
+    pd.testing.assert_frame_equal(from_local, from_utc)
+
+
+def test_adaptive_trajectory_refines_transitions(synthetic_kernels):
+    end = START + dt.timedelta(hours=3)
+    res = dt.timedelta(seconds=10)
+
+    dense = make_mpo(synthetic_kernels)
+    dense.update_trajectory(START, end, res)
+    dense.update_probabilities()
+
+    adaptive = make_mpo(synthetic_kernels)
+    adaptive.update_trajectory_adaptive(
+        START, end, res, coarse_res=dt.timedelta(minutes=10)
+    )
+    adaptive.update_probabilities()
+
+    assert len(adaptive.trajectory) < len(dense.trajectory) / 10
+
+    # Every sample lies on the dense grid, with the same values
+    rows = np.searchsorted(dense.trajectory["Time"], adaptive.trajectory["Time"])
+    pd.testing.assert_frame_equal(
+        adaptive.trajectory, dense.trajectory.iloc[rows].reset_index(drop=True)
+    )
+    pd.testing.assert_frame_equal(
+        adaptive.region_probabilities,
+        dense.region_probabilities.iloc[rows].reset_index(drop=True),
+    )
+
+    # The transitions at 879.4 s and 5758.8 s (see test_find_intervals) are
+    # resolved to neighbouring samples
+    for seconds in (870, 880, 5750, 5760):
+        assert utc(seconds) in adaptive.trajectory["Time"].to_numpy()
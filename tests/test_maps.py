@@ -0,0 +1,368 @@
+import numpy as np
+import pandas as pd
+
+from wamms.constants import load_constants
+from wamms.maps import (
+    AdaptiveRegionProbabilityMap,
+    RegionProbabilityCube,
+    RegionProbabilityMap,
+    RegionProbabilityPyramid,
+)
+
+AU_KM = load_constants()["AU_KM"]
+
+
+def test_histogram_counts_and_probabilities():
+    prediction_data = pd.DataFrame(
+        {
+            "Predicted Region": [
+                "Solar Wind",
+                "Solar Wind",
+                "Magnetosheath",
+                "Magnetosphere",
+                "Magnetosphere",
+            ],
+            # The last position is outside of the map
+            "X MSM' (radii)": [2.1, 2.9, 2.5, -1.5, 9],
+            "CYL MSM' (radii)": [0.5, 0.2, 0.9, 3.5, 1],
+        }
+    )
+
+    probability_map = RegionProbabilityMap.from_prediction_data(
+        prediction_data, bin_size=1
+    )
+
+    assert probability_map.counts.shape == (3, 10, 8)
+    assert probability_map.counts.sum() == 4
+    assert np.array_equal(probability_map.counts[:, 7, 0], [2, 1, 0])
+    assert np.array_equal(probability_map.counts[:, 3, 3], [0, 0, 1])
+
+    assert np.allclose(probability_map.probabilities[:, 7, 0], [2 / 3, 1 / 3, 0])
+    assert np.all(np.isnan(probability_map.probabilities[:, 0, 0]))
+
+    probabilities = probability_map.probabilities_at([2.5, -1.5, 9], [0.5, 3.5, 1])
+    assert np.allclose(probabilities[0], [2 / 3, 1 / 3, 0])
+    assert np.allclose(probabilities[1], [0, 0, 1])
+    assert np.all(np.isnan(probabilities[2]))
+
+
+def test_map_is_saved(tmp_path):
+    counts = np.arange(3 * 2 * 4).reshape(3, 2, 4)
+    probability_map = RegionProbabilityMap(
+        np.linspace(-1, 1, 3), np.linspace(0, 2, 5), counts, sample_interval=1
+    )
+    probability_map.save(tmp_path / "map.npz")
+
+    loaded = RegionProbabilityMap.load(tmp_path / "map.npz")
+
+    assert np.array_equal(loaded.counts, counts)
+    assert np.array_equal(loaded.x_edges, probability_map.x_edges)
+    assert np.array_equal(loaded.cyl_edges, probability_map.cyl_edges)
+    assert loaded.region_names == probability_map.region_names
+    assert loaded.sample_interval == 1
+
+
+def test_bilinear_interpolation():
+    # Solar wind at X < 1, and magnetosheath at X > 1, except for the
+    # unvisited bin from X = 1 to 2, CYL = 1 to 2
+    counts = np.zeros((3, 2, 2))
+    counts[0, 0, :] = 4
+    counts[1, 1, 0] = 2
+    probability_map = RegionProbabilityMap([0, 1, 2], [0, 1, 2], counts)
+
+    probabilities = probability_map.probabilities_at(
+        [0.5, 1, 1, 1], [0.5, 0.5, 0.75, 1], interpolation="bilinear"
+    )
+
+    # At a bin centre, and midway between two bin centres
+    assert np.allclose(probabilities[0], [1, 0, 0])
+    assert np.allclose(probabilities[1], [0.5, 0.5, 0])
+
+    # The unvisited bin has no weight, leaving weights of 3 / 8 (solar
+    # wind), 3 / 8 (magnetosheath), and 1 / 8 (solar wind)
+    assert np.allclose(probabilities[2], [4 / 7, 3 / 7, 0])
+    assert np.allclose(probabilities[3], [2 / 3, 1 / 3, 0])
+
+
+def test_smoothing_conserves_counts():
+    counts = np.zeros((3, 5, 5))
+    counts[0, 2, 2] = 10
+    counts[1, 0, 4] = 6
+    probability_map = RegionProbabilityMap(
+        np.linspace(0, 5, 6), np.linspace(0, 5, 6), counts
+    )
+
+    smoothed = probability_map.smoothed(sigma=1)
+
+    assert np.allclose(smoothed.counts.sum(axis=(1, 2)), [10, 6, 0])
+    assert np.array_equal(probability_map.counts, counts)
+
+    # Unvisited bins next to observations gain probabilities
+    assert np.all(np.isnan(probability_map.probabilities[:, 1, 2]))
+    assert np.allclose(smoothed.probabilities[:, 1, 2].sum(), 1)
+
+
+def adaptive_example(min_count, rule="quadtree"):
+    # Observation totals on a 4 x 4 grid, with 3 levels (1 x 1, 2 x 2, and
+    # 4 x 4 bins). The 2 x 2 blocks total 40, 4, 95, and 120.
+    totals = np.array(
+        [
+            [10, 10, 1, 1],
+            [10, 10, 1, 1],
+            [30, 30, 30, 30],
+            [30, 5, 30, 30],
+        ]
+    )
+    counts = np.stack([totals, np.zeros_like(totals), np.zeros_like(totals)])
+
+    return AdaptiveRegionProbabilityMap(
+        np.linspace(0, 4, 5),
+        np.linspace(0, 4, 5),
+        counts,
+        n_levels=3,
+        min_count=min_count,
+        rule=rule,
+    )
+
+
+def test_quadtree_levels():
+    # One of the 2 x 2 blocks has fewer than 8 observations, so the root is
+    # never split
+    probability_map = adaptive_example(8)
+
+    assert np.array_equal(probability_map.levels, np.zeros((4, 4)))
+    assert np.all(probability_map.leaf_totals == 259)
+
+
+def test_quadtree_splits_well_sampled_blocks():
+    probability_map = adaptive_example(3)
+
+    # The top right block has 1 observation per bin, so isn't split further
+    assert np.array_equal(
+        probability_map.levels,
+        [
+            [2, 2, 1, 1],
+            [2, 2, 1, 1],
+            [2, 2, 2, 2],
+            [2, 2, 2, 2],
+        ],
+    )
+    assert np.all(probability_map.leaf_totals[:2, 2:] == 4)
+
+
+def test_levels_by_count():
+    probability_map = adaptive_example(8, rule="count")
+
+    assert np.array_equal(
+        probability_map.levels,
+        [
+            [2, 2, 0, 0],
+            [2, 2, 0, 0],
+            [2, 2, 2, 2],
+            [2, 1, 2, 2],
+        ],
+    )
+    assert probability_map.leaf_totals[3, 1] == 95
+    assert np.all(probability_map.leaf_totals[:2, 2:] == 259)
+
+
+def test_adaptive_smoothing_keeps_leaf_estimates():
+    # Each bin of the top right block only saw one region, but the block
+    # as a whole is evenly split
+    solar_wind = np.array([[1, 0], [0, 1]])
+    magnetosheath = 1 - solar_wind
+
+    counts = np.zeros((3, 4, 4))
+    counts[0] = 10
+    counts[0, :2, 2:] = solar_wind
+    counts[1, :2, 2:] = magnetosheath
+
+    probability_map = AdaptiveRegionProbabilityMap(
+        np.linspace(0, 4, 5), np.linspace(0, 4, 5), counts, n_levels=3, min_count=3
+    )
+    smoothed = probability_map.smoothed(sigma=1e-3)
+
+    assert isinstance(smoothed, RegionProbabilityMap)
+    assert np.isclose(smoothed.counts.sum(), counts.sum())
+    assert np.allclose(smoothed.probabilities[:2, :2, 2:], 0.5)
+    assert np.allclose(smoothed.probabilities[0, 2:], 1)
+
+
+def test_bands_are_saved(tmp_path):
+    probability_map = adaptive_example(3).dirichlet_posterior(n_draws=100)
+    probability_map.save(tmp_path / "map.npz")
+
+    loaded = AdaptiveRegionProbabilityMap.load(tmp_path / "map.npz")
+
+    assert list(loaded.bands) == [
+        "Posterior Mean",
+        "Posterior Lower",
+        "Posterior Upper",
+    ]
+    assert loaded.bands_version > 0
+    for name, table in probability_map.bands.items():
+        assert np.array_equal(loaded.bands[name], table)
+
+
+def test_probabilities_and_bands_match_separate_lookups():
+    probability_map = adaptive_example(3).bootstrap(n_resamples=100)
+    x = [0.5, 1.2, 2.5, 3.9, 5]
+    cyl = [0.5, 3.1, 1, 2.2, 1]
+
+    for interpolation in ("nearest", "bilinear"):
+        probabilities, bands = probability_map.probabilities_and_bands_at(
+            x, cyl, interpolation=interpolation
+        )
+        expected_bands = probability_map.bands_at(x, cyl, interpolation=interpolation)
+
+        assert np.array_equal(
+            probabilities,
+            probability_map.probabilities_at(x, cyl, interpolation),
+            equal_nan=True,
+        )
+        assert list(bands) == list(expected_bands)
+        for name, values in expected_bands.items():
+            assert np.array_equal(bands[name], values, equal_nan=True)
+
+
+def count_units_example():
+    # The same 5 s samples, counted in samples and in seconds
+    counts = np.zeros((3, 2, 2))
+    counts[0] = [[3, 0], [7, 1]]
+    counts[1] = [[1, 2], [0, 4]]
+
+    samples = RegionProbabilityMap(
+        np.linspace(0, 2, 3), np.linspace(0, 2, 3), counts, sample_interval=5
+    )
+    seconds = RegionProbabilityMap(
+        np.linspace(0, 2, 3), np.linspace(0, 2, 3), counts * 5, sample_interval=1
+    )
+
+    return counts, samples, seconds
+
+
+def test_bands_do_not_depend_on_count_units():
+    counts, samples, seconds = count_units_example()
+
+    for probability_map in (samples, seconds):
+        probability_map.dirichlet_posterior(n_draws=100).bootstrap(n_resamples=100)
+
+    assert np.allclose(seconds.observations(), counts.reshape(3, -1).T)
+    for name, table in samples.bands.items():
+        assert np.allclose(seconds.bands[name], table, equal_nan=True), name
+
+
+def test_bin_count_does_not_depend_on_count_units():
+    _, samples, seconds = count_units_example()
+
+    x, cyl = [0.5, 1.5, 1.2, 3], [0.5, 0.5, 1.7, 0.5]
+    for interpolation in ("nearest", "bilinear"):
+        bin_counts = [
+            probability_map.bands_at(x, cyl, interpolation=interpolation)["Bin Count"]
+            for probability_map in (samples, seconds)
+        ]
+
+        assert np.allclose(bin_counts[1], bin_counts[0], equal_nan=True)
+
+    assert np.allclose(
+        samples.bands_at(x, cyl)["Bin Count"], [4, 7, 5, np.nan], equal_nan=True
+    )
+
+
+def test_pyramid_levels_match_direct_histograms():
+    rng = np.random.default_rng(0)
+    prediction_data = pd.DataFrame(
+        {
+            "Predicted Region": rng.choice(
+                ["Solar Wind", "Magnetosheath", "Magnetosphere"], 10_000
+            ),
+            "X MSM' (radii)": rng.uniform(-6, 6, 10_000),
+            "CYL MSM' (radii)": rng.uniform(0, 9, 10_000),
+        }
+    )
+
+    pyramid = RegionProbabilityPyramid.from_prediction_data(prediction_data)
+
+    for level, bin_size in enumerate(pyramid.bin_sizes):
+        direct = RegionProbabilityMap.from_prediction_data(
+            prediction_data, bin_size=bin_size
+        )
+
+        assert np.array_equal(pyramid[level].counts, direct.counts)
+        assert np.allclose(pyramid[level].x_edges, direct.x_edges)
+
+
+def test_pyramid_reuses_adaptive_maps():
+    standalone = adaptive_example(3)
+    pyramid = RegionProbabilityPyramid(
+        standalone.x_edges, standalone.cyl_edges, standalone.counts, n_levels=3
+    )
+
+    adaptive_map = pyramid.adaptive_map(3)
+
+    assert pyramid.adaptive_map(3) is adaptive_map
+    assert pyramid.adaptive_map(3, rule="count") is not adaptive_map
+    assert np.array_equal(adaptive_map.levels, standalone.levels)
+    assert np.array_equal(adaptive_map.leaf_counts, standalone.leaf_counts)
+
+    pyramid.probabilities_at([0.5], [0.5], min_count=3)
+    assert set(pyramid._adaptive_maps) == {(3, "quadtree"), (3, "count")}
+
+
+def cube_example():
+    prediction_data = pd.DataFrame(
+        {
+            "Predicted Region": [
+                "Solar Wind",
+                "Magnetosheath",
+                "Magnetosphere",
+                "Solar Wind",
+            ],
+            "X MSM' (radii)": [2.5, 2.5, -1.5, 2.5],
+            "CYL MSM' (radii)": [0.5, 0.5, 3.5, 0.5],
+            # In km. The last distance is outside of the cube.
+            "Heliocentric Distance": np.array([0.32, 0.47, 0.42, 0.6]) * AU_KM,
+        }
+    )
+
+    cube = RegionProbabilityCube.from_prediction_data(
+        prediction_data,
+        bin_size=1,
+        distance_bin_size=0.05,
+        distance_range=(0.3, 0.5),
+    )
+
+    return prediction_data, cube
+
+
+def test_cube_histogram():
+    _, cube = cube_example()
+
+    assert np.allclose(cube.distance_edges, [0.3, 0.35, 0.4, 0.45, 0.5])
+    assert cube.counts.shape == (3, 10, 8, 4)
+    assert cube.counts.sum() == 3
+    assert np.array_equal(cube.counts[:, 7, 0, 0], [1, 0, 0])
+    assert np.array_equal(cube.counts[:, 7, 0, 3], [0, 1, 0])
+    assert np.array_equal(cube.counts[:, 3, 3, 2], [0, 0, 1])
+
+    probabilities = cube.probabilities_at([2.5, 2.5, 2.5], [0.5] * 3, [0.32, 0.47, 0.6])
+    assert np.allclose(probabilities[0], [1, 0, 0])
+    assert np.allclose(probabilities[1], [0, 1, 0])
+    assert np.all(np.isnan(probabilities[2]))
+
+
+def test_cube_map_over_distance_range():
+    prediction_data, cube = cube_example()
+
+    assert np.array_equal(cube.map().counts, cube.counts.sum(axis=-1))
+
+    # Only the distance bins with centres from 0.3 to 0.4 AU
+    closer = prediction_data["Heliocentric Distance"] < 0.4 * AU_KM
+    expected = RegionProbabilityMap.from_prediction_data(
+        prediction_data[closer], bin_size=1
+    )
+
+    collapsed = cube.map((0.3, 0.4))
+    assert np.array_equal(collapsed.counts, expected.counts)
+    assert np.array_equal(collapsed.x_edges, expected.x_edges)
+    assert np.array_equal(collapsed.cyl_edges, expected.cyl_edges)
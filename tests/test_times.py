@@ -0,0 +1,45 @@
+import datetime as dt
+
+import numpy as np
+
+from wamms.times import datetime64_to_et, time_grid
+
+
+def test_time_grid_matches_datetimes():
+    start = dt.datetime(2027, 3, 1, 12, 0, 0, 250)
+    res = dt.timedelta(seconds=12.5)
+
+    grid = time_grid(start, 1000, res)
+
+    expected = np.array([start + i * res for i in range(1000)], dtype="datetime64[ns]")
+    assert np.array_equal(grid, expected)
+
+
+def test_datetime64_to_et_across_leap_second(leapseconds):
+    spice = leapseconds
+
+    # A leap second was inserted at the end of 2016-12-31
+    times = time_grid(
+        dt.datetime(2016, 12, 30, 22, 0, 0, 500), 3000, dt.timedelta(seconds=97.3)
+    )
+
+    expected = spice.datetime2et(
+        times.astype("datetime64[us]").astype(dt.datetime).tolist()
+    )
+
+    assert np.max(np.abs(datetime64_to_et(times) - expected)) < 1e-6
+
+
+def test_datetime64_to_et_counts_leap_second(leapseconds):
+    before, after = datetime64_to_et(
+        np.array(["2016-12-31T23:59:59", "2017-01-01T00:00:00"], dtype="datetime64[ns]")
+    )
+
+    assert abs((after - before) - 2) < 1e-6
+
+
+def test_datetime64_to_et_keeps_shape(leapseconds):
+    times = time_grid(dt.datetime(2027, 1, 1), 6, dt.timedelta(hours=1)).reshape(2, 3)
+
+    assert datetime64_to_et(times).shape == (2, 3)
+    assert datetime64_to_et(times[:0]).shape == (0, 3)
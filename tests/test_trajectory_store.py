@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wamms.trajectory_store import TrajectoryStore
+
+START = np.datetime64("2027-01-01T00:00:00", "ns")
+
+
+def seconds(value):
+    return START + np.timedelta64(value, "s")
+
+
+def chunk(start, end, step=10):
+    times = START + np.arange(start, end, step) * np.timedelta64(1, "s")
+    return pd.DataFrame({"Time": times, "X": np.arange(start, end, step)})
+
+
+def test_missing_sub_ranges():
+    store = TrajectoryStore()
+
+    assert store.missing(seconds(0), seconds(100)) == [(seconds(0), seconds(100))]
+
+    store.add(seconds(20), seconds(40), chunk(20, 40))
+    store.add(seconds(60), seconds(80), chunk(60, 80))
+
+    assert store.missing(seconds(0), seconds(100)) == [
+        (seconds(0), seconds(20)),
+        (seconds(40), seconds(60)),
+        (seconds(80), seconds(100)),
+    ]
+    assert store.missing(seconds(25), seconds(70)) == [(seconds(40), seconds(60))]
+    assert store.missing(seconds(20), seconds(40)) == []
+
+
+def test_add_merges_coverage_with_the_same_key():
+    store = TrajectoryStore()
+
+    store.add(seconds(0), seconds(20), chunk(0, 20), key="a")
+    store.add(seconds(40), seconds(60), chunk(40, 60), key="a")
+    store.add(seconds(20), seconds(40), chunk(20, 40), key="a")
+    store.add(seconds(60), seconds(80), chunk(60, 80), key="b")
+
+    assert store.coverage == [
+        (seconds(0), seconds(60), "a"),
+        (seconds(60), seconds(80), "b"),
+    ]
+    assert store.overlapping(seconds(50), seconds(70)) == [
+        (seconds(50), seconds(60), "a"),
+        (seconds(60), seconds(70), "b"),
+    ]
+
+
+def test_add_rejects_overlapping_chunks():
+    store = TrajectoryStore()
+    store.add(seconds(0), seconds(20), chunk(0, 20))
+
+    with pytest.raises(ValueError):
+        store.add(seconds(10), seconds(30), chunk(10, 30))
+
+
+def test_chunks_are_merged_in_time_order():
+    store = TrajectoryStore()
+
+    # Added out of order, and some before the first read
+    store.add(seconds(40), seconds(60), chunk(40, 60))
+    store.add(seconds(0), seconds(20), chunk(0, 20))
+    assert len(store) == 4
+    assert list(store.frame["X"]) == [0, 10, 40, 50]
+
+    store.add(seconds(60), seconds(80), chunk(60, 80))
+    store.add(seconds(20), seconds(40), chunk(20, 40))
+    assert list(store.frame["X"]) == list(range(0, 80, 10))
+
+
+def test_remove_splits_coverage():
+    store = TrajectoryStore()
+    store.add(seconds(0), seconds(100), chunk(0, 100), key="a")
+
+    store.remove(seconds(25), seconds(55))
+
+    assert list(store.frame["X"]) == [0, 10, 20, 60, 70, 80, 90]
+    assert store.coverage == [
+        (seconds(0), seconds(25), "a"),
+        (seconds(55), seconds(100), "a"),
+    ]
+    assert store.missing(seconds(0), seconds(100)) == [(seconds(25), seconds(55))]
+
+
+def probabilities(rows, value):
+    return pd.DataFrame({"P": np.full(len(rows), value)})
+
+
+def test_only_new_rows_need_probabilities():
+    store = TrajectoryStore()
+    store.add(seconds(0), seconds(30), chunk(0, 30))
+
+    rows = store.rows_without_probabilities("map")
+    assert list(rows) == [0, 1, 2]
+    store.set_probabilities(rows, probabilities(rows, 0.5), "map")
+
+    assert len(store.rows_without_probabilities("map")) == 0
+
+    # New rows slot in before and after the existing rows
+    store.add(seconds(-20), seconds(0), chunk(-20, 0))
+    store.add(seconds(30), seconds(40), chunk(30, 40))
+
+    rows = store.rows_without_probabilities("map")
+    assert list(rows) == [0, 1, 5]
+
+    store.set_probabilities(rows, probabilities(rows, 1), "map")
+    assert list(store.probabilities["P"]) == [1, 1, 0.5, 0.5, 0.5, 1]
+
+
+def test_removed_rows_drop_their_probabilities():
+    store = TrajectoryStore()
+    store.add(seconds(0), seconds(40), chunk(0, 40))
+    rows = store.rows_without_probabilities("map")
+    store.set_probabilities(rows, pd.DataFrame({"P": [0.1, 0.2, 0.3, 0.4]}), "map")
+
+    store.remove(seconds(10), seconds(20))
+
+    assert list(store.probabilities["P"]) == [0.1, 0.3, 0.4]
+    assert len(store.rows_without_probabilities("map")) == 0
+
+
+def test_changing_the_key_invalidates_all_rows():
+    store = TrajectoryStore()
+    store.add(seconds(0), seconds(30), chunk(0, 30))
+    rows = store.rows_without_probabilities("map")
+    store.set_probabilities(rows, probabilities(rows, 0.5), "map")
+
+    assert list(store.rows_without_probabilities("other map")) == [0, 1, 2]
+
+    store.set_probabilities([0], probabilities([0], 1), "other map")
+
+    assert list(store.rows_without_probabilities("other map")) == [1, 2]
+    assert np.array_equal(store.probabilities["P"], [1, np.nan, np.nan], equal_nan=True)
@@ -8,3 +8,10 @@ except PackageNotFoundError:
     pass
 
 from wamms.main import *
+from wamms.cache import EphemerisCache
+from wamms.builders import *
+from wamms.dataset import *
+from wamms.maps import *
+from wamms.times import *
+from wamms.fleets import *
+from wamms.chebyshev import *
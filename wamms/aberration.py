@@ -0,0 +1,115 @@
+"""
+Time-variable aberration of positions, due to Mercury's orbital motion
+through the solar wind
+"""
+
+import numpy as np
+import spiceypy as spice
+
+# Spacing of the grid on which we find the aberration angle (seconds). The
+# angle varies smoothly over Mercury's 88 day orbit, so we interpolate
+# between these.
+ABERRATION_GRID_SPACING = 86400
+
+
+def aberration_angles(
+    spice_times: np.ndarray,
+    solar_wind_speed: float,
+    grid_spacing: float = ABERRATION_GRID_SPACING,
+) -> np.ndarray:
+    """Find the aberration angle of the solar wind in the MSO X-Y plane, at
+    each of the given times.
+
+    Mercury's orbital velocity is found on a coarse grid of times with a
+    single SPICE call, and the resulting angle is interpolated to each time.
+    A kernel session including Mercury's ephemeris must be open.
+
+    Params
+    ------
+    spice_times: np.ndarray
+        Ephemeris times
+
+    solar_wind_speed: float
+        Assumed radial solar wind speed (km/s)
+
+    grid_spacing: float {default ABERRATION_GRID_SPACING}
+        Spacing (seconds) of the grid of times at which the angle is
+        determined
+
+    Returns
+    -------
+    np.ndarray
+        Angle (radians) of the direction the solar wind appears to come from,
+        measured from MSO +X towards MSO +Y. This is negative, as Mercury
+        orbits in the -Y direction.
+    """
+
+    spice_times = np.asarray(spice_times, dtype=float)
+
+    if len(spice_times) == 0:
+        return np.zeros(0)
+
+    grid = grid_spacing * np.arange(
+        np.floor(spice_times.min() / grid_spacing),
+        np.ceil(spice_times.max() / grid_spacing) + 1,
+    )
+
+    # We find Mercury's velocity in an inertial frame. In BC_MSO, which
+    # rotates to follow the Sun, Mercury's velocity relative to the Sun
+    # would only have a radial component.
+    states, _ = spice.spkezr("MERCURY", grid, "J2000", "NONE", "SUN")
+    states = np.atleast_2d(states)
+
+    positions = states[:, :3]
+    velocities = states[:, 3:]
+
+    # MSO X points towards the Sun, and MSO Y is opposite to Mercury's
+    # orbital motion. So in the MSO X-Y plane, Mercury moves with velocity
+    # (-radial, -tangential).
+    distances = np.linalg.norm(positions, axis=1)
+    radial_velocities = np.sum(positions * velocities, axis=1) / distances
+    tangential_velocities = np.sqrt(
+        np.maximum(np.sum(velocities**2, axis=1) - radial_velocities**2, 0)
+    )
+
+    # Relative to Mercury, the solar wind flows with velocity
+    # (-solar_wind_speed + radial, tangential), so it appears to come from
+    # the direction:
+    grid_angles = np.arctan2(
+        -tangential_velocities, solar_wind_speed - radial_velocities
+    )
+
+    return np.interp(spice_times, grid, grid_angles)
+
+
+def aberrate_positions(positions: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """Rotate MSO positions about Z into the aberrated frame, in which X
+    points towards the apparent direction of the solar wind.
+
+    Params
+    ------
+    positions: np.ndarray
+        Positions of shape (N, 3)
+
+    angles: np.ndarray
+        Aberration angles (radians) for each position, as from
+        aberration_angles()
+
+    Returns
+    -------
+    np.ndarray
+        Aberrated positions of shape (N, 3)
+    """
+
+    positions = np.array(positions, dtype=float)
+
+    cos_angles = np.cos(angles)
+    sin_angles = np.sin(angles)
+
+    x = positions[:, 0].copy()
+    y = positions[:, 1].copy()
+
+    positions[:, 0] = x * cos_angles + y * sin_angles
+    positions[:, 1] = -x * sin_angles + y * cos_angles
+
+    return positions
@@ -0,0 +1,116 @@
+"""
+Coarse-to-fine sampling of time series on an integer grid
+"""
+
+import numpy as np
+
+
+def refine_samples(
+    n_samples: int, coarse_step: int, evaluate, needs_refinement
+) -> tuple[np.ndarray, np.ndarray]:
+    """Sample a function on the grid 0, 1, ..., n_samples - 1, only as
+    finely as needed.
+
+    The grid is first sampled every coarse_step points. Any step between
+    neighbouring samples which needs refinement is then split at its
+    midpoint, and so on, until no more steps need refinement or they can't
+    be split further. All of the new samples at each level are evaluated
+    together.
+
+    Features shorter than coarse_step, which begin and end between two
+    coarse samples, can be missed.
+
+    Params
+    ------
+    n_samples: int
+        Size of the full grid
+
+    coarse_step: int
+        Initial spacing of samples
+
+    evaluate: callable
+        Function taking an array of grid indices, and returning an array of
+        values with one row per index
+
+    needs_refinement: callable
+        Function taking the values at the start and end of each step, and
+        returning a boolean array of which steps should be split
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The sorted grid indices which were sampled, and the values at each
+    """
+
+    if n_samples == 0:
+        indices = np.zeros(0, dtype=np.int64)
+        return indices, evaluate(indices)
+
+    indices = np.unique(
+        np.append(np.arange(0, n_samples, max(1, coarse_step)), n_samples - 1)
+    )
+    values = evaluate(indices)
+
+    while True:
+        splittable = np.diff(indices) > 1
+        split = splittable.copy()
+        split[splittable] = needs_refinement(
+            values[:-1][splittable], values[1:][splittable]
+        )
+
+        if not np.any(split):
+            break
+
+        new_indices = (indices[:-1][split] + indices[1:][split]) // 2
+        new_values = evaluate(new_indices)
+
+        # The new indices are each between two existing indices, so we can
+        # merge the sorted arrays by position.
+        positions = np.searchsorted(indices, new_indices)
+        indices = np.insert(indices, positions, new_indices)
+        values = np.insert(values, positions, new_values, axis=0)
+
+    return indices, values
+
+
+def probabilities_differ(
+    start_probabilities: np.ndarray, end_probabilities: np.ndarray, threshold: float
+) -> np.ndarray:
+    """Determine which steps have a large change in region probabilities
+
+    Params
+    ------
+    start_probabilities: np.ndarray
+        Region probabilities at the start of each step, of shape
+        (n_steps, n_regions)
+
+    end_probabilities: np.ndarray
+        Region probabilities at the end of each step
+
+    threshold: float
+        Steps where any probability changes by more than this are flagged
+
+    Returns
+    -------
+    np.ndarray
+        True for steps where a probability changes by more than threshold,
+        the most probable region changes, or the map coverage (nan) changes
+    """
+
+    start_missing = np.any(np.isnan(start_probabilities), axis=1)
+    end_missing = np.any(np.isnan(end_probabilities), axis=1)
+    both_present = ~start_missing & ~end_missing
+
+    start_probabilities = np.nan_to_num(start_probabilities)
+    end_probabilities = np.nan_to_num(end_probabilities)
+
+    large_change = (
+        np.max(np.abs(end_probabilities - start_probabilities), axis=1) > threshold
+    )
+    region_change = np.argmax(start_probabilities, axis=1) != np.argmax(
+        end_probabilities, axis=1
+    )
+
+    return (start_missing != end_missing) | (
+        both_present & (large_change | region_change)
+    )
@@ -0,0 +1,528 @@
+"""
+Builders for region probability maps directly from the MESSENGER ephemeris
+and crossing list
+"""
+
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from wamms.maps import REGION_NAMES, RegionProbabilityMap, _flat_bin_indices
+
+__all__ = [
+    "PREVIOUS_CROSSING_REGIONS",
+    "NEXT_CROSSING_REGIONS",
+    "region_intervals",
+    "dwell_time_map",
+    "ChunkedMapBuilder",
+    "build_map_chunked",
+]
+
+# What region are we in based on the crossing before, and the crossing after
+PREVIOUS_CROSSING_REGIONS = {
+    "BS_OUT": "Solar Wind",
+    "BS_IN": "Magnetosheath",
+    "MP_OUT": "Magnetosheath",
+    "MP_IN": "Magnetosphere",
+    "UNPHYSICAL (MSp -> SW)": "Solar Wind",
+    "UNPHYSICAL (SW -> MSp)": "Magnetosphere",
+}
+# create_messenger_dataset.py spells the region after an UNPHYSICAL (MSp -> SW)
+# crossing "Magnteosphere", so it never agrees with the crossing before, and
+# these intervals are dropped from the csv dataset. Here they are counted as
+# magnetosphere.
+NEXT_CROSSING_REGIONS = {
+    "BS_OUT": "Magnetosheath",
+    "BS_IN": "Solar Wind",
+    "MP_OUT": "Magnetosphere",
+    "MP_IN": "Magnetosheath",
+    "UNPHYSICAL (MSp -> SW)": "Magnetosphere",
+    "UNPHYSICAL (SW -> MSp)": "Solar Wind",
+}
+
+
+def region_intervals(crossings: pd.DataFrame) -> pd.DataFrame:
+    """Convert a crossing list into intervals of known region.
+
+    The region between two consecutive crossings is determined from both the
+    crossing before and the crossing after. In the case of data gaps, or
+    other anomalies, these can disagree, and we exclude these intervals.
+
+    Params
+    ------
+    crossings: pd.DataFrame
+        Crossing list with columns "Time" and "Label", e.g. the Hollman et al.
+        (2025) crossing list
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns "Start Time", "End Time", and "Region", sorted by time
+    """
+
+    crossings = crossings.sort_values("Time")
+
+    times = crossings["Time"].to_numpy()
+    labels = crossings["Label"].to_numpy()
+
+    region_after = pd.Series(labels[:-1]).map(PREVIOUS_CROSSING_REGIONS)
+    region_before = pd.Series(labels[1:]).map(NEXT_CROSSING_REGIONS)
+
+    consistent = (region_after == region_before).to_numpy()
+
+    return pd.DataFrame(
+        {
+            "Start Time": times[:-1][consistent],
+            "End Time": times[1:][consistent],
+            "Region": region_after.to_numpy()[consistent],
+        }
+    )
+
+
+def _crossings_within(
+    edges: np.ndarray, start: np.ndarray, end: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """For each segment from start to end, find the fraction along the
+    segment at which it crosses each of a sorted array of edges.
+
+    Returns the segment index and fraction of each crossing, flattened over
+    all segments.
+    """
+
+    lower = np.minimum(start, end)
+    upper = np.maximum(start, end)
+
+    # Only edges strictly within the segment are crossings
+    first_edge = np.searchsorted(edges, lower, side="right")
+    last_edge = np.searchsorted(edges, upper, side="left")
+    n_crossings = np.maximum(last_edge - first_edge, 0)
+
+    segment_indices = np.repeat(np.arange(len(start)), n_crossings)
+
+    # The position of each crossing within its segment's run of edges
+    offsets = np.arange(len(segment_indices)) - np.repeat(
+        np.cumsum(n_crossings) - n_crossings, n_crossings
+    )
+    edge_indices = first_edge[segment_indices] + offsets
+
+    fractions = (edges[edge_indices] - start[segment_indices]) / (
+        end[segment_indices] - start[segment_indices]
+    )
+
+    return segment_indices, fractions
+
+
+def _locate_in_intervals(
+    times: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find which of a sorted set of non-overlapping intervals each time falls
+    within. Returns the interval indices, and a mask of times within any
+    interval."""
+
+    indices = np.searchsorted(starts, times, side="right") - 1
+
+    inside = indices >= 0
+    inside[inside] = times[inside] < ends[indices[inside]]
+
+    return indices, inside
+
+
+def _accumulate_samples(
+    counts: np.ndarray,
+    seconds: np.ndarray,
+    x: np.ndarray,
+    cyl: np.ndarray,
+    intervals: tuple[np.ndarray, np.ndarray, np.ndarray],
+    x_edges: np.ndarray,
+    cyl_edges: np.ndarray,
+):
+    """Add the number of samples in each (region, x bin, cyl bin) to counts
+    (in place). See _accumulate_dwell_time() for parameters."""
+
+    interval_starts, interval_ends, interval_codes = intervals
+
+    interval_indices, in_interval = _locate_in_intervals(
+        seconds, interval_starts, interval_ends
+    )
+    bin_indices, in_map = _flat_bin_indices([x, cyl], [x_edges, cyl_edges])
+
+    keep = in_interval & in_map
+    n_bins = counts[0].size
+
+    counts += np.bincount(
+        interval_codes[interval_indices[keep]] * n_bins + bin_indices[keep],
+        minlength=counts.size,
+    ).reshape(counts.shape)
+
+
+def _accumulate_dwell_time(
+    counts: np.ndarray,
+    seconds: np.ndarray,
+    x: np.ndarray,
+    cyl: np.ndarray,
+    intervals: tuple[np.ndarray, np.ndarray, np.ndarray],
+    x_edges: np.ndarray,
+    cyl_edges: np.ndarray,
+    max_gap: float,
+):
+    """Add the time spent in each (region, x bin, cyl bin) along a trajectory
+    to counts (in place).
+
+    The trajectory is treated as linear segments between consecutive
+    samples. Each segment is split wherever it crosses a bin edge or a region
+    interval boundary, and the duration of each piece is assigned to the bin
+    and region at its midpoint.
+
+    Params
+    ------
+    counts: np.ndarray
+        Array of shape (n_regions, n_x_bins, n_cyl_bins) to add to
+
+    seconds, x, cyl: np.ndarray
+        Sample times (seconds from any reference) and positions (radii)
+
+    intervals: tuple[np.ndarray, np.ndarray, np.ndarray]
+        Start times, end times (seconds, same reference) and region codes of
+        non-overlapping region intervals, sorted by time
+
+    x_edges, cyl_edges: np.ndarray
+        Bin edges
+
+    max_gap: float
+        Segments longer than this (seconds) are data gaps, and are skipped
+    """
+
+    interval_starts, interval_ends, interval_codes = intervals
+
+    segment_durations = np.diff(seconds)
+    valid_segments = np.flatnonzero(
+        (segment_durations > 0) & (segment_durations <= max_gap)
+    )
+
+    t0 = seconds[valid_segments]
+    t1 = seconds[valid_segments + 1]
+    x0 = x[valid_segments]
+    x1 = x[valid_segments + 1]
+    cyl0 = cyl[valid_segments]
+    cyl1 = cyl[valid_segments + 1]
+
+    # Find every point at which a segment must be split
+    boundary_times = np.unique(np.concatenate([interval_starts, interval_ends]))
+
+    x_segments, x_fractions = _crossings_within(x_edges, x0, x1)
+    cyl_segments, cyl_fractions = _crossings_within(cyl_edges, cyl0, cyl1)
+    time_segments, time_fractions = _crossings_within(boundary_times, t0, t1)
+
+    split_segments = np.concatenate(
+        [np.arange(len(t0)), x_segments, cyl_segments, time_segments]
+    )
+    split_fractions = np.concatenate(
+        [np.zeros(len(t0)), x_fractions, cyl_fractions, time_fractions]
+    )
+
+    order = np.lexsort((split_fractions, split_segments))
+    split_segments = split_segments[order]
+    split_fractions = split_fractions[order]
+
+    # Each piece runs until the next split in the same segment, or the end of
+    # the segment.
+    piece_ends = np.ones_like(split_fractions)
+    same_segment = split_segments[1:] == split_segments[:-1]
+    piece_ends[:-1][same_segment] = split_fractions[1:][same_segment]
+
+    midpoints = (split_fractions + piece_ends) / 2
+
+    piece_x = x0[split_segments] + midpoints * (x1 - x0)[split_segments]
+    piece_cyl = cyl0[split_segments] + midpoints * (cyl1 - cyl0)[split_segments]
+    piece_times = t0[split_segments] + midpoints * (t1 - t0)[split_segments]
+    piece_durations = (piece_ends - split_fractions) * (t1 - t0)[split_segments]
+
+    # Which region interval (if any) is each piece within
+    interval_indices, in_interval = _locate_in_intervals(
+        piece_times, interval_starts, interval_ends
+    )
+
+    bin_indices, in_map = _flat_bin_indices([piece_x, piece_cyl], [x_edges, cyl_edges])
+
+    keep = in_interval & in_map
+    n_bins = counts[0].size
+
+    counts += np.bincount(
+        interval_codes[interval_indices[keep]] * n_bins + bin_indices[keep],
+        weights=piece_durations[keep],
+        minlength=counts.size,
+    ).reshape(counts.shape)
+
+
+def _encode_intervals(
+    intervals: pd.DataFrame, reference: np.datetime64, region_names: list[str]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Convert region intervals to seconds since a reference time and integer
+    region codes, dropping regions not in region_names"""
+
+    codes = pd.Index(region_names).get_indexer(intervals["Region"])
+    known = codes >= 0
+
+    return (
+        _seconds_since(intervals["Start Time"].to_numpy()[known], reference),
+        _seconds_since(intervals["End Time"].to_numpy()[known], reference),
+        codes[known].astype(np.intp),
+    )
+
+
+def _seconds_since(times, reference: np.datetime64) -> np.ndarray:
+    return (np.asarray(times, dtype="datetime64[ns]") - reference) / np.timedelta64(
+        1, "s"
+    )
+
+
+def dwell_time_map(
+    times,
+    x,
+    cyl,
+    crossings: pd.DataFrame,
+    bin_size: float = 0.25,
+    x_range: tuple[float, float] = (-5, 5),
+    cyl_range: tuple[float, float] = (0, 8),
+    region_names: list[str] = REGION_NAMES,
+    max_gap: dt.timedelta = dt.timedelta(minutes=1),
+) -> RegionProbabilityMap:
+    """Create a probability map from the exact time MESSENGER spent in each
+    region within each bin.
+
+    Rather than labelling point samples of the ephemeris and histogramming
+    them, the crossing list is converted directly into region intervals, and
+    the trajectory between samples is intersected with the bin edges and
+    interval boundaries. This is more accurate than counting point samples,
+    and does not require a fine (or evenly sampled) ephemeris.
+
+    Params
+    ------
+    times: array-like
+        Ephemeris sample times, in chronological order
+
+    x: array-like
+        X MSM' positions (radii)
+
+    cyl: array-like
+        CYL MSM' positions (radii)
+
+    crossings: pd.DataFrame
+        Crossing list with columns "Time" and "Label"
+
+    bin_size: float {default 0.25}
+        Size of each bin in both X and CYL (radii)
+
+    x_range: tuple[float, float] {default (-5, 5)}
+        Limits of the map in X MSM' (radii)
+
+    cyl_range: tuple[float, float] {default (0, 8)}
+        Limits of the map in CYL MSM' (radii)
+
+    region_names: list[str] {default REGION_NAMES}
+        Which regions to include in the map
+
+    max_gap: dt.timedelta {default 1 minute}
+        Consecutive samples further apart than this are treated as a data gap,
+        and the time between them is not counted
+
+    Returns
+    -------
+    RegionProbabilityMap
+        Map with counts in seconds (i.e. a sample_interval of 1)
+    """
+
+    builder = ChunkedMapBuilder(
+        crossings,
+        method="dwell",
+        bin_size=bin_size,
+        x_range=x_range,
+        cyl_range=cyl_range,
+        region_names=region_names,
+        max_gap=max_gap,
+    )
+    builder.add(times, x, cyl)
+
+    return builder.to_map()
+
+
+class ChunkedMapBuilder:
+    """Build a probability map incrementally, from an ephemeris supplied in
+    chunks.
+
+    Only the region intervals and the per-bin counts are kept in memory, so
+    maps can be made from the full resolution MESSENGER ephemeris (well over
+    100 million samples) with bounded memory. Chunks must be added in
+    chronological order. As each sample is labelled from the full crossing
+    list, crossings which straddle chunk boundaries are handled correctly. In
+    "dwell" mode, the final sample of each chunk is kept so that the segment
+    between chunks is also counted.
+
+    Params
+    ------
+    crossings: pd.DataFrame
+        Crossing list with columns "Time" and "Label"
+
+    method: str {default "samples"}
+        "samples": count each ephemeris sample within a region interval, as
+        in create_messenger_dataset.py.
+        "dwell": accumulate the exact time spent in each bin, as in
+        dwell_time_map().
+
+    sample_interval: float {default 1}
+        Seconds of data represented by each ephemeris sample. Only used in
+        "samples" mode, "dwell" maps always count seconds.
+
+    bin_size, x_range, cyl_range, region_names:
+        See RegionProbabilityMap.from_prediction_data()
+
+    max_gap: dt.timedelta {default 1 minute}
+        See dwell_time_map()
+    """
+
+    def __init__(
+        self,
+        crossings: pd.DataFrame,
+        method: str = "samples",
+        sample_interval: float = 1,
+        bin_size: float = 0.25,
+        x_range: tuple[float, float] = (-5, 5),
+        cyl_range: tuple[float, float] = (0, 8),
+        region_names: list[str] = REGION_NAMES,
+        max_gap: dt.timedelta = dt.timedelta(minutes=1),
+    ):
+        if method not in ["samples", "dwell"]:
+            raise ValueError(
+                f"Unknown method '{method}', expected 'samples' or 'dwell'"
+            )
+
+        self.method = method
+        self.sample_interval = sample_interval if method == "samples" else 1
+        self.region_names = list(region_names)
+        self.max_gap = max_gap.total_seconds()
+
+        self.x_edges = np.arange(x_range[0], x_range[1] + bin_size, bin_size)
+        self.cyl_edges = np.arange(cyl_range[0], cyl_range[1] + bin_size, bin_size)
+
+        self.counts = np.zeros(
+            (len(self.region_names), len(self.x_edges) - 1, len(self.cyl_edges) - 1)
+        )
+
+        # All times are handled as seconds since the first crossing
+        intervals = region_intervals(crossings)
+        self.reference = np.datetime64(intervals["Start Time"].min(), "ns")
+        self.intervals = _encode_intervals(intervals, self.reference, region_names)
+
+        # The last sample of the previous chunk, in dwell mode
+        self._previous_sample: tuple[float, float, float] | None = None
+
+    def add(self, times, x, cyl):
+        """Add a chunk of the ephemeris
+
+        Params
+        ------
+        times: array-like
+            Sample times, in chronological order, and after any previous
+            chunk
+
+        x: array-like
+            X MSM' positions (radii)
+
+        cyl: array-like
+            CYL MSM' positions (radii)
+        """
+
+        seconds = _seconds_since(times, self.reference)
+        x = np.asarray(x, dtype=float)
+        cyl = np.asarray(cyl, dtype=float)
+
+        if len(seconds) == 0:
+            return
+
+        if self.method == "samples":
+            _accumulate_samples(
+                self.counts,
+                seconds,
+                x,
+                cyl,
+                self.intervals,
+                self.x_edges,
+                self.cyl_edges,
+            )
+            return
+
+        # In dwell mode, we count the segments between samples, so we need to
+        # include the segment joining this chunk to the previous.
+        if self._previous_sample is not None:
+            previous_seconds, previous_x, previous_cyl = self._previous_sample
+            seconds = np.concatenate([[previous_seconds], seconds])
+            x = np.concatenate([[previous_x], x])
+            cyl = np.concatenate([[previous_cyl], cyl])
+
+        _accumulate_dwell_time(
+            self.counts,
+            seconds,
+            x,
+            cyl,
+            self.intervals,
+            self.x_edges,
+            self.cyl_edges,
+            self.max_gap,
+        )
+
+        self._previous_sample = (seconds[-1], x[-1], cyl[-1])
+
+    def add_ephemeris(self, ephemeris: pd.DataFrame):
+        """Add a chunk of the ephemeris from a dataframe with columns "Time",
+        "X MSM' (radii)", "Y MSM' (radii)", and "Z MSM' (radii)"."""
+
+        self.add(
+            ephemeris["Time"],
+            ephemeris["X MSM' (radii)"],
+            np.sqrt(
+                ephemeris["Y MSM' (radii)"] ** 2 + ephemeris["Z MSM' (radii)"] ** 2
+            ),
+        )
+
+    def to_map(self) -> RegionProbabilityMap:
+        """Create a probability map from the counts so far"""
+
+        return RegionProbabilityMap(
+            self.x_edges,
+            self.cyl_edges,
+            self.counts.copy(),
+            self.region_names,
+            self.sample_interval,
+        )
+
+
+def build_map_chunked(
+    ephemeris_chunks, crossings: pd.DataFrame, **kwargs
+) -> RegionProbabilityMap:
+    """Create a probability map from an ephemeris supplied as an iterable of
+    dataframes, e.g. pd.read_csv(..., chunksize=1_000_000).
+
+    Params
+    ------
+    ephemeris_chunks: Iterable[pd.DataFrame]
+        Chronological chunks of the ephemeris, with columns "Time",
+        "X MSM' (radii)", "Y MSM' (radii)", and "Z MSM' (radii)"
+
+    crossings: pd.DataFrame
+        Crossing list with columns "Time" and "Label"
+
+    **kwargs:
+        Passed to ChunkedMapBuilder
+
+    Returns
+    -------
+    RegionProbabilityMap
+    """
+
+    builder = ChunkedMapBuilder(crossings, **kwargs)
+
+    for chunk in ephemeris_chunks:
+        builder.add_ephemeris(chunk)
+
+    return builder.to_map()
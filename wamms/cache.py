@@ -0,0 +1,248 @@
+"""
+On-disk cache of SPICE ephemeris queries
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+
+import numpy as np
+import planetary_coverage as pc
+
+DEFAULT_CACHE_DIRECTORY = (
+    pathlib.Path(os.environ.get("XDG_CACHE_HOME", "~/.cache")).expanduser()
+    / "wamms"
+    / "ephemeris"
+)
+
+
+class EphemerisCache:
+    """A local, content-addressed cache of spacecraft positions from SPICE.
+
+    Positions returned by spice.spkpos are deterministic for a given set of
+    kernels, frame, and time grid, so we can store them on disk and skip
+    SPICE entirely when the same span is requested again. Each entry is keyed
+    by a hash of the contents of the kernel files, so entries computed with
+    an older planning kernel release are never returned. These stale entries
+    can be removed with prune(), and are otherwise evicted like any other
+    entry once the cache grows beyond max_size.
+
+    Entries are stored as uncompressed .npz files with one array per
+    coordinate. When the cache is larger than max_size, the least recently
+    used entries are removed.
+
+    Params
+    ------
+    directory: str | pathlib.Path {default DEFAULT_CACHE_DIRECTORY}
+        Where to store cache entries
+
+    max_size: int {default 2 GB}
+        Maximum total size of the cache entries (bytes)
+    """
+
+    def __init__(
+        self,
+        directory: str | pathlib.Path = DEFAULT_CACHE_DIRECTORY,
+        max_size: int = 2 * 1024**3,
+    ):
+        self.directory = pathlib.Path(directory).expanduser()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.max_size = max_size
+
+        # Hashing the kernel files is slow, so we remember the hashes for
+        # files we have already seen, as long as they haven't been modified.
+        self._kernel_hashes: dict[tuple[str, int, int], str] = {}
+
+    def kernel_hash(self, metakernel: str | pathlib.Path | pc.MetaKernel) -> str:
+        """Hash the contents of the metakernel and all kernels it lists
+
+        Params
+        ------
+        metakernel: str | pathlib.Path | pc.MetaKernel
+            The metakernel used to compute the ephemeris
+
+        Returns
+        -------
+        str
+            Hex digest identifying this kernel set
+        """
+
+        if isinstance(metakernel, pc.MetaKernel):
+            paths = [metakernel.fname, *metakernel.kernels]
+
+        else:
+            try:
+                paths = [metakernel, *pc.MetaKernel(metakernel).kernels]
+            except (FileNotFoundError, KeyError):
+                # If planetary_coverage can't parse the metakernel, we fall
+                # back on its text alone.
+                paths = [metakernel]
+
+        combined_hash = hashlib.sha256()
+        for path in paths:
+            path = pathlib.Path(path).resolve()
+            stat = path.stat()
+
+            signature = (str(path), stat.st_size, stat.st_mtime_ns)
+
+            if signature not in self._kernel_hashes:
+                with open(path, "rb") as f:
+                    self._kernel_hashes[signature] = hashlib.file_digest(
+                        f, "sha256"
+                    ).hexdigest()
+
+            combined_hash.update(self._kernel_hashes[signature].encode())
+
+        return combined_hash.hexdigest()
+
+    def key(
+        self,
+        metakernel: str | pathlib.Path | pc.MetaKernel,
+        **query,
+    ) -> str:
+        """Determine the cache key for an ephemeris query
+
+        Params
+        ------
+        metakernel: str | pathlib.Path | pc.MetaKernel
+            The metakernel used to compute the ephemeris
+
+        **query:
+            Any JSON serialisable parameters which define the query, e.g. the
+            target, frame, and time span.
+
+        Returns
+        -------
+        str
+            The cache key. The first part identifies the kernel set, which is
+            used by prune().
+        """
+
+        query_hash = hashlib.sha256(
+            json.dumps(query, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        return f"{self.kernel_hash(metakernel)[:16]}-{query_hash[:32]}"
+
+    def get(self, key: str) -> np.ndarray | None:
+        """Retrieve positions from the cache
+
+        Params
+        ------
+        key: str
+            Key from self.key()
+
+        Returns
+        -------
+        np.ndarray | None
+            Positions of shape (N, 3), or None if the key is not cached
+        """
+
+        path = self.directory / f"{key}.npz"
+
+        try:
+            with np.load(path) as data:
+                positions = np.column_stack((data["x"], data["y"], data["z"]))
+
+        except FileNotFoundError:
+            return None
+
+        # Mark the entry as recently used, unless another process sharing
+        # the cache has removed it since it was read
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+
+        return positions
+
+    def put(self, key: str, positions: np.ndarray):
+        """Add positions to the cache, evicting old entries if needed
+
+        Params
+        ------
+        key: str
+            Key from self.key()
+
+        positions: np.ndarray
+            Positions of shape (N, 3)
+        """
+
+        path = self.directory / f"{key}.npz"
+
+        # Write to a temporary file first, so that other processes never see
+        # a partially written entry.
+        temporary_path = self.directory / f"{key}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temporary_path,
+            x=positions[:, 0],
+            y=positions[:, 1],
+            z=positions[:, 2],
+        )
+        os.replace(temporary_path, path)
+
+        self.evict()
+
+    def _entry_stats(self) -> list[tuple[pathlib.Path, os.stat_result]]:
+        """All cache entries and their stat results, from least to most
+        recently used"""
+
+        entry_stats = []
+        for path in self.directory.glob("*.npz"):
+            if path.name.endswith(".tmp.npz"):
+                continue
+
+            # Another process sharing the cache may have removed the entry
+            # since it was listed.
+            try:
+                entry_stats.append((path, path.stat()))
+            except FileNotFoundError:
+                continue
+
+        return sorted(entry_stats, key=lambda entry: entry[1].st_mtime)
+
+    def entries(self) -> list[pathlib.Path]:
+        """All cache entries, from least to most recently used"""
+        return [path for path, _ in self._entry_stats()]
+
+    @property
+    def size(self) -> int:
+        """Total size of all cache entries (bytes)"""
+        return sum(stat.st_size for _, stat in self._entry_stats())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits within
+        self.max_size"""
+
+        entry_stats = self._entry_stats()
+        total_size = sum(stat.st_size for _, stat in entry_stats)
+
+        for path, stat in entry_stats:
+            if total_size <= self.max_size:
+                break
+
+            path.unlink(missing_ok=True)
+            total_size -= stat.st_size
+
+    def prune(self, metakernel: str | pathlib.Path | pc.MetaKernel):
+        """Remove all entries which were not computed with the current
+        contents of a metakernel, e.g. after a new planning kernel release.
+
+        Params
+        ------
+        metakernel: str | pathlib.Path | pc.MetaKernel
+            The current metakernel
+        """
+
+        current_prefix = self.kernel_hash(metakernel)[:16]
+
+        for path in self.entries():
+            if not path.name.startswith(current_prefix):
+                path.unlink(missing_ok=True)
+
+    def clear(self):
+        """Remove all entries"""
+
+        for path in self.entries():
+            path.unlink(missing_ok=True)
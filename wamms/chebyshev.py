@@ -0,0 +1,302 @@
+"""
+Piecewise Chebyshev polynomial fits of spacecraft positions, for fast
+evaluation at arbitrary times without SPICE
+"""
+
+import pathlib
+
+import numpy as np
+
+__all__ = ["ChebyshevEphemeris"]
+
+
+class ChebyshevEphemeris:
+    """Positions represented as piecewise Chebyshev polynomials in ephemeris
+    time.
+
+    The fitted span is split into contiguous segments, each with its own
+    polynomial for each coordinate. Segments are subdivided during fitting
+    until the fit is within a given tolerance, so they are short near
+    periapsis and long elsewhere.
+    """
+
+    def __init__(
+        self,
+        segment_starts: np.ndarray,
+        segment_ends: np.ndarray,
+        coefficients: np.ndarray,
+        tolerance: float,
+    ):
+        """
+        Params
+        ------
+        segment_starts: np.ndarray
+            Ephemeris time at the start of each segment, sorted
+
+        segment_ends: np.ndarray
+            Ephemeris time at the end of each segment. Each segment ends where
+            the next starts.
+
+        coefficients: np.ndarray
+            Chebyshev coefficients of shape (n_segments, degree + 1, 3)
+
+        tolerance: float
+            The maximum error of the fit, in the units of the positions
+        """
+
+        self.segment_starts = np.asarray(segment_starts, dtype=float)
+        self.segment_ends = np.asarray(segment_ends, dtype=float)
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.tolerance = float(tolerance)
+
+    @property
+    def start(self) -> float:
+        """Ephemeris time of the start of the fitted span"""
+        return self.segment_starts[0]
+
+    @property
+    def end(self) -> float:
+        """Ephemeris time of the end of the fitted span"""
+        return self.segment_ends[-1]
+
+    @property
+    def degree(self) -> int:
+        return self.coefficients.shape[1] - 1
+
+    @classmethod
+    def fit(
+        cls,
+        position_function,
+        start: float,
+        end: float,
+        tolerance: float,
+        degree: int = 12,
+        segment_length: float = 6 * 3600,
+        min_segment_length: float = 1,
+    ):
+        """Fit positions over a span of ephemeris time
+
+        Segments are fit by interpolating at Chebyshev nodes, and checked at
+        the points between the nodes (including the segment ends). Any
+        segment which isn't within tolerance is split in half and fit again.
+        All segments at each level of subdivision are evaluated with a single
+        call to position_function.
+
+        Params
+        ------
+        position_function: callable
+            Function taking an array of ephemeris times, and returning
+            positions of shape (N, 3)
+
+        start: float
+            Ephemeris time to start the fit
+
+        end: float
+            Ephemeris time to end the fit
+
+        tolerance: float
+            Maximum allowed distance between the fit and position_function at
+            the check points, in the units of the positions
+
+        degree: int {default 12}
+            Degree of the polynomial for each segment
+
+        segment_length: float {default 6 * 3600}
+            Initial length of segments (seconds), before subdivision
+
+        min_segment_length: float {default 1}
+            If a segment shorter than this (seconds) can't be fit within
+            tolerance, an error is raised
+
+        Returns
+        -------
+        ChebyshevEphemeris
+        """
+
+        if end <= start:
+            raise ValueError("End of the fit must be after the start")
+
+        n_nodes = degree + 1
+
+        # Nodes, and the extrema between (and either side of) them, on [-1, 1]
+        nodes = np.cos(np.pi * (np.arange(n_nodes) + 0.5) / n_nodes)
+        check_points = np.cos(np.pi * np.arange(n_nodes + 1) / n_nodes)
+
+        # Matrix from positions at the nodes to coefficients
+        transform = (2 / n_nodes) * np.cos(
+            np.pi * np.outer(np.arange(n_nodes), np.arange(n_nodes) + 0.5) / n_nodes
+        )
+        transform[0] /= 2
+
+        n_segments = int(np.ceil((end - start) / segment_length))
+        edges = np.linspace(start, end, n_segments + 1)
+        pending_starts = edges[:-1]
+        pending_ends = edges[1:]
+
+        accepted_starts = []
+        accepted_ends = []
+        accepted_coefficients = []
+
+        while len(pending_starts) > 0:
+            midpoints = (pending_starts + pending_ends) / 2
+            half_lengths = (pending_ends - pending_starts) / 2
+
+            local_points = np.concatenate([nodes, check_points])
+            times = midpoints[:, None] + half_lengths[:, None] * local_points
+
+            positions = np.asarray(position_function(times.ravel()), dtype=float)
+            positions = positions.reshape(len(pending_starts), len(local_points), 3)
+
+            coefficients = np.einsum("jk,skd->sjd", transform, positions[:, :n_nodes])
+
+            fitted = _clenshaw(
+                coefficients,
+                np.arange(len(pending_starts)),
+                np.broadcast_to(check_points, (len(pending_starts), n_nodes + 1)),
+            )
+            errors = np.linalg.norm(fitted - positions[:, n_nodes:], axis=2).max(axis=1)
+
+            converged = errors <= tolerance
+
+            accepted_starts.append(pending_starts[converged])
+            accepted_ends.append(pending_ends[converged])
+            accepted_coefficients.append(coefficients[converged])
+
+            pending_starts = pending_starts[~converged]
+            pending_ends = pending_ends[~converged]
+            pending_midpoints = midpoints[~converged]
+
+            if np.any(pending_ends - pending_starts < 2 * min_segment_length):
+                raise RuntimeError(
+                    f"Could not fit positions within a tolerance of {tolerance}. "
+                    "Try a larger tolerance or degree."
+                )
+
+            # Split the remaining segments in half
+            pending_starts, pending_ends = (
+                np.concatenate([pending_starts, pending_midpoints]),
+                np.concatenate([pending_midpoints, pending_ends]),
+            )
+
+        segment_starts = np.concatenate(accepted_starts)
+        order = np.argsort(segment_starts)
+
+        return cls(
+            segment_starts[order],
+            np.concatenate(accepted_ends)[order],
+            np.concatenate(accepted_coefficients)[order],
+            tolerance,
+        )
+
+    def evaluate(self, spice_times) -> np.ndarray:
+        """Evaluate the positions at any set of ephemeris times
+
+        Params
+        ------
+        spice_times: array-like
+            Ephemeris times, within the fitted span
+
+        Returns
+        -------
+        np.ndarray
+            Positions of shape (N, 3)
+        """
+
+        spice_times = np.asarray(spice_times, dtype=float).ravel()
+
+        if np.any((spice_times < self.start) | (spice_times > self.end)):
+            raise ValueError("Times are outside of the fitted span")
+
+        segments = np.clip(
+            np.searchsorted(self.segment_starts, spice_times, side="right") - 1,
+            0,
+            len(self.segment_starts) - 1,
+        )
+
+        midpoints = (self.segment_starts[segments] + self.segment_ends[segments]) / 2
+        half_lengths = (self.segment_ends[segments] - self.segment_starts[segments]) / 2
+
+        return _clenshaw(
+            self.coefficients,
+            segments,
+            ((spice_times - midpoints) / half_lengths)[:, None],
+        )[:, 0]
+
+    def save(self, path: str | pathlib.Path):
+        """Save the fit to a compressed .npz file
+
+        Params
+        ------
+        path: str | pathlib.Path
+            File to save to
+        """
+
+        np.savez_compressed(
+            path,
+            segment_starts=self.segment_starts,
+            segment_ends=self.segment_ends,
+            coefficients=self.coefficients,
+            tolerance=self.tolerance,
+        )
+
+    @classmethod
+    def load(cls, path: str | pathlib.Path):
+        """Load a fit previously saved with save()
+
+        Params
+        ------
+        path: str | pathlib.Path
+            .npz file to load from
+
+        Returns
+        -------
+        ChebyshevEphemeris
+        """
+
+        with np.load(path) as data:
+            return cls(
+                data["segment_starts"],
+                data["segment_ends"],
+                data["coefficients"],
+                float(data["tolerance"]),
+            )
+
+
+def _clenshaw(
+    coefficients: np.ndarray, segments: np.ndarray, x: np.ndarray
+) -> np.ndarray:
+    """Evaluate Chebyshev series with Clenshaw's recurrence
+
+    Params
+    ------
+    coefficients: np.ndarray
+        Coefficients of shape (n_segments, degree + 1, 3)
+
+    segments: np.ndarray
+        Index of the segment to use for each row of x, of shape (N,)
+
+    x: np.ndarray
+        Points on [-1, 1] of shape (N, M), at which to evaluate the series
+
+    Returns
+    -------
+    np.ndarray
+        Values of shape (N, M, 3)
+    """
+
+    # We only gather one coefficient per segment at a time, so memory use
+    # doesn't scale with the degree.
+    coefficients = np.ascontiguousarray(np.moveaxis(coefficients, 1, 0))
+    x = x[:, :, None]
+    two_x = 2 * x
+
+    b_1 = np.zeros(x.shape[:2] + (coefficients.shape[2],))
+    b_2 = np.zeros_like(b_1)
+
+    for k in range(coefficients.shape[0] - 1, 0, -1):
+        b_1, b_2 = (
+            np.take(coefficients[k], segments, axis=0)[:, None] + two_x * b_1 - b_2,
+            b_1,
+        )
+
+    return np.take(coefficients[0], segments, axis=0)[:, None] + x * b_1 - b_2
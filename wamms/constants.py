@@ -0,0 +1,15 @@
+"""
+Physical constants used throughout the package
+"""
+
+import pathlib
+import tomllib
+
+
+def load_constants() -> dict:
+    """Load the physical constants in pkgdata/constants.toml"""
+
+    with open(
+        pathlib.Path(__file__).resolve().parent / "pkgdata" / "constants.toml", "rb"
+    ) as f:
+        return tomllib.load(f)
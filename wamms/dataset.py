@@ -0,0 +1,207 @@
+"""
+Conversion and loading of the MESSENGER region observations dataset in a
+columnar binary format
+"""
+
+import json
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from wamms.maps import REGION_NAMES
+
+__all__ = [
+    "PREDICTION_DATA_COLUMNS",
+    "convert_prediction_data",
+    "save_prediction_data",
+    "load_prediction_data",
+]
+
+# Each column is stored as its own .npy file, with these data types
+PREDICTION_DATA_COLUMNS = {
+    "Predicted Region": ("predicted_region.npy", np.int8),
+    "Heliocentric Distance": ("heliocentric_distance.npy", np.float32),
+    "X MSM' (radii)": ("x_msm.npy", np.float32),
+    "CYL MSM' (radii)": ("cyl_msm.npy", np.float32),
+}
+
+
+def _count_csv_rows(csv_path: pathlib.Path) -> int:
+    """Count the number of data rows in a csv file, without parsing it"""
+
+    n_lines = 0
+    last_byte = b"\n"
+    with open(csv_path, "rb") as f:
+        while block := f.read(64 * 1024**2):
+            n_lines += block.count(b"\n")
+            last_byte = block[-1:]
+
+    # Account for a missing trailing newline, and the header row
+    if last_byte != b"\n":
+        n_lines += 1
+
+    return n_lines - 1
+
+
+def _write_metadata(directory: pathlib.Path, region_names: list[str]):
+    with open(directory / "metadata.json", "w") as f:
+        json.dump(
+            {
+                "regions": region_names,
+                "columns": {
+                    column: file_name
+                    for column, (file_name, _) in PREDICTION_DATA_COLUMNS.items()
+                },
+            },
+            f,
+            indent=4,
+        )
+
+
+def _encode_chunk(chunk: pd.DataFrame, region_names: list[str]) -> dict:
+    """Convert a chunk of prediction data into the on-disk data types"""
+
+    encoded = {}
+    for column, (_, dtype) in PREDICTION_DATA_COLUMNS.items():
+        if column == "Predicted Region":
+            # Store integer region codes rather than repeating the strings.
+            # Unknown regions are stored as -1.
+            encoded[column] = (
+                pd.Index(region_names).get_indexer(chunk[column]).astype(dtype)
+            )
+        else:
+            encoded[column] = chunk[column].to_numpy(dtype=dtype)
+
+    return encoded
+
+
+def convert_prediction_data(
+    csv_path: str | pathlib.Path,
+    output_directory: str | pathlib.Path,
+    chunksize: int = 5_000_000,
+    region_names: list[str] = REGION_NAMES,
+):
+    """Convert the MESSENGER region observations csv into a directory of
+    .npy files, which can be loaded much faster with load_prediction_data().
+
+    The csv is processed in chunks, so the full text file never needs to fit
+    in memory.
+
+    Params
+    ------
+    csv_path: str | pathlib.Path
+        messenger_region_observations.csv, as created by
+        resources/region_probabilities/create_messenger_dataset.py
+
+    output_directory: str | pathlib.Path
+        Directory to write the converted dataset to
+
+    chunksize: int {default 5000000}
+        Number of csv rows to parse at once
+
+    region_names: list[str] {default REGION_NAMES}
+        Region names to encode as integer codes, in order
+    """
+
+    csv_path = pathlib.Path(csv_path)
+    output_directory = pathlib.Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+
+    n_rows = _count_csv_rows(csv_path)
+
+    # Now that we know the length of the dataset, we can create each output
+    # array on disk, and fill them in chunk by chunk.
+    outputs = {
+        column: np.lib.format.open_memmap(
+            output_directory / file_name, mode="w+", dtype=dtype, shape=(n_rows,)
+        )
+        for column, (file_name, dtype) in PREDICTION_DATA_COLUMNS.items()
+    }
+
+    row = 0
+    for chunk in pd.read_csv(
+        csv_path, usecols=list(PREDICTION_DATA_COLUMNS), chunksize=chunksize
+    ):
+        for column, values in _encode_chunk(chunk, region_names).items():
+            outputs[column][row : row + len(chunk)] = values
+
+        row += len(chunk)
+
+    for output in outputs.values():
+        output.flush()
+
+    if row != n_rows:
+        raise ValueError(
+            f"Expected {n_rows} rows in {csv_path}, but only {row} were parsed"
+        )
+
+    _write_metadata(output_directory, region_names)
+
+
+def save_prediction_data(
+    prediction_data: pd.DataFrame,
+    output_directory: str | pathlib.Path,
+    region_names: list[str] = REGION_NAMES,
+):
+    """Save a MESSENGER region observations dataframe in the format read by
+    load_prediction_data()
+
+    Params
+    ------
+    prediction_data: pd.DataFrame
+        MESSENGER region observations
+
+    output_directory: str | pathlib.Path
+        Directory to write the dataset to
+
+    region_names: list[str] {default REGION_NAMES}
+        Region names to encode as integer codes, in order
+    """
+
+    output_directory = pathlib.Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+
+    for column, values in _encode_chunk(prediction_data, region_names).items():
+        np.save(output_directory / PREDICTION_DATA_COLUMNS[column][0], values)
+
+    _write_metadata(output_directory, region_names)
+
+
+def load_prediction_data(
+    directory: str | pathlib.Path, mmap: bool = True
+) -> pd.DataFrame:
+    """Load a MESSENGER region observations dataset converted with
+    convert_prediction_data()
+
+    Params
+    ------
+    directory: str | pathlib.Path
+        Directory containing the converted dataset
+
+    mmap: bool {default True}
+        If True, the arrays are memory mapped rather than read into memory
+
+    Returns
+    -------
+    pd.DataFrame
+        The region observations, with the same columns as the original csv.
+        "Predicted Region" is a categorical column. This can be used directly
+        as <spacecraft>.prediction_data.
+    """
+
+    directory = pathlib.Path(directory)
+
+    with open(directory / "metadata.json") as f:
+        metadata = json.load(f)
+
+    columns = {
+        column: np.load(directory / file_name, mmap_mode="r" if mmap else None)
+        for column, file_name in metadata["columns"].items()
+    }
+
+    columns["Predicted Region"] = pd.Categorical.from_codes(
+        columns["Predicted Region"], categories=metadata["regions"]
+    )
+
+    return pd.DataFrame(columns, copy=False)
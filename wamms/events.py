@@ -0,0 +1,89 @@
+"""
+Refinement of the times of predicted region transitions
+"""
+
+import numpy as np
+
+from wamms.builders import NEXT_CROSSING_REGIONS, PREVIOUS_CROSSING_REGIONS
+
+# Crossing list labels, by the regions before and after the crossing
+TRANSITION_LABELS = {
+    (NEXT_CROSSING_REGIONS[label], PREVIOUS_CROSSING_REGIONS[label]): label
+    for label in PREVIOUS_CROSSING_REGIONS
+}
+
+
+def transition_label(region_before: str, region_after: str) -> str:
+    """The crossing list label (e.g. "BS_IN") for a transition between two
+    regions. Transitions which aren't in the crossing list vocabulary are
+    labelled "{region_before} -> {region_after}"."""
+
+    return TRANSITION_LABELS.get(
+        (region_before, region_after), f"{region_before} -> {region_after}"
+    )
+
+
+def bisect_transitions(
+    state_function,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    start_states: np.ndarray,
+    end_states: np.ndarray,
+    tolerance: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Narrow down the time of a change of state within each of a set of
+    intervals, by bisection.
+
+    All intervals are bisected together, so each iteration only needs one
+    call to state_function. If the state changes more than once within an
+    interval, the change found is not necessarily the first.
+
+    Params
+    ------
+    state_function: callable
+        Function taking an array of times (floats), and returning an integer
+        state at each
+
+    starts: np.ndarray
+        Start time of each interval
+
+    ends: np.ndarray
+        End time of each interval, at which the state differs from the start
+
+    start_states: np.ndarray
+        State at the start of each interval
+
+    end_states: np.ndarray
+        State at the end of each interval
+
+    tolerance: float
+        Intervals are bisected until they are shorter than this
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        Times of the changes (the centre of the final interval), the states
+        before, and the states after
+    """
+
+    starts = np.array(starts, dtype=float)
+    ends = np.array(ends, dtype=float)
+    start_states = np.array(start_states)
+    end_states = np.array(end_states)
+
+    if len(starts) == 0:
+        return starts, start_states, end_states
+
+    n_iterations = int(np.ceil(np.log2(max(np.max(ends - starts) / tolerance, 1))))
+
+    for _ in range(n_iterations):
+        midpoints = (starts + ends) / 2
+        midpoint_states = state_function(midpoints)
+
+        unchanged = midpoint_states == start_states
+
+        starts = np.where(unchanged, midpoints, starts)
+        ends = np.where(unchanged, ends, midpoints)
+        end_states = np.where(unchanged, end_states, midpoint_states)
+
+    return (starts + ends) / 2, start_states, end_states
@@ -0,0 +1,235 @@
+"""
+Joint trajectory and region probability information for several spacecraft
+"""
+
+import datetime as dt
+import itertools
+
+import numpy as np
+import pandas as pd
+import planetary_coverage as pc
+
+from wamms.cache import EphemerisCache
+from wamms.kernels import KernelSession
+from wamms.main import spacecraft
+from wamms.maps import RegionProbabilityCube, RegionProbabilityMap
+from wamms.times import datetime64_to_et, time_grid
+
+__all__ = ["fleet"]
+
+
+class fleet:
+    """A group of spacecraft (e.g. MPO and MMO) sharing one metakernel and
+    one probability map, for which trajectories are computed together on a
+    common time grid.
+
+    The individual spacecraft can be accessed by name, e.g. fleet["mpo"].
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        metakernel: str | pc.MetaKernel = "",
+        probability_map: RegionProbabilityMap | RegionProbabilityCube | None = None,
+        ephemeris_cache: EphemerisCache | None = None,
+    ):
+        if len(names) == 0:
+            raise ValueError("A fleet must contain at least one spacecraft")
+
+        # The first spacecraft resolves the default metakernel, which is then
+        # shared with the others, rather than being created for each.
+        first = spacecraft(names[0], metakernel, probability_map, ephemeris_cache)
+
+        self.members: dict[str, spacecraft] = {names[0]: first}
+        for name in names[1:]:
+            self.members[name] = spacecraft(
+                name, first.metakernel, probability_map, ephemeris_cache
+            )
+
+        self.metakernel = first.metakernel
+        self.probability_map = probability_map
+        self._implicit_map: RegionProbabilityMap | None = None
+        self.prediction_data: pd.DataFrame = pd.DataFrame()
+
+        # An optional persistent kernel session, see open()
+        self.kernel_session: KernelSession | None = None
+
+    @property
+    def prediction_data(self) -> pd.DataFrame:
+        """MESSENGER region observations, see spacecraft.prediction_data"""
+        return self._prediction_data
+
+    @prediction_data.setter
+    def prediction_data(self, prediction_data: pd.DataFrame):
+        self._prediction_data = prediction_data
+
+        # As for spacecraft, a map built from the previous prediction data is
+        # rebuilt on next use.
+        if (
+            self._implicit_map is not None
+            and self.probability_map is self._implicit_map
+        ):
+            self.probability_map = None
+        self._implicit_map = None
+
+    def __getitem__(self, name: str) -> spacecraft:
+        return self.members[name]
+
+    def open(self):
+        """Keep the SPICE kernels loaded across queries, see
+        spacecraft.open()"""
+
+        if self.kernel_session is None:
+            self.kernel_session = KernelSession(self.metakernel).open()
+
+        return self
+
+    def close(self):
+        """Release the kernel session opened with open()"""
+
+        if self.kernel_session is not None:
+            self.kernel_session.close()
+            self.kernel_session = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def joint_trajectory(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        res: dt.timedelta,
+        aberrate: bool | str = True,
+        probabilities: bool = True,
+    ) -> pd.DataFrame:
+        """Compute the trajectories of all spacecraft in the fleet on one time
+        grid, along with region probabilities and joint quantities.
+
+        The time grid and ephemeris times are found once, and the kernels are
+        only loaded once for all spacecraft.
+
+        Params
+        ------
+        start_time: dt.datetime
+            From what time to start loading trajectory information
+
+        end_time: dt.datetime
+            At what time to stop trajectory information
+
+        res: dt.timedelta
+            The resolution that trajectory data are loaded at
+
+        aberrate: bool | str {default True}
+            See spacecraft.update_trajectory()
+
+        probabilities: bool {default True}
+            If True, region probabilities are also found. Either
+            self.probability_map or self.prediction_data must be set.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per time, with columns:
+                "Time"
+                "{name} X MSM'", "{name} Y MSM'", "{name} Z MSM'",
+                "{name} CYL MSM'" for each spacecraft (radii)
+                "{name} {region}" region probabilities for each spacecraft
+                "{name a}-{name b} Separation" for each pair (radii)
+                "{name a} {region} & {name b} {region}" the probability of
+                the spacecraft being in each combination of regions
+
+            The joint region probabilities assume each spacecraft's region is
+            independent, which is all the map can tell us. In practice,
+            nearby spacecraft are more likely to be in the same region than
+            this suggests.
+        """
+
+        if probabilities:
+            probability_map = self._get_probability_map()
+
+        times = time_grid(start_time, round((end_time - start_time) / res), res)
+
+        columns = {"Time": times}
+        positions = {}
+        region_probabilities = {}
+
+        with KernelSession(self.metakernel):
+            spice_times = datetime64_to_et(times)
+
+            for name, member in self.members.items():
+                positions[name] = member._positions(
+                    times,
+                    aberrate,
+                    spice_times=spice_times,
+                    cache_query=dict(
+                        start=start_time.isoformat(),
+                        end=end_time.isoformat(),
+                        res=res.total_seconds(),
+                    ),
+                )
+
+                cyl = np.sqrt(positions[name][:, 1] ** 2 + positions[name][:, 2] ** 2)
+
+                columns[f"{name} X MSM'"] = positions[name][:, 0]
+                columns[f"{name} Y MSM'"] = positions[name][:, 1]
+                columns[f"{name} Z MSM'"] = positions[name][:, 2]
+                columns[f"{name} CYL MSM'"] = cyl
+
+                if probabilities:
+                    region_probabilities[name] = member._lookup_probabilities(
+                        positions[name][:, 0], cyl, times, spice_times
+                    ).to_numpy()
+
+                    for i, region in enumerate(probability_map.region_names):
+                        columns[f"{name} {region}"] = region_probabilities[name][:, i]
+
+        for name_a, name_b in itertools.combinations(self.members, 2):
+            columns[f"{name_a}-{name_b} Separation"] = np.linalg.norm(
+                positions[name_a] - positions[name_b], axis=1
+            )
+
+        if probabilities and len(self.members) > 1:
+            n_regions = len(probability_map.region_names)
+
+            for region_indices in itertools.product(
+                range(n_regions), repeat=len(self.members)
+            ):
+                label = " & ".join(
+                    f"{name} {probability_map.region_names[i]}"
+                    for name, i in zip(self.members, region_indices)
+                )
+
+                columns[label] = np.prod(
+                    [
+                        region_probabilities[name][:, i]
+                        for name, i in zip(self.members, region_indices)
+                    ],
+                    axis=0,
+                )
+
+        return pd.DataFrame(columns)
+
+    def _get_probability_map(self) -> RegionProbabilityMap | RegionProbabilityCube:
+        """Return the probability map shared by the fleet, creating it from
+        self.prediction_data if needed"""
+
+        if self.probability_map is None:
+            if len(self.prediction_data) == 0:
+                raise RuntimeError(
+                    "No prior prediction data loaded. See example scripts."
+                )
+
+            self.probability_map = RegionProbabilityMap.from_prediction_data(
+                self.prediction_data
+            )
+            self._implicit_map = self.probability_map
+
+        # Every spacecraft uses the same map, rather than each building its
+        # own.
+        for member in self.members.values():
+            member.probability_map = self.probability_map
+
+        return self.probability_map
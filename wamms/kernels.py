@@ -0,0 +1,96 @@
+"""
+Management of SPICE kernel loading, shared between spacecraft
+"""
+
+import pathlib
+
+import planetary_coverage as pc
+import spiceypy as spice
+
+
+def kernel_files(metakernel: str | pathlib.Path | pc.MetaKernel) -> list[str]:
+    """Determine which files must be furnished to load a metakernel
+
+    Params
+    ------
+    metakernel: str | pathlib.Path | pc.MetaKernel
+        Either a path to a metakernel file, or a planetary_coverage
+        MetaKernel object
+
+    Returns
+    -------
+    list[str]
+        For MetaKernel objects, the (path substituted) kernels listed within.
+        Otherwise, the metakernel file itself.
+    """
+
+    if isinstance(metakernel, pc.MetaKernel):
+        return [str(kernel) for kernel in metakernel.kernels]
+
+    return [str(metakernel)]
+
+
+class KernelSession:
+    """A reference-counted SPICE kernel session.
+
+    Opening a session furnishes the kernels of a metakernel into the SPICE
+    kernel pool, and closing it unloads them again. Sessions are counted per
+    set of kernel files, so any number of sessions (e.g. for MPO and MMO
+    instances built on the same metakernel) share one load, and the kernels
+    are only unloaded when the last of these is closed.
+
+    Can be used as a context manager, or with explicit open() and close()
+    calls.
+
+    Params
+    ------
+    metakernel: str | pathlib.Path | pc.MetaKernel
+        The metakernel to load
+    """
+
+    # Number of open sessions for each set of kernel files
+    _reference_counts: dict[tuple[str, ...], int] = {}
+
+    def __init__(self, metakernel: str | pathlib.Path | pc.MetaKernel):
+        self.metakernel = metakernel
+        self.kernels = tuple(kernel_files(metakernel))
+        self.is_open: bool = False
+
+    def open(self):
+        """Load the kernels, if no other session already has"""
+
+        if self.is_open:
+            return self
+
+        reference_count = self._reference_counts.get(self.kernels, 0)
+
+        if reference_count == 0:
+            spice.furnsh(list(self.kernels))
+
+        self._reference_counts[self.kernels] = reference_count + 1
+        self.is_open = True
+
+        return self
+
+    def close(self):
+        """Release this session, unloading the kernels if it was the last
+        session using them"""
+
+        if not self.is_open:
+            return
+
+        reference_count = self._reference_counts[self.kernels] - 1
+
+        if reference_count == 0:
+            spice.unload(list(self.kernels))
+            del self._reference_counts[self.kernels]
+        else:
+            self._reference_counts[self.kernels] = reference_count
+
+        self.is_open = False
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
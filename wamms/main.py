@@ -2,21 +2,37 @@
 Primary script for WAMMS to handle calculating region probabilities for BepiColombo spacecraft
 """
 
+import contextlib
 import datetime as dt
 import pathlib
-import tomllib
 
 import numpy as np
 import pandas as pd
 import planetary_coverage as pc
 import spiceypy as spice
 
+from wamms.aberration import aberrate_positions, aberration_angles
+from wamms.adaptive import probabilities_differ, refine_samples
+from wamms.cache import EphemerisCache
+from wamms.chebyshev import ChebyshevEphemeris
+from wamms.constants import load_constants
+from wamms.events import bisect_transitions, transition_label
+from wamms.kernels import KernelSession
+from wamms.maps import RegionProbabilityCube, RegionProbabilityMap
+from wamms.parallel import ProcessPool
+from wamms.times import datetime64_to_et, time_grid
+from wamms.trajectory_store import TrajectoryStore
+
+__all__ = ["spacecraft"]
+
 
 class spacecraft:
     def __init__(
         self,
         name: str,
         metakernel: str | pc.MetaKernel = "",
+        probability_map: RegionProbabilityMap | RegionProbabilityCube | None = None,
+        ephemeris_cache: EphemerisCache | None = None,
     ):
         self.name: str = name
 
@@ -33,21 +49,137 @@ class spacecraft:
         else:
             self.metakernel = metakernel
 
-        self.trajectory: pd.DataFrame = pd.DataFrame()
+        # Trajectory information is kept as non-overlapping chunks, and
+        # accessed through self.trajectory
+        self.trajectory_store: TrajectoryStore = TrajectoryStore()
         self.probabilities: pd.DataFrame = pd.DataFrame()
+
+        # Region probability map to compare the trajectory against. If not
+        # provided, one is built from self.prediction_data the first time
+        # update_probabilities() is run, and rebuilt if self.prediction_data
+        # is reassigned. If a RegionProbabilityCube is used, the heliocentric
+        # distance of the spacecraft is also accounted for.
+        self.probability_map: RegionProbabilityMap | RegionProbabilityCube | None = (
+            probability_map
+        )
+        self._implicit_map: RegionProbabilityMap | None = None
         self.prediction_data: pd.DataFrame = pd.DataFrame()
 
-        with open(self.wammsdir / "pkgdata" / "constants.toml", "rb") as f:
-            self.constants = tomllib.load(f)
+        # How positions are looked up in the map: "nearest" bin, or
+        # "bilinear" interpolation between bin centres. See
+        # RegionProbabilityMap.probabilities_at().
+        self.interpolation: str = "nearest"
+
+        # If True, the number of observations in each map bin, and the map's
+        # uncertainty bands (see RegionProbabilityMap.dirichlet_posterior()),
+        # are included as extra columns of self.region_probabilities.
+        self.probability_bands: bool = False
+
+        self.constants = load_constants()
+
+        # An optional persistent kernel session, see open()
+        self.kernel_session: KernelSession | None = None
+
+        # An optional pool of worker processes, kept between queries, see
+        # open()
+        self.process_pool: ProcessPool | None = None
+
+        # An optional on-disk cache of SPICE positions, checked by
+        # update_trajectory() before querying SPICE.
+        self.ephemeris_cache: EphemerisCache | None = ephemeris_cache
+
+        # An optional polynomial fit of the MSM' positions, see
+        # fit_ephemeris(), and the aberration mode it was fit with.
+        self.fitted_ephemeris: ChebyshevEphemeris | None = None
+        self.fitted_aberrate: bool | str | None = None
+
+    @property
+    def prediction_data(self) -> pd.DataFrame:
+        """MESSENGER region observations, from which a probability map is
+        built if self.probability_map isn't set"""
+        return self._prediction_data
+
+    @prediction_data.setter
+    def prediction_data(self, prediction_data: pd.DataFrame):
+        self._prediction_data = prediction_data
+
+        # A map we built from the previous prediction data is now out of
+        # date. A map which was provided directly is kept.
+        if (
+            self._implicit_map is not None
+            and self.probability_map is self._implicit_map
+        ):
+            self.probability_map = None
+        self._implicit_map = None
+
+    @property
+    def trajectory(self) -> pd.DataFrame:
+        """Trajectory information in MSM' coordinates, sorted by time"""
+        return self.trajectory_store.frame
+
+    @trajectory.setter
+    def trajectory(self, trajectory: pd.DataFrame):
+        self.trajectory_store = TrajectoryStore.from_frame(trajectory)
+
+    def open(self, processes: int | None = None):
+        """Keep the SPICE kernels loaded across trajectory queries.
+
+        By default, the metakernel is loaded and unloaded for each call to
+        update_trajectory(). After calling open(), the kernels stay loaded
+        until close() is called. Sessions are shared between all spacecraft
+        using the same metakernel, so opening both MPO and MMO only loads the
+        kernels once.
+
+        Can also be used as a context manager:
+
+            with wamms.spacecraft("mpo") as mpo:
+                ...
+
+        Params
+        ------
+        processes: int | None {default None}
+            If set, a pool of this many worker processes is also started,
+            each of which loads the kernels once. Until close() is called,
+            update_trajectory() and iter_trajectory() compute positions with
+            this pool, rather than starting new workers for each call.
+        """
+
+        if self.kernel_session is None:
+            self.kernel_session = KernelSession(self.metakernel).open()
+
+        if processes is not None and self.process_pool is None:
+            self.process_pool = ProcessPool(self.metakernel, processes).open()
+
+        return self
+
+    def close(self):
+        """Release the kernel session and process pool opened with open()"""
+
+        if self.kernel_session is not None:
+            self.kernel_session.close()
+            self.kernel_session = None
+
+        if self.process_pool is not None:
+            self.process_pool.close()
+            self.process_pool = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
 
     def update_probabilities(self):
         """A function to add magnetospheric region probability information based on previous MESSENGER findings.
 
         Creates a dataframe of region probabilities based on comparing
         trajectory information with previous MESSENGER predictions.
+        Probabilities are kept for each row of the trajectory, so only rows
+        added since the last call are looked up, unless the map changes.
 
         self.update_trajectory() must have been run prior to this function, to
-        determine what postitions to use.
+        determine what postitions to use. Either self.probability_map or
+        self.prediction_data must also be set.
         """
 
         if len(self.trajectory) == 0:
@@ -56,104 +188,143 @@ class spacecraft:
                 "No trajectory information determined. Please run: update_trajectory()"
             )
 
-        # The probabiliy maps we make with MESSENGER are cylindrically
-        # symmetric to inprove coverage. As such, we calculate rho from the
-        # trajectory data.
-        x_data = self.trajectory["X MSM'"]
-        cyl_data = np.sqrt(
-            self.trajectory["Y MSM'"] ** 2 + self.trajectory["Z MSM'"] ** 2
+        probability_map = self._get_probability_map()
+
+        # Only rows added since the last call need to be looked up, unless the
+        # map or lookup settings have changed.
+        bands = (
+            (tuple(probability_map.bands), probability_map.bands_version)
+            if self.probability_bands
+            else None
         )
+        lookup_key = (probability_map, self.interpolation, bands)
+        trajectory = self.trajectory
+        rows = self.trajectory_store.rows_without_probabilities(lookup_key)
 
-        if len(self.prediction_data) == 0:
-            raise RuntimeError("No prior prediction data loaded. See example scripts.")
+        if len(rows) > 0:
+            # The probabiliy maps we make with MESSENGER are cylindrically
+            # symmetric to inprove coverage. As such, we calculate rho from
+            # the trajectory data.
+            x_data = trajectory["X MSM'"].to_numpy()[rows]
+            cyl_data = np.sqrt(
+                trajectory["Y MSM'"].to_numpy()[rows] ** 2
+                + trajectory["Z MSM'"].to_numpy()[rows] ** 2
+            )
 
-        # Create bins
-        bin_size = 0.25
-        x_bins = np.arange(-5, 5 + bin_size, bin_size)  # Radii
-        cyl_bins = np.arange(0, 8 + bin_size, bin_size)  # Radii
+            # A cube also needs the heliocentric distance of each row. We
+            # find it for all of the rows in one kernel session, from a
+            # single conversion to ephemeris time.
+            times = trajectory["Time"].to_numpy()[rows]
+            is_cube = isinstance(probability_map, RegionProbabilityCube)
 
-        # Make histograms for each region prediction
-        region_data = {
-            "Names": ["Solar Wind", "Magnetosheath", "Magnetosphere"],
-            "Data": {},
-        }
+            with (
+                KernelSession(self.metakernel) if is_cube else contextlib.nullcontext()
+            ):
+                spice_times = datetime64_to_et(times) if is_cube else None
 
-        x_edges = []  # Just initialising to avoid LSP unbound variable errors
-        y_edges = []
-        for region_name in region_data["Names"]:
+                self.trajectory_store.set_probabilities(
+                    rows,
+                    self._lookup_probabilities(
+                        x_data,
+                        cyl_data,
+                        times,
+                        spice_times,
+                        with_bands=self.probability_bands,
+                    ),
+                    lookup_key,
+                )
 
-            filtered_predictions = self.prediction_data.loc[
-                self.prediction_data["Predicted Region"] == region_name
-            ][["X MSM' (radii)", "CYL MSM' (radii)"]]
+        probabilities = self.trajectory_store.probabilities
+        probabilities.insert(0, "Time", trajectory["Time"].to_numpy())
 
-            region_histogram, x_edges, y_edges = np.histogram2d(
-                filtered_predictions["X MSM' (radii)"],
-                filtered_predictions["CYL MSM' (radii)"],
-                bins=[x_bins, cyl_bins],
-            )
+        self.region_probabilities = probabilities
 
-            region_data["Data"][region_name] = region_histogram
+    def _get_probability_map(self) -> RegionProbabilityMap | RegionProbabilityCube:
+        """Return self.probability_map, creating it from self.prediction_data
+        if needed"""
 
-        bin_totals = np.sum(list(region_data["Data"].values()), axis=0)
+        if self.probability_map is None:
+            if len(self.prediction_data) == 0:
+                raise RuntimeError(
+                    "No prior prediction data loaded. See example scripts."
+                )
 
-        region_probabilities = {}
-        for region_name in region_data["Names"]:
-            region_probabilities[region_name] = (
-                region_data["Data"][region_name] / bin_totals
+            # The map only depends on the prediction data, so we build it
+            # once and keep it until self.prediction_data is reassigned.
+            self.probability_map = RegionProbabilityMap.from_prediction_data(
+                self.prediction_data
             )
+            self._implicit_map = self.probability_map
+
+        return self.probability_map
+
+    def _lookup_probabilities(
+        self, x_data, cyl_data, times, spice_times=None, with_bands=False
+    ) -> pd.DataFrame:
+        """Look up region probabilities for a set of positions at given times,
+        returning a dataframe with one column per region. If already known,
+        the ephemeris times can be given as spice_times.
+
+        If with_bands is True, a "Bin Count" column (the number of
+        observations in each map bin, see RegionProbabilityMap.bands_at()),
+        and a column per region for each of the map's uncertainty bands
+        ("{region} {band}"), are also included."""
+
+        probability_map = self._get_probability_map()
 
         # Now that we have a 2d histogram for each region, we can query this
-        # for each position of the trajectory
-
-        trajectory_probabilities = {
-            region: np.zeros_like(x_data, dtype=float)
-            for region in region_data["Names"]
-        }
-
-        # Digitize the trajectory data into bin indices
-        x_indices = np.digitize(x_data, x_bins) - 1
-        cyl_indices = np.digitize(cyl_data, cyl_bins) - 1
-
-        # Iterate over trajectory points and assign probabilities
-        for i in range(len(x_data)):
-            x_index = x_indices[i]
-            cyl_index = cyl_indices[i]
-
-            # Ensure the index is within the valid histogram range
-            if 0 <= x_index < len(x_bins) - 1 and 0 <= cyl_index < len(cyl_bins) - 1:
-                for region in region_data["Names"]:
-                    trajectory_probabilities[region][i] = region_probabilities[region][
-                        x_index, cyl_index
-                    ]
-            else:
-                for region in region_data["Names"]:
-                    trajectory_probabilities[region][
-                        i
-                    ] = np.nan  # Assign NaN if out of bounds
+        # for each position of the trajectory. Positions outside of the map
+        # are assigned nan.
+        if isinstance(probability_map, RegionProbabilityCube):
+            position = (
+                x_data,
+                cyl_data,
+                self._heliocentric_distance(times, spice_times),
+            )
+        else:
+            position = (x_data, cyl_data)
 
-        probabilities = pd.DataFrame(trajectory_probabilities)
-        probabilities["Time"] = self.trajectory["Time"]
+        if not with_bands:
+            return pd.DataFrame(
+                probability_map.probabilities_at(*position, self.interpolation),
+                columns=probability_map.region_names,
+            )
 
-        # Reorder columns
-        probabilities = probabilities[
-            ["Time", "Solar Wind", "Magnetosheath", "Magnetosphere"]
-        ]
+        # The bins (and weights) are found once for the probabilities and
+        # the bands
+        probabilities, bands = probability_map.probabilities_and_bands_at(
+            *position, interpolation=self.interpolation
+        )
+        probabilities = pd.DataFrame(
+            probabilities, columns=probability_map.region_names
+        )
 
-        self.region_probabilities = probabilities
+        for name, values in bands.items():
+            if values.ndim == 1:
+                probabilities[name] = values
+            else:
+                for i, region in enumerate(probability_map.region_names):
+                    probabilities[f"{region} {name}"] = values[:, i]
+
+        return probabilities
 
     def update_trajectory(
         self,
         start_time: dt.datetime,
         end_time: dt.datetime,
         res: dt.timedelta,
-        aberrate: bool = True,
+        aberrate: bool | str = True,
+        processes: int | None = None,
     ):
         """A function to add XYZ trajectory information in the MSM'
         coordinate system
 
         The data are pulled from spice using the BepiColombo metakernel. This
         function can be called multiple times to add data from different time
-        spans. It does not overwrite previous entries.
+        spans. It does not overwrite previous entries: only the parts of the
+        span not already covered by previous calls are computed. Parts
+        covered with a different res or aberrate raise a ValueError, rather
+        than returning data at the wrong settings.
 
         Params
         ------
@@ -166,63 +337,929 @@ class spacecraft:
         res: dt.timedelta
             The resolution that trajectory data are loaded at
 
-        aberrate: bool {default True}
+        aberrate: bool | str {default True}
             If True, the average aberrated coordinate frame is used from
             SPICE: BC_MSO_AB (later converted to MSM'), if False, BC_MSO is
-            used. See the inline comment below in the 'spkpos' function call
+            used. If "daily", positions in BC_MSO are rotated by an
+            aberration angle determined from Mercury's orbital velocity each
+            day (interpolated between days), and an assumed solar wind speed
+            of SOLAR_WIND_SPEED_KMS. See the inline comment in _spice_frame()
             for more details.
 
+        processes: int | None {default None}
+            If set, the time span is split into chunks which are computed in
+            parallel by this many worker processes. Each worker loads the
+            kernels once per call. To keep the workers (and their kernels)
+            between calls, use open(processes) instead, after which this is
+            ignored. The output is identical to the serial path. As workers
+            are spawned, scripts using this must be protected with an
+            `if __name__ == "__main__":` guard.
+
         Returns
         -------
         None - Function updates self.trajectory
         """
 
-        with spice.KernelPool(self.metakernel):
+        n_samples = round((end_time - start_time) / res)
+
+        start = np.datetime64(start_time, "ns")
+        res_ns = np.timedelta64(res, "ns").astype(np.int64)
+        end = start + n_samples * np.timedelta64(res_ns, "ns")
+
+        # If no pool is open, one is started for this call only, and shared
+        # between all of the gaps.
+        temporary_pool = processes is not None and self.process_pool is None
+        if temporary_pool:
+            self.process_pool = ProcessPool(self.metakernel, processes).open()
+
+        try:
+            # Only compute what we don't have already. Within each gap, we
+            # keep to the sample grid of this request.
+            for gap_start, gap_end in self._trajectory_gaps(start, end, aberrate, res):
+                first_sample = -(-(gap_start - start).astype(np.int64) // res_ns)
+                last_sample = -(-(gap_end - start).astype(np.int64) // res_ns)
+
+                new_trajectory = self._compute_trajectory(
+                    start_time + int(first_sample) * res,
+                    start_time + int(last_sample) * res,
+                    res,
+                    aberrate,
+                )
+
+                self.trajectory_store.add(
+                    gap_start, gap_end, new_trajectory, key=(aberrate, res)
+                )
+
+        finally:
+            if temporary_pool:
+                self.process_pool.close()
+                self.process_pool = None
+
+    def update_trajectory_adaptive(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        res: dt.timedelta,
+        coarse_res: dt.timedelta,
+        threshold: float = 0.1,
+        aberrate: bool | str = True,
+    ):
+        """Add trajectory information, sampled finely only around predicted
+        region transitions.
+
+        The time span is first sampled at coarse_res. Wherever the region
+        probabilities change sharply between neighbouring samples (by more
+        than threshold, or the most probable region changes), the step is
+        repeatedly halved, down to res. All samples lie on the same time
+        grid as update_trajectory(start_time, end_time, res), so transition
+        times are found to within res, at a fraction of the cost.
+
+        Regions visited for less than coarse_res may be missed entirely, so
+        coarse_res should be shorter than the shortest pass of interest.
+
+        Params
+        ------
+        start_time: dt.datetime
+            From what time to start loading trajectory information
+
+        end_time: dt.datetime
+            At what time to stop trajectory information
+
+        res: dt.timedelta
+            The finest resolution that trajectory data are loaded at
+
+        coarse_res: dt.timedelta
+            The resolution of the initial sampling
+
+        threshold: float {default 0.1}
+            Steps with a change in any region probability larger than this
+            are refined
+
+        aberrate: bool | str {default True}
+            See update_trajectory()
+
+        Returns
+        -------
+        None - Function updates self.trajectory. Later calls to
+        update_trajectory() with the same res and aberrate recompute the
+        span in full.
+        """
+
+        self._get_probability_map()
+
+        n_samples = round((end_time - start_time) / res)
+
+        start = np.datetime64(start_time, "ns")
+        res_ns = np.timedelta64(res, "ns").astype(np.int64)
+        end = start + n_samples * np.timedelta64(res_ns, "ns")
+
+        coarse_step = max(1, round(coarse_res / res))
+
+        with KernelSession(self.metakernel):
+            for gap_start, gap_end in self._trajectory_gaps(
+                start, end, aberrate, res, adaptive=True
+            ):
+                first_sample = -(-(gap_start - start).astype(np.int64) // res_ns)
+                last_sample = -(-(gap_end - start).astype(np.int64) // res_ns)
+
+                gap_first_time = start + first_sample * np.timedelta64(res_ns, "ns")
+
+                def sample(indices):
+                    times = gap_first_time + indices * np.timedelta64(res_ns, "ns")
+                    spice_times = datetime64_to_et(times)
+
+                    positions = self._positions(
+                        times, aberrate, spice_times=spice_times
+                    )
+                    probabilities = self._lookup_probabilities(
+                        positions[:, 0],
+                        np.sqrt(positions[:, 1] ** 2 + positions[:, 2] ** 2),
+                        times,
+                        spice_times,
+                    ).to_numpy()
+
+                    return np.column_stack([positions, probabilities])
+
+                indices, values = refine_samples(
+                    int(last_sample - first_sample),
+                    coarse_step,
+                    sample,
+                    lambda a, b: probabilities_differ(a[:, 3:], b[:, 3:], threshold),
+                )
+
+                self.trajectory_store.add(
+                    gap_start,
+                    gap_end,
+                    self._trajectory_frame(
+                        gap_first_time + indices * np.timedelta64(res_ns, "ns"),
+                        values[:, :3],
+                    ),
+                    key=(aberrate, res, "adaptive"),
+                )
+
+    def _trajectory_gaps(
+        self,
+        start: np.datetime64,
+        end: np.datetime64,
+        aberrate: bool | str,
+        res: dt.timedelta,
+        adaptive: bool = False,
+    ) -> list[tuple[np.datetime64, np.datetime64]]:
+        """Find the parts of [start, end) which still need to be computed,
+        for a trajectory at a given resolution and aberration mode.
+
+        Parts previously sampled adaptively at the same settings are removed
+        (and so recomputed), unless adaptive is True. Parts computed with
+        other settings raise a ValueError.
+        """
+
+        key = (aberrate, res)
+        adaptive_key = (aberrate, res, "adaptive")
+
+        overlapping = self.trajectory_store.overlapping(start, end)
+
+        # Trajectories set directly (with no key) are assumed to match
+        for covered_start, covered_end, covered_key in overlapping:
+            if covered_key not in (None, key, adaptive_key):
+                raise ValueError(
+                    f"Trajectory information from {covered_start} to "
+                    f"{covered_end} was computed with aberrate="
+                    f"{covered_key[0]!r} and res={covered_key[1]}, not "
+                    f"aberrate={aberrate!r} and res={res}. To recompute it, "
+                    "first reset the trajectory: self.trajectory = pd.DataFrame()"
+                )
+
+        if not adaptive:
+            for covered_start, covered_end, covered_key in overlapping:
+                if covered_key == adaptive_key:
+                    self.trajectory_store.remove(covered_start, covered_end)
+
+        return self.trajectory_store.missing(start, end)
+
+    def positions_at(
+        self,
+        times,
+        aberrate: bool | str = True,
+        probabilities: bool = True,
+        batch_size: int = 100_000,
+        use_fit: bool = True,
+    ) -> pd.DataFrame:
+        """Find trajectory and region probability information at an
+        arbitrary set of times, such as the timestamps of a data file.
+
+        Unlike update_trajectory(), the times don't need to be evenly spaced
+        or sorted, and nothing is stored on the spacecraft. SPICE is queried
+        in blocks of batch_size times, so peak memory use is bounded.
+
+        Params
+        ------
+        times: array-like
+            UTC times (datetimes or datetime64), or ephemeris times (floats)
+
+        aberrate: bool | str {default True}
+            See update_trajectory()
+
+        probabilities: bool {default True}
+            If True, region probabilities are also found. Either
+            self.probability_map or self.prediction_data must be set.
+
+        batch_size: int {default 100000}
+            Maximum number of times queried from SPICE at once
+
+        use_fit: bool {default True}
+            If self.fitted_ephemeris (see fit_ephemeris()) covers all of the
+            times, and was fit with the same aberration mode, it is
+            evaluated instead of querying SPICE.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per input time, in the input order. The first column is
+            "Time" if UTC times were given, or "ET" if ephemeris times were
+            given, followed by the columns of self.trajectory and (if
+            requested) one probability column per region.
+        """
+
+        times = np.ravel(np.asarray(times))
+
+        if np.issubdtype(times.dtype, np.number):
+            time_column = "ET"
+            utc_times = None
+            spice_times = times.astype(float)
+
+        else:
+            time_column = "Time"
+            utc_times = pd.to_datetime(times)
+            if utc_times.tz is not None:
+                utc_times = utc_times.tz_convert("UTC").tz_localize(None)
+            utc_times = utc_times.to_numpy(dtype="datetime64[ns]")
+            spice_times = None
+
+        if probabilities:
+            probability_map = self._get_probability_map()
+
+        with KernelSession(self.metakernel):
+            if spice_times is None:
+                spice_times = datetime64_to_et(utc_times)
+
+            positions = np.empty((len(spice_times), 3))
+            region_probabilities = []
+
+            for i in range(0, len(spice_times), batch_size):
+                batch = slice(i, i + batch_size)
+
+                positions[batch] = self._positions_at_et(
+                    spice_times[batch], aberrate, use_fit
+                )
+
+                if probabilities:
+                    region_probabilities.append(
+                        self._lookup_probabilities(
+                            positions[batch, 0],
+                            np.sqrt(
+                                positions[batch, 1] ** 2 + positions[batch, 2] ** 2
+                            ),
+                            None,
+                            spice_times[batch],
+                            with_bands=self.probability_bands,
+                        )
+                    )
+
+        trajectory = self._trajectory_frame(
+            utc_times if utc_times is not None else spice_times, positions
+        ).rename(columns={"Time": time_column})
+
+        if probabilities:
+            if len(region_probabilities) == 0:
+                region_probabilities = [
+                    pd.DataFrame(columns=probability_map.region_names, dtype=float)
+                ]
+
+            trajectory = pd.concat(
+                [trajectory, pd.concat(region_probabilities, ignore_index=True)],
+                axis=1,
+            )
+
+        return trajectory
+
+    def find_transitions(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        coarse_res: dt.timedelta = dt.timedelta(minutes=5),
+        tolerance: dt.timedelta = dt.timedelta(seconds=1),
+        region: str | None = None,
+        threshold: float = 0.5,
+        aberrate: bool | str = True,
+        batch_size: int = 100_000,
+    ) -> pd.DataFrame:
+        """Find predicted region transitions (e.g. bow shock and magnetopause
+        crossings) over a time span.
+
+        Transitions are detected between samples of a coarse time grid, and
+        their times are then refined by bisection on the ephemeris, rather
+        than by sampling densely. Transitions into or out of the area covered
+        by the probability map are not included.
+
+        Params
+        ------
+        start_time: dt.datetime
+            Start of the search
+
+        end_time: dt.datetime
+            End of the search
+
+        coarse_res: dt.timedelta {default 5 minutes}
+            Resolution of the initial search. Regions visited for less than
+            this may be missed.
+
+        tolerance: dt.timedelta {default 1 second}
+            Precision to which transition times are found
+
+        region: str | None {default None}
+            If None, transitions are changes of the most probable region.
+            Otherwise, transitions are where the probability of this region
+            crosses threshold.
+
+        threshold: float {default 0.5}
+            See region
+
+        aberrate: bool | str {default True}
+            See update_trajectory()
+
+        batch_size: int {default 100000}
+            Maximum number of coarse grid times queried at once
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per transition, sorted by time, with columns "Time",
+            "Label", "Region Before", and "Region After". If region is None,
+            labels follow the crossing list (e.g. "BS_IN", "MP_OUT"),
+            otherwise they are "ENTRY" or "EXIT".
+        """
+
+        if end_time < start_time:
+            raise ValueError(
+                f"end_time ({end_time}) is before start_time ({start_time})"
+            )
+
+        region_names = self._get_probability_map().region_names
+
+        if region is None:
+            state_names = region_names
+        else:
+            region_index = region_names.index(region)
+            state_names = [f"P({region}) <= {threshold}", f"P({region}) > {threshold}"]
+
+        def states_at(spice_times):
+            # The most probable region, or whether the threshold is exceeded.
+            # Positions outside of the map are -1.
+            positions = self._positions_at_et(spice_times, aberrate, use_fit=True)
+            probabilities = self._lookup_probabilities(
+                positions[:, 0],
+                np.sqrt(positions[:, 1] ** 2 + positions[:, 2] ** 2),
+                None,
+                spice_times,
+            ).to_numpy()
+
+            if region is None:
+                states = np.argmax(np.nan_to_num(probabilities), axis=1)
+            else:
+                states = (probabilities[:, region_index] > threshold).astype(int)
 
-            times = [
-                start_time + i * res
-                for i in range(round((end_time - start_time) / res))
+            return np.where(np.any(np.isnan(probabilities), axis=1), -1, states)
+
+        utc_times, states_before, states_after = self._state_changes(
+            start_time, end_time, coarse_res, tolerance, states_at, batch_size
+        )[1:]
+
+        # The map coverage may have changed between the coarse samples
+        valid = (states_before != -1) & (states_after != -1)
+        utc_times = utc_times[valid]
+        states_before = states_before[valid]
+        states_after = states_after[valid]
+
+        regions_before = [state_names[state] for state in states_before]
+        regions_after = [state_names[state] for state in states_after]
+
+        if region is None:
+            labels = [
+                transition_label(before, after)
+                for before, after in zip(regions_before, regions_after)
             ]
-            spice_times = spice.datetime2et(times)
+        else:
+            labels = ["ENTRY" if state == 1 else "EXIT" for state in states_after]
 
-            positions, _ = spice.spkpos(
-                self.name,
+        return pd.DataFrame(
+            {
+                "Time": utc_times,
+                "Label": labels,
+                "Region Before": regions_before,
+                "Region After": regions_after,
+            }
+        )
+
+    def find_intervals(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        region: str,
+        probability: float,
+        min_duration: dt.timedelta = dt.timedelta(0),
+        coarse_res: dt.timedelta = dt.timedelta(minutes=5),
+        tolerance: dt.timedelta = dt.timedelta(seconds=1),
+        aberrate: bool | str = True,
+        batch_size: int = 100_000,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find all time intervals where the probability of a region exceeds
+        a value, for at least a given duration. E.g. every interval in 2027
+        where P(Magnetosheath) > 0.8 for at least 20 minutes.
+
+        The condition is evaluated on a coarse time grid, and the interval
+        boundaries are then refined by bisection, so the full probability
+        time series is never computed. Positions outside of the probability
+        map don't meet the condition.
+
+        Params
+        ------
+        start_time: dt.datetime
+            Start of the search
+
+        end_time: dt.datetime
+            End of the search
+
+        region: str
+            Name of the region, e.g. "Magnetosheath"
+
+        probability: float
+            The probability of the region must be greater than this
+
+        min_duration: dt.timedelta {default 0}
+            Intervals shorter than this are discarded
+
+        coarse_res: dt.timedelta {default 5 minutes}
+            Resolution of the initial search. Intervals, or breaks between
+            intervals, shorter than this may be missed.
+
+        tolerance: dt.timedelta {default 1 second}
+            Precision to which interval boundaries are found. Intervals with
+            durations within tolerance of min_duration may be misclassified.
+
+        aberrate: bool | str {default True}
+            See update_trajectory()
+
+        batch_size: int {default 100000}
+            Maximum number of coarse grid times queried at once
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            Start and end times (datetime64[ns]) of each interval, sorted and
+            non-overlapping. Intervals are clipped to start_time and
+            end_time.
+        """
+
+        if end_time < start_time:
+            raise ValueError(
+                f"end_time ({end_time}) is before start_time ({start_time})"
+            )
+
+        region_index = self._get_probability_map().region_names.index(region)
+
+        def condition_at(spice_times):
+            positions = self._positions_at_et(spice_times, aberrate, use_fit=True)
+            probabilities = self._lookup_probabilities(
+                positions[:, 0],
+                np.sqrt(positions[:, 1] ** 2 + positions[:, 2] ** 2),
+                None,
                 spice_times,
-                # This spice frame kernel uses average Mercury velocity and
-                # average solar wind velocity to determine an average
-                # aberration angle, which is used for all time. We could be
-                # more accurate by calculating aberration angle more frequently
-                # (such as is done daily in hermpy) however this can be quite
-                # slow.
-                "BC_MSO_AB" if aberrate else "BC_MSO",
-                "NONE",
-                "MERCURY",
+            ).to_numpy()
+
+            # nan > probability is False, so positions outside of the map
+            # don't meet the condition
+            return (probabilities[:, region_index] > probability).astype(int)
+
+        first_state, change_times, _, states_after = self._state_changes(
+            start_time, end_time, coarse_res, tolerance, condition_at, batch_size
+        )
+
+        # Each change either starts or ends an interval
+        starts = change_times[states_after == 1]
+        ends = change_times[states_after == 0]
+
+        if first_state == 1:
+            starts = np.concatenate([[np.datetime64(start_time, "ns")], starts])
+
+        if len(starts) > len(ends):
+            ends = np.concatenate([ends, [np.datetime64(end_time, "ns")]])
+
+        long_enough = (ends > starts) & (
+            (ends - starts) >= np.timedelta64(min_duration, "ns")
+        )
+
+        return starts[long_enough], ends[long_enough]
+
+    def _state_changes(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        coarse_res: dt.timedelta,
+        tolerance: dt.timedelta,
+        state_function,
+        batch_size: int,
+    ) -> tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        """Find when an integer state, which is a function of ephemeris time,
+        changes. Changes are detected on a coarse time grid, which is
+        processed in batches, and then refined with bisect_transitions().
+
+        Returns the state at start_time, and the times (datetime64[ns]) of
+        each change, within [start_time, end_time], with the states before
+        and after.
+        """
+
+        # The grid always ends exactly at end_time, so the final step may be
+        # shorter than coarse_res.
+        start = np.datetime64(start_time, "ns")
+        duration = np.timedelta64(end_time - start_time, "ns")
+        step = np.timedelta64(coarse_res, "ns")
+        n_samples = int(-(-duration // step)) + 1
+
+        step_utc_times = []
+        step_starts = []
+        step_ends = []
+        states_before = []
+        states_after = []
+
+        with KernelSession(self.metakernel):
+            # Neighbouring batches overlap by one sample, so that every step
+            # between samples is within a batch.
+            for i in range(0, max(n_samples - 1, 1), batch_size):
+                indices = np.arange(i, min(i + batch_size + 1, n_samples))
+                times = start + np.minimum(indices * step, duration)
+                spice_times = datetime64_to_et(times)
+                states = state_function(spice_times)
+
+                if i == 0:
+                    first_state = states[0]
+
+                steps = np.flatnonzero(states[:-1] != states[1:])
+
+                step_utc_times.append(times[steps])
+                step_starts.append(spice_times[steps])
+                step_ends.append(spice_times[steps + 1])
+                states_before.append(states[steps])
+                states_after.append(states[steps + 1])
+
+            step_starts = np.concatenate(step_starts)
+
+            change_times, states_before, states_after = bisect_transitions(
+                state_function,
+                step_starts,
+                np.concatenate(step_ends),
+                np.concatenate(states_before),
+                np.concatenate(states_after),
+                tolerance.total_seconds(),
+            )
+
+        # Within one coarse step, UTC and ephemeris time advance together
+        # (to within the tolerance), so we can convert back to UTC from the
+        # start of the step.
+        utc_times = np.concatenate(step_utc_times) + np.round(
+            (change_times - step_starts) * 1e9
+        ).astype("timedelta64[ns]")
+        utc_times = np.minimum(np.maximum(utc_times, start), start + duration)
+
+        return first_state, utc_times, states_before, states_after
+
+    def fit_ephemeris(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        tolerance_km: float = 0.1,
+        aberrate: bool | str = True,
+        degree: int = 12,
+    ) -> ChebyshevEphemeris:
+        """Fit piecewise Chebyshev polynomials to the MSM' position of the
+        spacecraft over a time span.
+
+        Once fit, positions at any set of times within the span can be
+        evaluated with self.fitted_ephemeris.evaluate(spice_times), without
+        querying SPICE. The fit is stored as self.fitted_ephemeris, and
+        only needs a few kilobytes per day, regardless of how densely it is
+        later evaluated. It can be saved with self.fitted_ephemeris.save().
+
+        Params
+        ------
+        start_time: dt.datetime
+            Start of the span to fit
+
+        end_time: dt.datetime
+            End of the span to fit
+
+        tolerance_km: float {default 0.1}
+            Maximum error of the fit (km)
+
+        aberrate: bool | str {default True}
+            See update_trajectory()
+
+        degree: int {default 12}
+            Degree of the polynomial for each segment of the fit
+
+        Returns
+        -------
+        ChebyshevEphemeris
+            The fit, in MSM' coordinates (radii) as a function of ephemeris
+            time
+        """
+
+        with KernelSession(self.metakernel):
+            start, end = datetime64_to_et(
+                np.array([start_time, end_time], dtype="datetime64[ns]")
             )
 
-            # We want the positions in MSM' coordinates, not MSO', and must add
-            # 479 km to Z.
-            positions[:, 2] += self.constants["DIPOLE_OFFSET_KM"]
+            self.fitted_ephemeris = ChebyshevEphemeris.fit(
+                lambda spice_times: self._positions_at_et(spice_times, aberrate),
+                start,
+                end,
+                tolerance_km / self.constants["MERCURY_RADIUS_KM"],
+                degree=degree,
+            )
+
+        self.fitted_aberrate = aberrate
 
-            # Convert to radii
-            positions /= self.constants["MERCURY_RADIUS_KM"]
+        return self.fitted_ephemeris
 
-            position_dict = {
+    def iter_trajectory(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        res: dt.timedelta,
+        chunk: int = 100_000,
+        aberrate: bool | str = True,
+    ):
+        """A generator of trajectory and region probability information, in
+        chunks of bounded size.
+
+        Unlike update_trajectory(), nothing is stored on the spacecraft, so
+        long time spans (e.g. the full nominal mission at high resolution)
+        can be processed with constant memory. The kernels are kept loaded
+        while iterating.
+
+        Params
+        ------
+        start_time: dt.datetime
+            From what time to start loading trajectory information
+
+        end_time: dt.datetime
+            At what time to stop trajectory information
+
+        res: dt.timedelta
+            The resolution that trajectory data are loaded at
+
+        chunk: int {default 100000}
+            Maximum number of samples in each chunk
+
+        aberrate: bool | str {default True}
+            See update_trajectory()
+
+        Yields
+        ------
+        pd.DataFrame
+            The columns of self.trajectory, followed by one probability
+            column per region (as in self.region_probabilities). Chunks are
+            yielded in chronological order and together cover the same time
+            grid as update_trajectory(start_time, end_time, res).
+        """
+
+        # Fail early if there is no map available, rather than after the
+        # first chunk has been computed.
+        self._get_probability_map()
+
+        # The number of samples is found once for the whole span, as in
+        # update_trajectory(), and each chunk is a slice of that grid. The
+        # slices are generated one at a time, rather than as one large
+        # array.
+        n_samples = round((end_time - start_time) / res)
+        grid_start = np.datetime64(start_time, "ns")
+        step = np.timedelta64(res, "ns")
+
+        with KernelSession(self.metakernel):
+            for i in range(0, n_samples, chunk):
+                times = grid_start + np.arange(i, min(i + chunk, n_samples)) * step
+
+                # The ephemeris times are shared between the positions and
+                # (for a cube) the heliocentric distances.
+                spice_times = datetime64_to_et(times)
+
+                trajectory = self._trajectory_frame(
+                    times,
+                    self._positions(
+                        times,
+                        aberrate,
+                        spice_times=spice_times,
+                        cache_query=dict(
+                            start=start_time.isoformat(),
+                            end=end_time.isoformat(),
+                            res=res.total_seconds(),
+                            rows=[i, i + len(times)],
+                        ),
+                    ),
+                )
+
+                probabilities = self._lookup_probabilities(
+                    trajectory["X MSM'"].to_numpy(),
+                    trajectory["CYL MSM'"].to_numpy(),
+                    trajectory["Time"],
+                    spice_times,
+                    with_bands=self.probability_bands,
+                )
+                yield pd.concat([trajectory, probabilities], axis=1)
+
+    def _compute_trajectory(
+        self,
+        start_time: dt.datetime,
+        end_time: dt.datetime,
+        res: dt.timedelta,
+        aberrate: bool | str,
+    ) -> pd.DataFrame:
+        """Compute trajectory information for a time span, see
+        update_trajectory() for parameters. Returns a dataframe in the format
+        of self.trajectory."""
+
+        # We generate the time grid arithmetically, as datetime64, rather
+        # than as a list of datetime objects.
+        times = time_grid(start_time, round((end_time - start_time) / res), res)
+
+        positions = self._positions(
+            times,
+            aberrate,
+            cache_query=dict(
+                start=start_time.isoformat(),
+                end=end_time.isoformat(),
+                res=res.total_seconds(),
+            ),
+        )
+
+        return self._trajectory_frame(times, positions)
+
+    def _positions(
+        self,
+        times: np.ndarray,
+        aberrate: bool | str,
+        spice_times: np.ndarray | None = None,
+        cache_query: dict | None = None,
+    ) -> np.ndarray:
+        """Find the MSM' positions (radii) of the spacecraft at the given UTC
+        times (datetime64). If self.process_pool is open, SPICE is queried
+        by its workers.
+
+        spice_times can be given if the ephemeris times have already been
+        found (e.g. when sharing a time grid between spacecraft). If
+        cache_query is given, it identifies the time grid in the ephemeris
+        cache."""
+
+        if len(times) == 0:
+            return np.empty((0, 3))
+
+        frame = self._spice_frame(aberrate)
+
+        # Positions only depend on the kernels, frame, and time grid. If we
+        # have computed these before, we can skip SPICE entirely.
+        positions = None
+        use_cache = self.ephemeris_cache is not None and cache_query is not None
+        if use_cache:
+            cache_key = self.ephemeris_cache.key(
+                self.metakernel, target=self.name, frame=frame, **cache_query
+            )
+            positions = self.ephemeris_cache.get(cache_key)
+
+        if positions is None:
+            if self.process_pool is not None:
+                positions = self.process_pool.positions(self.name, frame, times)
+
+            else:
+                # If a session is already open for this metakernel (see
+                # open()), this doesn't reload the kernels.
+                with KernelSession(self.metakernel):
+                    if spice_times is None:
+                        spice_times = datetime64_to_et(times)
+
+                    positions, _ = spice.spkpos(
+                        self.name, spice_times, frame, "NONE", "MERCURY"
+                    )
+
+            if use_cache:
+                self.ephemeris_cache.put(cache_key, positions)
+
+        if aberrate == "daily":
+            # The aberration angle is cheap to find, so we don't cache it.
+            with KernelSession(self.metakernel):
+                if spice_times is None:
+                    spice_times = datetime64_to_et(times)
+
+                positions = self._apply_aberration(positions, spice_times)
+
+        return self._to_msm(positions)
+
+    def _positions_at_et(
+        self, spice_times: np.ndarray, aberrate: bool | str, use_fit: bool = False
+    ) -> np.ndarray:
+        """Find the MSM' positions (radii) of the spacecraft at the given
+        ephemeris times. These are found directly from SPICE, unless use_fit
+        is True and self.fitted_ephemeris covers the times."""
+
+        spice_times = np.asarray(spice_times, dtype=float)
+
+        if len(spice_times) == 0:
+            return np.empty((0, 3))
+
+        if use_fit and self._fit_covers(spice_times, aberrate):
+            return self.fitted_ephemeris.evaluate(spice_times)
+
+        frame = self._spice_frame(aberrate)
+
+        with KernelSession(self.metakernel):
+            positions, _ = spice.spkpos(
+                self.name, spice_times, frame, "NONE", "MERCURY"
+            )
+
+            if aberrate == "daily":
+                positions = self._apply_aberration(positions, spice_times)
+
+        return self._to_msm(positions)
+
+    def _fit_covers(self, spice_times: np.ndarray, aberrate: bool | str) -> bool:
+        """Whether self.fitted_ephemeris can be used for these times"""
+
+        return (
+            self.fitted_ephemeris is not None
+            and self.fitted_aberrate == aberrate
+            and np.min(spice_times) >= self.fitted_ephemeris.start
+            and np.max(spice_times) <= self.fitted_ephemeris.end
+        )
+
+    def _spice_frame(self, aberrate: bool | str) -> str:
+        """The SPICE frame to find positions in, for a given aberration
+        mode"""
+
+        if aberrate not in (True, False, "daily"):
+            raise ValueError(
+                f"Unknown aberration mode: {aberrate!r}. Expected True, False, or 'daily'"
+            )
+
+        # This spice frame kernel uses average Mercury velocity and average
+        # solar wind velocity to determine an average aberration angle, which
+        # is used for all time. With aberrate="daily", we instead find
+        # positions in BC_MSO, and rotate them by an aberration angle which
+        # follows Mercury's orbital velocity (as is done daily in hermpy).
+        return "BC_MSO" if aberrate == "daily" or not aberrate else "BC_MSO_AB"
+
+    def _apply_aberration(
+        self, positions: np.ndarray, spice_times: np.ndarray
+    ) -> np.ndarray:
+        """Rotate BC_MSO positions into the time-variable aberrated frame. A
+        kernel session must be open."""
+
+        angles = aberration_angles(spice_times, self.constants["SOLAR_WIND_SPEED_KMS"])
+
+        return aberrate_positions(positions, angles)
+
+    def _trajectory_frame(self, times: np.ndarray, positions: np.ndarray):
+        """Create a dataframe in the format of self.trajectory from times and
+        MSM' positions (radii)"""
+
+        return pd.DataFrame(
+            {
                 "Time": times,
                 "X MSM'": positions[:, 0],
                 "Y MSM'": positions[:, 1],
                 "Z MSM'": positions[:, 2],
                 "CYL MSM'": np.sqrt(positions[:, 1] ** 2 + positions[:, 2] ** 2),
             }
+        )
 
-            # If we have already provided trajectory information, we want
-            # to append instead of overwriting.
-            if len(self.trajectory) == 0:
-                self.trajectory = pd.DataFrame(position_dict)
-            else:
-                self.trajectory = pd.concat(
-                    [self.trajectory, pd.DataFrame(position_dict)], ignore_index=True
-                )
+    def _heliocentric_distance(self, times, spice_times=None) -> np.ndarray:
+        """Determine the distance (AU) from the Sun of the spacecraft at the
+        given times. A kernel session must be open."""
+
+        if spice_times is None:
+            spice_times = datetime64_to_et(times)
+
+        positions, _ = spice.spkpos(self.name, spice_times, "J2000", "NONE", "SUN")
+
+        return np.linalg.norm(positions, axis=1) / self.constants["AU_KM"]
+
+    def _to_msm(self, positions: np.ndarray) -> np.ndarray:
+        """Convert positions from SPICE (MSO', km) to MSM' (radii)"""
+
+        positions = np.array(positions, dtype=float)
+
+        # We want the positions in MSM' coordinates, not MSO', and must add
+        # 479 km to Z.
+        positions[:, 2] += self.constants["DIPOLE_OFFSET_KM"]
+
+        # Convert to radii
+        positions /= self.constants["MERCURY_RADIUS_KM"]
 
-                # We must sort these data to allow for adding trajectory
-                # information in non-chronological orders.
-                self.trajectory = self.trajectory.sort_values("Time")
+        return positions
@@ -0,0 +1,1687 @@
+"""
+Region probability maps built from MESSENGER region observations
+"""
+
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from wamms.constants import load_constants
+
+__all__ = [
+    "REGION_NAMES",
+    "RegionProbabilityMap",
+    "RegionProbabilityPyramid",
+    "AdaptiveRegionProbabilityMap",
+    "RegionProbabilityCube",
+    "probabilities_at",
+]
+
+REGION_NAMES = ["Solar Wind", "Magnetosheath", "Magnetosphere"]
+
+_CONSTANTS = load_constants()
+
+
+def _flat_bin_indices(
+    values: list, edges: list[np.ndarray]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find the flattened (C order) bin index of each point in a regular
+    N-dimensional grid of bins.
+
+    Values outside of the edges (including the final edge, as with
+    np.digitize) are marked as outside.
+    """
+
+    flat_indices = np.zeros(np.shape(values[0]), dtype=np.intp)
+    inside = np.ones(np.shape(values[0]), dtype=bool)
+
+    for axis_values, axis_edges in zip(values, edges):
+        n_bins = len(axis_edges) - 1
+        indices = np.digitize(np.asarray(axis_values, dtype=float), axis_edges) - 1
+
+        inside &= (indices >= 0) & (indices < n_bins)
+        flat_indices = flat_indices * n_bins + indices
+
+    return flat_indices, inside
+
+
+def _bilinear_neighbours(
+    x, cyl, x_edges: np.ndarray, cyl_edges: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Find the four bins surrounding each point, and their weights, for
+    bilinear interpolation between bin centres. Within half a bin of the edge
+    of the grid, values are held constant towards the edge.
+
+    Returns the X and CYL bin indices of each neighbour, each of shape
+    (N, 4), the weights of each neighbour, and whether each point is within
+    the grid.
+    """
+
+    x = np.asarray(x, dtype=float)
+    cyl = np.asarray(cyl, dtype=float)
+
+    inside = (
+        (x >= x_edges[0])
+        & (x < x_edges[-1])
+        & (cyl >= cyl_edges[0])
+        & (cyl < cyl_edges[-1])
+    )
+
+    axis_indices = []
+    axis_weights = []
+    for values, edges in ((x, x_edges), (cyl, cyl_edges)):
+        centres = (edges[:-1] + edges[1:]) / 2
+
+        lower = np.clip(
+            np.searchsorted(centres, values, side="right") - 1,
+            0,
+            max(len(centres) - 2, 0),
+        )
+        upper = np.minimum(lower + 1, len(centres) - 1)
+
+        spacing = centres[upper] - centres[lower]
+        fraction = np.zeros(np.shape(values))
+        np.divide(values - centres[lower], spacing, out=fraction, where=spacing > 0)
+        fraction = np.clip(fraction, 0, 1)
+
+        axis_indices.append((lower, upper))
+        axis_weights.append((1 - fraction, fraction))
+
+    (x_lower, x_upper), (cyl_lower, cyl_upper) = axis_indices
+    (x_lower_weight, x_upper_weight), (cyl_lower_weight, cyl_upper_weight) = (
+        axis_weights
+    )
+
+    x_indices = np.stack([x_lower, x_lower, x_upper, x_upper], axis=1)
+    cyl_indices = np.stack([cyl_lower, cyl_upper, cyl_lower, cyl_upper], axis=1)
+    weights = np.stack(
+        [
+            x_lower_weight * cyl_lower_weight,
+            x_lower_weight * cyl_upper_weight,
+            x_upper_weight * cyl_lower_weight,
+            x_upper_weight * cyl_upper_weight,
+        ],
+        axis=1,
+    )
+
+    return x_indices, cyl_indices, weights, inside
+
+
+def _lookup_weights(
+    lookup_table: np.ndarray,
+    flat_indices: np.ndarray,
+    weights: np.ndarray,
+    inside: np.ndarray,
+) -> np.ndarray:
+    """Leave out bins without probabilities (never visited) from the
+    weights of several bins for each point, along with points outside of the
+    map"""
+
+    # If a bin has no observations, all of its probabilities are nan
+    return np.where(
+        np.isnan(lookup_table[flat_indices, 0]) | ~inside[:, None], 0, weights
+    )
+
+
+def _weighted_lookup(
+    table: np.ndarray, flat_indices: np.ndarray, weights: np.ndarray
+) -> np.ndarray:
+    """Combine the values of several bins for each point, with the given
+    weights, renormalised to sum to one. For probabilities, the result is
+    therefore still a probability distribution. Points with no weight are
+    nan."""
+
+    values = np.nan_to_num(table[flat_indices])
+    total_weights = np.sum(weights, axis=1).reshape((-1,) + (1,) * (table.ndim - 1))
+
+    combined = np.full((len(weights),) + table.shape[1:], np.nan)
+    np.divide(
+        np.einsum("nk,nk...->n...", weights, values),
+        total_weights,
+        out=combined,
+        where=total_weights > 0,
+    )
+
+    return combined
+
+
+def _gaussian_kernel(edges: np.ndarray, sigma: float, truncate: float) -> np.ndarray:
+    """A matrix which spreads the contents of each bin over its neighbours,
+    with a Gaussian of width sigma (in the units of edges), cut off at
+    truncate * sigma. Each column sums to one, so the total is conserved."""
+
+    centres = (edges[:-1] + edges[1:]) / 2
+    separations = centres[:, None] - centres[None, :]
+
+    kernel = np.exp(-0.5 * (separations / sigma) ** 2)
+    kernel[np.abs(separations) > truncate * sigma] = 0
+
+    return kernel / np.sum(kernel, axis=0)
+
+
+def _dirichlet_bands(
+    count_table: np.ndarray,
+    prior: float,
+    credible_interval: float,
+    n_draws: int,
+    seed: int,
+    chunk: int = 1024,
+) -> dict[str, np.ndarray]:
+    """Find the Dirichlet posterior mean and equal-tailed credible interval
+    of the probability of each region, for each bin.
+
+    The marginal posterior of each region's probability is
+    Beta(counts + prior, total + n_regions * prior - counts - prior). Without
+    scipy for its quantile function, we sample from this with a fixed seed,
+    and take percentiles. Bins are processed in chunks to bound memory use.
+
+    Params
+    ------
+    count_table: np.ndarray
+        Numbers of independent observations, of shape (n_bins, n_regions)
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        "Posterior Mean", "Posterior Lower", and "Posterior Upper", each of
+        shape (n_bins, n_regions)
+    """
+
+    alpha = count_table + prior
+    alpha_total = np.sum(alpha, axis=1, keepdims=True)
+
+    tail = 100 * (1 - credible_interval) / 2
+
+    rng = np.random.default_rng(seed)
+
+    lower = np.empty_like(alpha)
+    upper = np.empty_like(alpha)
+    for start in range(0, len(alpha), chunk):
+        rows = slice(start, start + chunk)
+
+        draws = rng.beta(
+            alpha[rows],
+            alpha_total[rows] - alpha[rows],
+            size=(n_draws,) + alpha[rows].shape,
+        )
+        lower[rows], upper[rows] = np.percentile(draws, [tail, 100 - tail], axis=0)
+
+    return {
+        "Posterior Mean": alpha / alpha_total,
+        "Posterior Lower": lower,
+        "Posterior Upper": upper,
+    }
+
+
+def _bootstrap_bands(
+    count_table: np.ndarray,
+    n_resamples: int,
+    percentiles: tuple[float, float],
+    seed: int,
+    chunk: int = 1024,
+) -> dict[str, np.ndarray]:
+    """Find bootstrap percentile bands of the probability of each region, for
+    each bin.
+
+    Rather than resampling the observations and re-binning, we draw each
+    bin's resampled counts directly from a multinomial distribution, with the
+    bin's total and observed probabilities. All resamples of a chunk of bins
+    are drawn in one call. Counts are rounded to whole observations.
+
+    Params
+    ------
+    count_table: np.ndarray
+        Numbers of independent observations, of shape (n_bins, n_regions)
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        "Bootstrap Lower" and "Bootstrap Upper", each of shape
+        (n_bins, n_regions). Bins without observations are nan.
+    """
+
+    counts = np.round(count_table).astype(np.int64)
+    totals = np.sum(counts, axis=1)
+
+    # Empty bins are given arbitrary (valid) probabilities, and set to nan
+    # afterwards.
+    probabilities = np.full(counts.shape, 1 / counts.shape[1])
+    np.divide(counts, totals[:, None], out=probabilities, where=totals[:, None] > 0)
+
+    rng = np.random.default_rng(seed)
+
+    lower = np.full(counts.shape, np.nan)
+    upper = np.full(counts.shape, np.nan)
+    for start in range(0, len(counts), chunk):
+        rows = slice(start, start + chunk)
+
+        resampled = rng.multinomial(
+            totals[rows],
+            probabilities[rows],
+            size=(n_resamples, len(totals[rows])),
+        )
+
+        with np.errstate(invalid="ignore"):
+            resampled_probabilities = resampled / totals[rows][:, None]
+
+        lower[rows], upper[rows] = np.percentile(
+            resampled_probabilities, percentiles, axis=0
+        )
+
+    empty = totals == 0
+    lower[empty] = np.nan
+    upper[empty] = np.nan
+
+    return {"Bootstrap Lower": lower, "Bootstrap Upper": upper}
+
+
+class _RegionProbabilityGrid:
+    """Region observation counts, and the resulting probabilities, on a
+    regular grid of bins with any number of axes. The first two axes are X
+    and CYL MSM'.
+
+    This holds everything which doesn't depend on what the axes are, and is
+    shared by RegionProbabilityMap and RegionProbabilityCube. Subclasses set
+    the attribute named by each of _edge_names before calling __init__().
+    """
+
+    # Attributes holding the bin edges along each axis, in order
+    _edge_names: tuple[str, ...] = ()
+
+    def __init__(
+        self,
+        counts: np.ndarray,
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        self.counts = np.asarray(counts, dtype=float)
+        self.region_names = list(region_names)
+        self.sample_interval = float(sample_interval)
+
+        expected_shape = (len(self.region_names),) + tuple(
+            len(edges) - 1 for edges in self.edges
+        )
+        if self.counts.shape != expected_shape:
+            raise ValueError(
+                f"Counts have shape {self.counts.shape}, expected {expected_shape}"
+            )
+
+        self.totals = np.sum(self.counts, axis=0)
+
+        # Bins MESSENGER never visited have no defined probability, we leave
+        # these as nan.
+        self.probabilities = np.full_like(self.counts, np.nan)
+        np.divide(
+            self.counts,
+            self.totals,
+            out=self.probabilities,
+            where=self.totals > 0,
+        )
+
+        # For lookups we want the region axis last and the spatial axes
+        # flattened, so that one fancy index returns an (N, n_regions) array.
+        self._lookup_table = np.ascontiguousarray(
+            self.probabilities.reshape(len(self.region_names), -1).T
+        )
+
+        # The counts behind the probabilities of each bin, in the same layout
+        self._count_table = np.ascontiguousarray(
+            self.counts.reshape(len(self.region_names), -1).T
+        )
+
+        # Optional per-bin uncertainty bands, in the same layout, see
+        # dirichlet_posterior(). The version is incremented whenever these
+        # are replaced, so that spacecraft know to look them up again.
+        self.bands: dict[str, np.ndarray] = {}
+        self._bands_version = 0
+
+        # The "Bin Count" of bands_at(), found on first use
+        self._observation_totals = None
+
+    @property
+    def bands_version(self) -> int:
+        """Incremented whenever self.bands are replaced, e.g. to tell whether
+        bands looked up previously are still current"""
+        return self._bands_version
+
+    @property
+    def edges(self) -> list[np.ndarray]:
+        """The bin edges along each axis"""
+        return [getattr(self, name) for name in self._edge_names]
+
+    def bin_indices(self, *values) -> tuple[np.ndarray, np.ndarray]:
+        """Find the flattened bin index for each position
+
+        Params
+        ------
+        *values: array-like
+            Positions along each axis, e.g. X and CYL MSM' (radii) for a
+            RegionProbabilityMap
+
+        Returns
+        -------
+        indices: np.ndarray
+            Flattened bin index of each position. Only meaningful where
+            inside is True.
+
+        inside: np.ndarray
+            Boolean mask of positions which fall within the grid
+        """
+
+        return _flat_bin_indices(list(values), self.edges)
+
+    def _bilinear_weights(self, values: list) -> tuple[np.ndarray, np.ndarray]:
+        """Find the neighbouring bins and weights for bilinear interpolation
+        in X and CYL, within the bin containing each position along any other
+        axes. Bins without probabilities have no weight.
+
+        Returns flattened bin indices and weights, each of shape (N, 4).
+        """
+
+        x_indices, cyl_indices, weights, inside = _bilinear_neighbours(
+            values[0], values[1], self.edges[0], self.edges[1]
+        )
+
+        indices = x_indices * (len(self.edges[1]) - 1) + cyl_indices
+        for axis_values, axis_edges in zip(values[2:], self.edges[2:]):
+            n_bins = len(axis_edges) - 1
+            axis_indices = (
+                np.digitize(np.asarray(axis_values, dtype=float), axis_edges) - 1
+            )
+            inside &= (axis_indices >= 0) & (axis_indices < n_bins)
+
+            indices = indices * n_bins + np.clip(axis_indices, 0, n_bins - 1)[:, None]
+
+        return indices, _lookup_weights(self._lookup_table, indices, weights, inside)
+
+    def _tables_at(
+        self, tables: dict[str, np.ndarray], values: list, interpolation: str
+    ) -> dict[str, np.ndarray]:
+        """Look up several tables in the flattened bin layout (e.g.
+        self._lookup_table and self.bands) at positions along each axis. The
+        bins, and any interpolation weights, are found once for all of the
+        tables. Positions outside of the grid are nan."""
+
+        if interpolation == "bilinear":
+            indices, weights = self._bilinear_weights(values)
+
+            return {
+                name: _weighted_lookup(table, indices, weights)
+                for name, table in tables.items()
+            }
+
+        elif interpolation != "nearest":
+            raise ValueError(f"Unknown interpolation: {interpolation!r}")
+
+        indices, inside = self.bin_indices(*values)
+
+        looked_up = {}
+        for name, table in tables.items():
+            looked_up[name] = np.full((len(indices),) + table.shape[1:], np.nan)
+            looked_up[name][inside] = table[indices[inside]]
+
+        return looked_up
+
+    def _probabilities_at(self, values: list, interpolation: str) -> np.ndarray:
+        """Look up region probabilities at positions along each axis"""
+
+        return self._tables_at(
+            {"Probabilities": self._lookup_table}, values, interpolation
+        )["Probabilities"]
+
+    def _band_tables(self) -> dict[str, np.ndarray]:
+        """The tables looked up by bands_at()"""
+
+        # Counted in observations, as the bands are, rather than in the units
+        # of self.counts. These only depend on the counts, so are found once.
+        if self._observation_totals is None:
+            self._observation_totals = np.sum(self.observations(), axis=1)
+
+        return {"Bin Count": self._observation_totals, **self.bands}
+
+    def observations(self, observation_interval: float = 5) -> np.ndarray:
+        """The number of independent observations behind the counts of each
+        bin, as used for the uncertainty bands.
+
+        Counts are in units of sample_interval seconds, which depends on how
+        the map was built (e.g. 1 second for dwell_time_map()). So that the
+        bands don't depend on this, we convert the counts to a number of
+        observations of observation_interval seconds each.
+
+        Params
+        ------
+        observation_interval: float {default 5}
+            Seconds of data treated as one independent observation. The
+            default is the resolution of the MESSENGER dataset.
+
+        Returns
+        -------
+        np.ndarray
+            Observations of shape (n_bins, n_regions), with bins flattened
+        """
+
+        return self._count_table * (self.sample_interval / observation_interval)
+
+    def dirichlet_posterior(
+        self,
+        prior: float = 1,
+        credible_interval: float = 0.9,
+        n_draws: int = 2000,
+        seed: int = 0,
+        observation_interval: float = 5,
+    ):
+        """Find the Dirichlet posterior mean and credible interval of the
+        probabilities in each bin, and add them to self.bands.
+
+        Treating the counts in each bin as multinomial observations with a
+        symmetric Dirichlet(prior) prior, the posterior is Dirichlet(counts +
+        prior). Unlike the raw probabilities, the posterior mean is defined
+        in empty bins (falling back to the prior), and the credible intervals
+        are wide where there are few observations. See
+        _dirichlet_bands() for details.
+
+        Params
+        ------
+        prior: float {default 1}
+            Concentration of the prior for each region. 1 is uniform.
+
+        credible_interval: float {default 0.9}
+            Probability mass within the credible intervals
+
+        n_draws: int {default 2000}
+            Number of posterior samples used to find the intervals
+
+        seed: int {default 0}
+            Random seed, so the intervals are reproducible
+
+        observation_interval: float {default 5}
+            Seconds of data treated as one independent observation, see
+            observations()
+
+        Returns
+        -------
+        self, with "Posterior Mean", "Posterior Lower", and "Posterior Upper"
+        bands
+        """
+
+        self.bands.update(
+            _dirichlet_bands(
+                self.observations(observation_interval),
+                prior,
+                credible_interval,
+                n_draws,
+                seed,
+            )
+        )
+        self._bands_version += 1
+
+        return self
+
+    def bootstrap(
+        self,
+        n_resamples: int = 1000,
+        percentiles: tuple[float, float] = (5, 95),
+        seed: int = 0,
+        observation_interval: float = 5,
+    ):
+        """Find bootstrap percentile bands of the probabilities in each bin,
+        and add them to self.bands.
+
+        The counts in each bin are resampled from a multinomial distribution
+        with the observed probabilities, see _bootstrap_bands(). This
+        treats each observation as independent.
+
+        Params
+        ------
+        n_resamples: int {default 1000}
+            Number of bootstrap resamples
+
+        percentiles: tuple[float, float] {default (5, 95)}
+            Percentiles of the resampled probabilities to use as the bands
+
+        seed: int {default 0}
+            Random seed, so the bands are reproducible
+
+        observation_interval: float {default 5}
+            Seconds of data treated as one independent observation, see
+            observations()
+
+        Returns
+        -------
+        self, with "Bootstrap Lower" and "Bootstrap Upper" bands
+        """
+
+        self.bands.update(
+            _bootstrap_bands(
+                self.observations(observation_interval),
+                n_resamples,
+                percentiles,
+                seed,
+            )
+        )
+        self._bands_version += 1
+
+        return self
+
+    def bands_at(
+        self, *values, interpolation: str = "nearest"
+    ) -> dict[str, np.ndarray]:
+        """Look up the uncertainty bands at each position
+
+        Params
+        ------
+        *values: array-like
+            Positions along each axis, see bin_indices()
+
+        interpolation: str {default "nearest"}
+            "nearest" uses the bands of the bin containing each position.
+            "bilinear" interpolates them with the same weights as
+            probabilities_at(), so that interpolated probabilities are
+            compared with bands found in the same way.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            "Bin Count": the number of 5 s observations (see observations())
+            behind the probabilities at each position, whatever the units
+            of self.counts (with "bilinear", the weighted mean of the
+            neighbouring bins), of shape (N,), followed by each of
+            self.bands, of shape (N, n_regions). Positions outside of the
+            grid are nan.
+        """
+
+        return self._tables_at(self._band_tables(), list(values), interpolation)
+
+    def probabilities_and_bands_at(
+        self, *values, interpolation: str = "nearest"
+    ) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """Look up both the region probabilities and the uncertainty bands at
+        each position, finding the bins (and interpolation weights) only
+        once
+
+        Params
+        ------
+        *values: array-like
+            Positions along each axis, see bin_indices()
+
+        interpolation: str {default "nearest"}
+            See bands_at()
+
+        Returns
+        -------
+        probabilities: np.ndarray
+            As from probabilities_at()
+
+        bands: dict[str, np.ndarray]
+            As from bands_at()
+        """
+
+        looked_up = self._tables_at(
+            {"Probabilities": self._lookup_table, **self._band_tables()},
+            list(values),
+            interpolation,
+        )
+
+        return looked_up.pop("Probabilities"), looked_up
+
+    def smoothed(self, sigma: float, truncate: float = 4):
+        """Create a smoothed copy, by spreading the observation counts of each
+        bin over its neighbours in X and CYL with a Gaussian kernel. Any
+        other axes (e.g. heliocentric distance) are not smoothed.
+
+        This is a kernel density estimate of the observations of each
+        region, precomputed on the bin grid, so lookups are as fast as for
+        the original. Bins near to, but not visited by, MESSENGER gain
+        probabilities.
+
+        Params
+        ------
+        sigma: float
+            Width of the Gaussian kernel (radii)
+
+        truncate: float {default 4}
+            The kernel is cut off at this many sigma
+
+        Returns
+        -------
+        A new object of the same type
+        """
+
+        x_kernel = _gaussian_kernel(self.edges[0], sigma, truncate)
+        cyl_kernel = _gaussian_kernel(self.edges[1], sigma, truncate)
+
+        return type(self)(
+            *self.edges,
+            np.einsum("ai,rij...,bj->rab...", x_kernel, self.counts, cyl_kernel),
+            region_names=self.region_names,
+            sample_interval=self.sample_interval,
+        )
+
+    @property
+    def residence_time(self) -> np.ndarray:
+        """Total time (seconds) MESSENGER spent in each bin"""
+        return self.totals * self.sample_interval
+
+    def _save_arrays(self) -> dict:
+        """The arrays written to file by save()"""
+
+        arrays = {name: getattr(self, name) for name in self._edge_names}
+        arrays.update(
+            counts=self.counts,
+            region_names=np.array(self.region_names),
+            sample_interval=self.sample_interval,
+        )
+
+        # Bands are kept, so they don't need to be found again
+        for name, table in self.bands.items():
+            arrays[f"band {name}"] = table
+
+        return arrays
+
+    def _load_bands(self, data):
+        """Restore the bands from a file opened by load()"""
+
+        for key in data.files:
+            if key.startswith("band "):
+                self.bands[key.removeprefix("band ")] = data[key]
+
+        self._bands_version += 1
+
+    def save(self, path: str | pathlib.Path):
+        """Save to a compressed .npz file
+
+        Params
+        ------
+        path: str | pathlib.Path
+            File to save to
+        """
+
+        np.savez_compressed(path, **self._save_arrays())
+
+    @classmethod
+    def load(cls, path: str | pathlib.Path):
+        """Load from a file previously saved with save()
+
+        Params
+        ------
+        path: str | pathlib.Path
+            .npz file to load from
+        """
+
+        with np.load(path) as data:
+            loaded = cls(
+                *(data[name] for name in cls._edge_names),
+                data["counts"],
+                data["region_names"].tolist(),
+                float(data["sample_interval"]),
+            )
+            loaded._load_bands(data)
+
+        return loaded
+
+
+class RegionProbabilityMap(_RegionProbabilityGrid):
+    """A 2D map of magnetospheric region probabilities in the cylindrical
+    MSM' plane.
+
+    The map holds the bin edges, the number of MESSENGER observations of each
+    region within each bin, and the resulting normalised probabilities. It is
+    intended to be built once (e.g. with from_prediction_data()), saved to
+    file, and then shared between any number of spacecraft.
+
+    Params
+    ------
+    x_edges: np.ndarray
+        Bin edges along X MSM' (radii)
+
+    cyl_edges: np.ndarray
+        Bin edges along (Y MSM'^2 + Z MSM'^2)^0.5 (radii)
+
+    counts: np.ndarray
+        Observation counts of shape (n_regions, n_x_bins, n_cyl_bins)
+
+    region_names: list[str] {default REGION_NAMES}
+        The region each entry along the first axis of counts refers to
+
+    sample_interval: float {default 5}
+        The number of seconds of data represented by each count. The
+        MESSENGER dataset is created at 5 second resolution.
+    """
+
+    _edge_names = ("x_edges", "cyl_edges")
+
+    def __init__(
+        self,
+        x_edges: np.ndarray,
+        cyl_edges: np.ndarray,
+        counts: np.ndarray,
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        self.x_edges = np.asarray(x_edges, dtype=float)
+        self.cyl_edges = np.asarray(cyl_edges, dtype=float)
+
+        super().__init__(counts, region_names, sample_interval)
+
+    @classmethod
+    def from_prediction_data(
+        cls,
+        prediction_data: pd.DataFrame,
+        bin_size: float = 0.25,
+        x_range: tuple[float, float] = (-5, 5),
+        cyl_range: tuple[float, float] = (0, 8),
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        """Create a probability map by binning the MESSENGER region observations
+
+        Params
+        ------
+        prediction_data: pd.DataFrame
+            MESSENGER region observations, as created by
+            resources/region_probabilities/create_messenger_dataset.py
+
+        bin_size: float {default 0.25}
+            Size of each bin in both X and CYL (radii)
+
+        x_range: tuple[float, float] {default (-5, 5)}
+            Limits of the map in X MSM' (radii)
+
+        cyl_range: tuple[float, float] {default (0, 8)}
+            Limits of the map in CYL MSM' (radii)
+
+        region_names: list[str] {default REGION_NAMES}
+            Which regions to include in the map
+
+        sample_interval: float {default 5}
+            Seconds of data represented by each row of prediction_data
+
+        Returns
+        -------
+        RegionProbabilityMap
+        """
+
+        x_edges = np.arange(x_range[0], x_range[1] + bin_size, bin_size)
+        cyl_edges = np.arange(cyl_range[0], cyl_range[1] + bin_size, bin_size)
+
+        # Rather than filtering the dataset and histogramming once per region,
+        # we convert the region labels to integer codes and bin everything in
+        # a single 3D pass.
+        region_codes = pd.Index(region_names).get_indexer(
+            prediction_data["Predicted Region"]
+        )
+
+        counts, _ = np.histogramdd(
+            (
+                region_codes,
+                prediction_data["X MSM' (radii)"].to_numpy(),
+                prediction_data["CYL MSM' (radii)"].to_numpy(),
+            ),
+            bins=(np.arange(len(region_names) + 1) - 0.5, x_edges, cyl_edges),
+        )
+
+        return cls(x_edges, cyl_edges, counts, region_names, sample_interval)
+
+    def probabilities_at(self, x, cyl, interpolation: str = "nearest") -> np.ndarray:
+        """Look up region probabilities at arbitrary positions
+
+        Params
+        ------
+        x: array-like
+            X MSM' positions (radii)
+
+        cyl: array-like
+            CYL MSM' positions (radii)
+
+        interpolation: str {default "nearest"}
+            "nearest" uses the probabilities of the bin containing each
+            position. "bilinear" interpolates between the centres of the four
+            surrounding bins, leaving out any which MESSENGER never visited.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (N, n_regions), ordered as self.region_names.
+            Positions outside of the map are nan.
+        """
+
+        return self._probabilities_at([x, cyl], interpolation)
+
+
+def _block_sum(counts: np.ndarray, factor: int) -> np.ndarray:
+    """Sum (n_regions, n_x, n_cyl) counts over blocks of factor x factor bins"""
+
+    n_regions, n_x, n_cyl = counts.shape
+
+    return counts.reshape(
+        n_regions, n_x // factor, factor, n_cyl // factor, factor
+    ).sum(axis=(2, 4))
+
+
+def _block_min(values: np.ndarray, factor: int) -> np.ndarray:
+    """Minimum of a 2D array over blocks of factor x factor elements"""
+
+    n_x, n_cyl = values.shape
+
+    return values.reshape(n_x // factor, factor, n_cyl // factor, factor).min(
+        axis=(1, 3)
+    )
+
+
+def _upsample(values: np.ndarray, factor: int, axes: tuple[int, int] = (0, 1)):
+    """Repeat each element of an array factor times along two axes"""
+
+    return np.repeat(np.repeat(values, factor, axis=axes[0]), factor, axis=axes[1])
+
+
+class RegionProbabilityPyramid:
+    """Region probability maps at several bin sizes, built from a single
+    histogram.
+
+    The observations are binned once at the finest bin size. Each coarser
+    level halves the resolution, and its counts are found exactly by summing
+    2 x 2 blocks of the level below, so comparing bin sizes doesn't need the
+    dataset to be re-binned.
+
+    Params
+    ------
+    x_edges: np.ndarray
+        Bin edges along X MSM' (radii) at the finest level
+
+    cyl_edges: np.ndarray
+        Bin edges along CYL MSM' (radii) at the finest level
+
+    counts: np.ndarray
+        Observation counts at the finest level, of shape
+        (n_regions, n_x_bins, n_cyl_bins)
+
+    n_levels: int {default 4}
+        Number of levels. Level 0 is the coarsest, with bins
+        2 ** (n_levels - 1) finest bins across, and level n_levels - 1 is
+        the finest.
+
+    region_names: list[str] {default REGION_NAMES}
+        The region each entry along the first axis of counts refers to
+
+    sample_interval: float {default 5}
+        The number of seconds of data represented by each count
+    """
+
+    def __init__(
+        self,
+        x_edges: np.ndarray,
+        cyl_edges: np.ndarray,
+        counts: np.ndarray,
+        n_levels: int = 4,
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        self.x_edges = np.asarray(x_edges, dtype=float)
+        self.cyl_edges = np.asarray(cyl_edges, dtype=float)
+        self.counts = np.asarray(counts, dtype=float)
+        self.n_levels = int(n_levels)
+        self.region_names = list(region_names)
+        self.sample_interval = float(sample_interval)
+
+        finest_factor = 2 ** (self.n_levels - 1)
+        if any(n % finest_factor != 0 for n in self.counts.shape[1:]):
+            raise ValueError(
+                f"The number of bins along each axis {self.counts.shape[1:]} must "
+                f"be divisible by 2 ** (n_levels - 1) = {finest_factor}"
+            )
+
+        # One map per level, from coarsest to finest
+        self.maps: list[RegionProbabilityMap] = []
+        for level in range(self.n_levels):
+            factor = self._factor(level)
+
+            self.maps.append(
+                RegionProbabilityMap(
+                    self.x_edges[::factor],
+                    self.cyl_edges[::factor],
+                    _block_sum(self.counts, factor),
+                    self.region_names,
+                    self.sample_interval,
+                )
+            )
+
+        # Adaptive maps by (min_count, rule), see adaptive_map()
+        self._adaptive_maps: dict[tuple[float, str], AdaptiveRegionProbabilityMap] = {}
+
+    @classmethod
+    def from_prediction_data(
+        cls,
+        prediction_data: pd.DataFrame,
+        bin_size: float = 1,
+        n_levels: int = 4,
+        x_range: tuple[float, float] = (-5, 5),
+        cyl_range: tuple[float, float] = (0, 8),
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        """Create a pyramid by binning the MESSENGER region observations once,
+        at the finest level
+
+        Params
+        ------
+        prediction_data: pd.DataFrame
+            MESSENGER region observations, see
+            RegionProbabilityMap.from_prediction_data()
+
+        bin_size: float {default 1}
+            Size of the coarsest bins (radii). The finest bins are
+            bin_size / 2 ** (n_levels - 1), i.e. 0.125 radii by default.
+
+        n_levels: int {default 4}
+            Number of levels
+
+        x_range: tuple[float, float] {default (-5, 5)}
+            Limits of the maps in X MSM' (radii). Must be a whole number of
+            bin_size.
+
+        cyl_range: tuple[float, float] {default (0, 8)}
+            Limits of the maps in CYL MSM' (radii). Must be a whole number of
+            bin_size.
+
+        region_names: list[str] {default REGION_NAMES}
+            Which regions to include in the maps
+
+        sample_interval: float {default 5}
+            Seconds of data represented by each row of prediction_data
+
+        Returns
+        -------
+        RegionProbabilityPyramid
+        """
+
+        finest = RegionProbabilityMap.from_prediction_data(
+            prediction_data,
+            bin_size=bin_size / 2 ** (n_levels - 1),
+            x_range=x_range,
+            cyl_range=cyl_range,
+            region_names=region_names,
+            sample_interval=sample_interval,
+        )
+
+        return cls(
+            finest.x_edges,
+            finest.cyl_edges,
+            finest.counts,
+            n_levels,
+            region_names,
+            sample_interval,
+        )
+
+    def _factor(self, level: int) -> int:
+        """Number of finest bins across each bin of a level"""
+        return 2 ** (self.n_levels - 1 - level)
+
+    @property
+    def bin_sizes(self) -> list[float]:
+        """Bin size (radii) of each level, from coarsest to finest"""
+        return [float(np.diff(level_map.x_edges[:2])[0]) for level_map in self.maps]
+
+    def __getitem__(self, level: int) -> RegionProbabilityMap:
+        """The map at a given level"""
+        return self.maps[level]
+
+    def probabilities_at(
+        self, x, cyl, level: int | None = None, min_count: float | None = None
+    ) -> np.ndarray:
+        """Look up region probabilities at arbitrary positions, either at a
+        fixed level, or choosing the level for each position
+
+        Params
+        ------
+        x: array-like
+            X MSM' positions (radii)
+
+        cyl: array-like
+            CYL MSM' positions (radii)
+
+        level: int | None {default None}
+            If given, the level of the map to use for all positions
+
+        min_count: float | None {default None}
+            If given (instead of level), each position uses the finest level
+            at which the bin containing it has at least this many
+            observations, see levels_by_count()
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (N, n_regions), ordered as self.region_names.
+            Positions outside of the maps are nan.
+        """
+
+        if (level is None) == (min_count is None):
+            raise ValueError("Exactly one of level and min_count must be given")
+
+        if level is not None:
+            return self.maps[level].probabilities_at(x, cyl)
+
+        return self.adaptive_map(min_count, rule="count").probabilities_at(x, cyl)
+
+    def levels_by_count(self, min_count: float) -> np.ndarray:
+        """For each finest bin, find the finest level at which the bin
+        containing it has at least min_count observations. Where no level
+        does, the coarsest level is used.
+
+        Returns
+        -------
+        np.ndarray
+            Levels, of the shape of the finest grid
+        """
+
+        levels = np.zeros(self.counts.shape[1:], dtype=int)
+
+        for level in range(1, self.n_levels):
+            well_sampled = _upsample(
+                self.maps[level].totals >= min_count, self._factor(level)
+            )
+            levels[well_sampled] = level
+
+        return levels
+
+    def quadtree_levels(self, min_count: float) -> np.ndarray:
+        """For each finest bin, find the level of the leaf containing it in a
+        quadtree, where a bin is split if all four of the bins it splits into
+        have at least min_count observations.
+
+        Unlike levels_by_count(), a bin is never finer than its
+        neighbours within the same parent.
+
+        Returns
+        -------
+        np.ndarray
+            Levels, of the shape of the finest grid
+        """
+
+        # Walk down the tree. A bin at the finest level belongs to a leaf at
+        # the deepest level for which every ancestor was split.
+        levels = np.zeros(self.counts.shape[1:], dtype=int)
+        split = np.ones(self.maps[0].totals.shape, dtype=bool)
+
+        for level in range(1, self.n_levels):
+            # Each parent is split if all of its children are well sampled
+            well_sampled = (
+                _block_min(self.maps[level].totals >= min_count, 2).astype(bool) & split
+            )
+            split = _upsample(well_sampled, 2)
+
+            levels += _upsample(split, self._factor(level))
+
+        return levels
+
+    def paint(self, levels: np.ndarray) -> np.ndarray:
+        """Create counts on the finest grid, where each bin takes the counts
+        of the bin containing it at the given level
+
+        Params
+        ------
+        levels: np.ndarray
+            Level for each finest bin, e.g. from quadtree_levels()
+
+        Returns
+        -------
+        np.ndarray
+            Counts of shape (n_regions, n_x_bins, n_cyl_bins)
+        """
+
+        painted = np.zeros_like(self.counts)
+        for level in range(self.n_levels):
+            painted = np.where(
+                levels == level,
+                _upsample(self.maps[level].counts, self._factor(level), axes=(1, 2)),
+                painted,
+            )
+
+        return painted
+
+    def adaptive_map(self, min_count: float, rule: str = "quadtree"):
+        """Create a map which uses a different level in different places.
+        The map is built from the levels of this pyramid, and cached, so
+        repeated calls with the same arguments return the same map.
+
+        Params
+        ------
+        min_count: float
+            See quadtree_levels() and levels_by_count()
+
+        rule: str {default "quadtree"}
+            "quadtree" to use quadtree_levels(), or "count" to use
+            levels_by_count()
+
+        Returns
+        -------
+        AdaptiveRegionProbabilityMap
+        """
+
+        key = (float(min_count), rule)
+
+        if key not in self._adaptive_maps:
+            self._adaptive_maps[key] = AdaptiveRegionProbabilityMap(
+                self.x_edges,
+                self.cyl_edges,
+                self.counts,
+                self.n_levels,
+                min_count,
+                self.region_names,
+                self.sample_interval,
+                rule=rule,
+                pyramid=self,
+            )
+
+        return self._adaptive_maps[key]
+
+    def save(self, path: str | pathlib.Path):
+        """Save the pyramid to a compressed .npz file. Only the finest counts
+        are stored.
+
+        Params
+        ------
+        path: str | pathlib.Path
+            File to save to
+        """
+
+        np.savez_compressed(
+            path,
+            x_edges=self.x_edges,
+            cyl_edges=self.cyl_edges,
+            counts=self.counts,
+            n_levels=self.n_levels,
+            region_names=np.array(self.region_names),
+            sample_interval=self.sample_interval,
+        )
+
+    @classmethod
+    def load(cls, path: str | pathlib.Path):
+        """Load a pyramid previously saved with save()
+
+        Params
+        ------
+        path: str | pathlib.Path
+            .npz file to load from
+
+        Returns
+        -------
+        RegionProbabilityPyramid
+        """
+
+        with np.load(path) as data:
+            return cls(
+                data["x_edges"],
+                data["cyl_edges"],
+                data["counts"],
+                int(data["n_levels"]),
+                data["region_names"].tolist(),
+                float(data["sample_interval"]),
+            )
+
+
+class AdaptiveRegionProbabilityMap(RegionProbabilityMap):
+    """A region probability map with bins which adapt to the MESSENGER
+    coverage, as a quadtree.
+
+    Starting from a coarse grid, each bin is split into four wherever all
+    four of the smaller bins would contain at least min_count observations,
+    down to the finest level. Well-covered areas are therefore mapped finely,
+    while sparsely covered areas keep coarse bins rather than noisy
+    probabilities.
+
+    For fast lookups, the probabilities of each leaf of the tree are painted
+    onto the grid of the finest level, so that positions are located with the
+    same (vectorised) lookup as RegionProbabilityMap.
+
+    Params
+    ------
+    x_edges: np.ndarray
+        Bin edges along X MSM' (radii) at the finest level
+
+    cyl_edges: np.ndarray
+        Bin edges along CYL MSM' (radii) at the finest level
+
+    counts: np.ndarray
+        Observation counts at the finest level, of shape
+        (n_regions, n_x_bins, n_cyl_bins)
+
+    n_levels: int {default 4}
+        Number of levels in the tree. Each level halves the bin size, so the
+        coarsest bins are 2 ** (n_levels - 1) finest bins across.
+
+    min_count: float {default 50}
+        Bins are only split if all four resulting bins have at least this
+        many observations
+
+    region_names: list[str] {default REGION_NAMES}
+        The region each entry along the first axis of counts refers to
+
+    sample_interval: float {default 5}
+        The number of seconds of data represented by each count
+
+    rule: str {default "quadtree"}
+        "quadtree" as above, or "count", where each finest bin independently
+        uses the finest level at which the bin containing it has at least
+        min_count observations. See RegionProbabilityPyramid.
+
+    pyramid: RegionProbabilityPyramid | None {default None}
+        An existing pyramid of the same counts and n_levels to take the
+        levels from. By default, a new one is built.
+
+    Attributes
+    ----------
+    levels: np.ndarray
+        The level (0 being coarsest) of the leaf covering each finest bin
+
+    leaf_counts: np.ndarray
+        The observation counts of the leaf covering each finest bin, of the
+        same shape as counts
+
+    leaf_totals: np.ndarray
+        The total number of observations in the leaf covering each finest
+        bin, i.e. the number of observations each probability is based on.
+        self.totals is still the number in each finest bin.
+    """
+
+    def __init__(
+        self,
+        x_edges: np.ndarray,
+        cyl_edges: np.ndarray,
+        counts: np.ndarray,
+        n_levels: int = 4,
+        min_count: float = 50,
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+        rule: str = "quadtree",
+        pyramid: RegionProbabilityPyramid | None = None,
+    ):
+        super().__init__(x_edges, cyl_edges, counts, region_names, sample_interval)
+
+        self.n_levels = int(n_levels)
+        self.min_count = float(min_count)
+        self.rule = rule
+
+        if pyramid is None:
+            pyramid = RegionProbabilityPyramid(
+                self.x_edges,
+                self.cyl_edges,
+                self.counts,
+                self.n_levels,
+                self.region_names,
+                self.sample_interval,
+            )
+
+        elif (
+            pyramid.n_levels != self.n_levels
+            or pyramid.counts.shape != self.counts.shape
+        ):
+            raise ValueError("pyramid does not match the counts and n_levels given")
+
+        if rule == "quadtree":
+            self.levels = pyramid.quadtree_levels(self.min_count)
+        elif rule == "count":
+            self.levels = pyramid.levels_by_count(self.min_count)
+        else:
+            raise ValueError(f"Unknown rule: {rule!r}")
+
+        # Paint the counts of each leaf onto the finest grid
+        self.leaf_counts = pyramid.paint(self.levels)
+
+        self.leaf_totals = np.sum(self.leaf_counts, axis=0)
+
+        self.probabilities = np.full_like(self.leaf_counts, np.nan)
+        np.divide(
+            self.leaf_counts,
+            self.leaf_totals,
+            out=self.probabilities,
+            where=self.leaf_totals > 0,
+        )
+
+        self._lookup_table = np.ascontiguousarray(
+            self.probabilities.reshape(len(self.region_names), -1).T
+        )
+        self._count_table = np.ascontiguousarray(
+            self.leaf_counts.reshape(len(self.region_names), -1).T
+        )
+
+    @classmethod
+    def from_prediction_data(
+        cls,
+        prediction_data: pd.DataFrame,
+        coarsest_bin_size: float = 1,
+        n_levels: int = 4,
+        min_count: float = 50,
+        x_range: tuple[float, float] = (-5, 5),
+        cyl_range: tuple[float, float] = (0, 8),
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        """Create an adaptive map by binning the MESSENGER region observations
+        once, at the finest level
+
+        Params
+        ------
+        prediction_data: pd.DataFrame
+            MESSENGER region observations, see
+            RegionProbabilityMap.from_prediction_data()
+
+        coarsest_bin_size: float {default 1}
+            Size of the coarsest bins (radii). The finest bins are
+            coarsest_bin_size / 2 ** (n_levels - 1), i.e. 0.125 radii by
+            default.
+
+        n_levels: int {default 4}
+            Number of levels in the tree
+
+        min_count: float {default 50}
+            Bins are only split if all four resulting bins have at least this
+            many observations
+
+        x_range: tuple[float, float] {default (-5, 5)}
+            Limits of the map in X MSM' (radii). Must be a whole number of
+            coarsest_bin_size.
+
+        cyl_range: tuple[float, float] {default (0, 8)}
+            Limits of the map in CYL MSM' (radii). Must be a whole number of
+            coarsest_bin_size.
+
+        region_names: list[str] {default REGION_NAMES}
+            Which regions to include in the map
+
+        sample_interval: float {default 5}
+            Seconds of data represented by each row of prediction_data
+
+        Returns
+        -------
+        AdaptiveRegionProbabilityMap
+        """
+
+        return RegionProbabilityPyramid.from_prediction_data(
+            prediction_data,
+            bin_size=coarsest_bin_size,
+            n_levels=n_levels,
+            x_range=x_range,
+            cyl_range=cyl_range,
+            region_names=region_names,
+            sample_interval=sample_interval,
+        ).adaptive_map(min_count)
+
+    def smoothed(self, sigma: float, truncate: float = 4) -> RegionProbabilityMap:
+        """Create a smoothed copy of the map, see RegionProbabilityMap.smoothed()
+
+        Rather than by its raw counts, the observations in each finest bin
+        are split between the regions by the probabilities of its leaf before
+        smoothing. Sparsely covered areas therefore keep the pooled estimates
+        of their leaves, and the total number of observations is conserved.
+
+        Returns
+        -------
+        RegionProbabilityMap
+            On the grid of the finest level
+        """
+
+        return RegionProbabilityMap(
+            self.x_edges,
+            self.cyl_edges,
+            np.nan_to_num(self.probabilities) * self.totals,
+            self.region_names,
+            self.sample_interval,
+        ).smoothed(sigma, truncate)
+
+    def _save_arrays(self) -> dict:
+        arrays = super()._save_arrays()
+        arrays.update(n_levels=self.n_levels, min_count=self.min_count, rule=self.rule)
+
+        return arrays
+
+    @classmethod
+    def load(cls, path: str | pathlib.Path):
+        """Load a map previously saved with save()
+
+        Params
+        ------
+        path: str | pathlib.Path
+            .npz file to load from
+
+        Returns
+        -------
+        AdaptiveRegionProbabilityMap
+        """
+
+        with np.load(path) as data:
+            loaded = cls(
+                data["x_edges"],
+                data["cyl_edges"],
+                data["counts"],
+                int(data["n_levels"]),
+                float(data["min_count"]),
+                data["region_names"].tolist(),
+                float(data["sample_interval"]),
+                str(data["rule"]),
+            )
+            loaded._load_bands(data)
+
+        return loaded
+
+
+class RegionProbabilityCube(_RegionProbabilityGrid):
+    """A 3D map of magnetospheric region probabilities, binned in the
+    cylindrical MSM' plane and in heliocentric distance.
+
+    Mercury's eccentric orbit moves the magnetospheric boundaries
+    considerably, so the region probabilities at a given position depend on
+    the heliocentric distance. This holds the same information as
+    RegionProbabilityMap, with an extra axis.
+
+    Params
+    ------
+    x_edges: np.ndarray
+        Bin edges along X MSM' (radii)
+
+    cyl_edges: np.ndarray
+        Bin edges along (Y MSM'^2 + Z MSM'^2)^0.5 (radii)
+
+    distance_edges: np.ndarray
+        Bin edges in heliocentric distance (AU)
+
+    counts: np.ndarray
+        Observation counts of shape
+        (n_regions, n_x_bins, n_cyl_bins, n_distance_bins)
+
+    region_names: list[str] {default REGION_NAMES}
+        The region each entry along the first axis of counts refers to
+
+    sample_interval: float {default 5}
+        The number of seconds of data represented by each count
+    """
+
+    _edge_names = ("x_edges", "cyl_edges", "distance_edges")
+
+    def __init__(
+        self,
+        x_edges: np.ndarray,
+        cyl_edges: np.ndarray,
+        distance_edges: np.ndarray,
+        counts: np.ndarray,
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        self.x_edges = np.asarray(x_edges, dtype=float)
+        self.cyl_edges = np.asarray(cyl_edges, dtype=float)
+        self.distance_edges = np.asarray(distance_edges, dtype=float)
+
+        super().__init__(counts, region_names, sample_interval)
+
+    @classmethod
+    def from_prediction_data(
+        cls,
+        prediction_data: pd.DataFrame,
+        bin_size: float = 0.25,
+        x_range: tuple[float, float] = (-5, 5),
+        cyl_range: tuple[float, float] = (0, 8),
+        distance_bin_size: float = 0.02,
+        distance_range: tuple[float, float] = (0.30, 0.48),
+        region_names: list[str] = REGION_NAMES,
+        sample_interval: float = 5,
+    ):
+        """Create a probability cube by binning the MESSENGER region
+        observations in a single pass
+
+        Params
+        ------
+        prediction_data: pd.DataFrame
+            MESSENGER region observations, as created by
+            resources/region_probabilities/create_messenger_dataset.py. The
+            "Heliocentric Distance" column is in km.
+
+        bin_size: float {default 0.25}
+            Size of each bin in both X and CYL (radii)
+
+        x_range: tuple[float, float] {default (-5, 5)}
+            Limits of the cube in X MSM' (radii)
+
+        cyl_range: tuple[float, float] {default (0, 8)}
+            Limits of the cube in CYL MSM' (radii)
+
+        distance_bin_size: float {default 0.02}
+            Size of each bin in heliocentric distance (AU)
+
+        distance_range: tuple[float, float] {default (0.30, 0.48)}
+            Limits of the cube in heliocentric distance (AU). The default
+            covers Mercury's full orbit.
+
+        region_names: list[str] {default REGION_NAMES}
+            Which regions to include in the cube
+
+        sample_interval: float {default 5}
+            Seconds of data represented by each row of prediction_data
+
+        Returns
+        -------
+        RegionProbabilityCube
+        """
+
+        x_edges = np.arange(x_range[0], x_range[1] + bin_size, bin_size)
+        cyl_edges = np.arange(cyl_range[0], cyl_range[1] + bin_size, bin_size)
+        distance_edges = np.arange(
+            distance_range[0],
+            distance_range[1] + distance_bin_size / 2,
+            distance_bin_size,
+        )
+
+        region_codes = pd.Index(region_names).get_indexer(
+            prediction_data["Predicted Region"]
+        )
+
+        counts, _ = np.histogramdd(
+            (
+                region_codes,
+                prediction_data["X MSM' (radii)"].to_numpy(),
+                prediction_data["CYL MSM' (radii)"].to_numpy(),
+                prediction_data["Heliocentric Distance"].to_numpy(dtype=float)
+                / _CONSTANTS["AU_KM"],
+            ),
+            bins=(
+                np.arange(len(region_names) + 1) - 0.5,
+                x_edges,
+                cyl_edges,
+                distance_edges,
+            ),
+        )
+
+        return cls(
+            x_edges, cyl_edges, distance_edges, counts, region_names, sample_interval
+        )
+
+    def probabilities_at(
+        self, x, cyl, distance, interpolation: str = "nearest"
+    ) -> np.ndarray:
+        """Look up region probabilities at arbitrary positions and
+        heliocentric distances
+
+        Params
+        ------
+        x: array-like
+            X MSM' positions (radii)
+
+        cyl: array-like
+            CYL MSM' positions (radii)
+
+        distance: array-like
+            Heliocentric distances (AU)
+
+        interpolation: str {default "nearest"}
+            See RegionProbabilityMap.probabilities_at(). Interpolation is in
+            X and CYL only, within the distance bin of each position.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (N, n_regions), ordered as self.region_names.
+            Positions outside of the cube are nan.
+        """
+
+        return self._probabilities_at([x, cyl, distance], interpolation)
+
+    def map(
+        self, distance_range: tuple[float, float] | None = None
+    ) -> RegionProbabilityMap:
+        """Collapse the cube into a 2D map over a range of heliocentric
+        distances, without re-binning the observations
+
+        Params
+        ------
+        distance_range: tuple[float, float] | None {default None}
+            Heliocentric distances (AU) to include. Only whole distance bins
+            are included, those with centres within this range. If None, all
+            distances are included.
+
+        Returns
+        -------
+        RegionProbabilityMap
+        """
+
+        if distance_range is None:
+            included = slice(None)
+        else:
+            centres = (self.distance_edges[:-1] + self.distance_edges[1:]) / 2
+            included = (centres >= distance_range[0]) & (centres <= distance_range[1])
+
+        return RegionProbabilityMap(
+            self.x_edges,
+            self.cyl_edges,
+            np.sum(self.counts[..., included], axis=-1),
+            self.region_names,
+            self.sample_interval,
+        )
+
+
+def probabilities_at(
+    x, cyl, probability_map: RegionProbabilityMap, interpolation: str = "nearest"
+) -> np.ndarray:
+    """Look up region probabilities at arbitrary positions, without the need
+    for a spacecraft
+
+    Params
+    ------
+    x: array-like
+        X MSM' positions (radii)
+
+    cyl: array-like
+        CYL MSM' positions (radii)
+
+    probability_map: RegionProbabilityMap
+        Map to look the positions up in
+
+    interpolation: str {default "nearest"}
+        See RegionProbabilityMap.probabilities_at()
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (N, n_regions), ordered as probability_map.region_names.
+        Positions outside of the map are nan.
+    """
+
+    return probability_map.probabilities_at(x, cyl, interpolation)
@@ -0,0 +1,137 @@
+"""
+Parallel computation of spacecraft positions over a process pool
+"""
+
+import concurrent.futures
+import math
+import multiprocessing
+import pathlib
+
+import numpy as np
+import planetary_coverage as pc
+import spiceypy as spice
+
+from wamms.kernels import KernelSession
+from wamms.times import datetime64_to_et
+
+# Each worker process keeps its own kernel session open for its lifetime.
+_worker_session: KernelSession | None = None
+
+
+def _initialise_worker(metakernel: str | pathlib.Path | pc.MetaKernel):
+    global _worker_session
+    _worker_session = KernelSession(metakernel).open()
+
+
+def _chunk_positions(target: str, frame: str, times: np.ndarray) -> np.ndarray:
+    positions, _ = spice.spkpos(
+        target, datetime64_to_et(times), frame, "NONE", "MERCURY"
+    )
+
+    return positions
+
+
+class ProcessPool:
+    """A pool of worker processes for computing positions, each of which
+    loads the kernels once and keeps them loaded for the lifetime of the
+    pool.
+
+    SPICE is not thread-safe, so we use separate processes. Processes are
+    spawned rather than forked, as forked processes would share the parent's
+    open kernel file handles. Starting the workers and loading their kernels
+    is slow, so a pool should be kept open across many queries, e.g. with
+    spacecraft.open(processes=N), or used as a context manager:
+
+        with ProcessPool(metakernel, 4) as pool:
+            ...
+
+    Params
+    ------
+    metakernel: str | pathlib.Path | pc.MetaKernel
+        The metakernel to load in each worker
+
+    processes: int
+        Number of worker processes
+    """
+
+    def __init__(self, metakernel: str | pathlib.Path | pc.MetaKernel, processes: int):
+        self.metakernel = metakernel
+        self.processes = processes
+        self.executor: concurrent.futures.ProcessPoolExecutor | None = None
+
+    def open(self):
+        """Start the worker processes"""
+
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialise_worker,
+                initargs=(self.metakernel,),
+            )
+
+        return self
+
+    def close(self):
+        """Shut down the worker processes"""
+
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def positions(
+        self, target: str, frame: str, times: np.ndarray, chunk: int | None = None
+    ) -> np.ndarray:
+        """Compute positions (as from spice.spkpos, relative to Mercury) at
+        the given UTC times, split over the workers.
+
+        Params
+        ------
+        target: str
+            SPICE target name (e.g. "mpo")
+
+        frame: str
+            SPICE reference frame of the output positions
+
+        times: np.ndarray
+            UTC times (datetime64)
+
+        chunk: int | None {default None}
+            Number of samples computed per task. By default, the times are
+            split into four tasks per process.
+
+        Returns
+        -------
+        np.ndarray
+            Positions of shape (len(times), 3), identical to those found by
+            querying all times in serial.
+        """
+
+        if self.executor is None:
+            raise RuntimeError("The process pool is not open. Please run: open()")
+
+        n_samples = len(times)
+
+        if chunk is None:
+            chunk = max(1, math.ceil(n_samples / (4 * self.processes)))
+
+        futures = [
+            self.executor.submit(_chunk_positions, target, frame, times[i : i + chunk])
+            for i in range(0, n_samples, chunk)
+        ]
+
+        # Futures are collected in submission order, so the chunks are
+        # stitched back together chronologically.
+        chunk_positions = [future.result() for future in futures]
+
+        if len(chunk_positions) == 0:
+            return np.empty((0, 3))
+
+        return np.concatenate(chunk_positions)
+
@@ -0,0 +1,82 @@
+"""
+Vectorised conversions between UTC times and SPICE ephemeris time
+"""
+
+import datetime as dt
+
+import numpy as np
+import spiceypy as spice
+
+__all__ = ["time_grid", "datetime64_to_et"]
+
+
+def time_grid(start_time: dt.datetime, n_samples: int, res: dt.timedelta) -> np.ndarray:
+    """Create the evenly spaced UTC time grid start_time + i * res, for i in
+    range(n_samples), without building a list of datetime objects.
+
+    Returns
+    -------
+    np.ndarray
+        Times as datetime64[ns]
+    """
+
+    return np.datetime64(start_time, "ns") + np.arange(n_samples) * np.timedelta64(
+        res, "ns"
+    )
+
+
+def datetime64_to_et(times) -> np.ndarray:
+    """Convert UTC times to ephemeris time (TDB seconds past J2000), as
+    spice.datetime2et would, but vectorised.
+
+    spice.datetime2et converts each time through a string, which is very slow
+    for large arrays. Instead, we only convert the UTC midnight at the start
+    and end of each day containing a sample. Within a day, ET advances
+    uniformly with UTC, apart from the tiny periodic TDB - TT term (< 2 ms
+    over a year), which we interpolate linearly. Leap seconds are always
+    inserted at the end of a UTC day, so they show up as an integer number of
+    extra seconds between consecutive midnights, and are not interpolated.
+
+    A leapseconds kernel must be loaded.
+
+    Params
+    ------
+    times: array-like
+        UTC times, convertible to datetime64[ns]
+
+    Returns
+    -------
+    np.ndarray
+        Ephemeris times, the same shape as times
+    """
+
+    times = np.asarray(times, dtype="datetime64[ns]")
+
+    if times.size == 0:
+        return np.zeros(times.shape)
+
+    days = times.astype("datetime64[D]")
+    unique_days, day_indices = np.unique(days, return_inverse=True)
+
+    # Only these midnights need to go through SPICE
+    midnights = np.union1d(unique_days, unique_days + 1)
+    midnight_ets = spice.datetime2et(
+        midnights.astype("datetime64[us]").astype(dt.datetime).tolist()
+    )
+
+    day_start_ets = midnight_ets[np.searchsorted(midnights, unique_days)]
+    day_end_ets = midnight_ets[np.searchsorted(midnights, unique_days + 1)]
+
+    day_lengths = day_end_ets - day_start_ets
+    leap_seconds = np.round(day_lengths - 86400)
+
+    # How many ET seconds pass per UTC second within each day (excluding any
+    # leap second at the end of the day).
+    rates = (day_lengths - leap_seconds) / 86400
+
+    seconds_into_day = (times - days) / np.timedelta64(1, "s")
+
+    return (
+        day_start_ets[day_indices.reshape(times.shape)]
+        + seconds_into_day * rates[day_indices.reshape(times.shape)]
+    )
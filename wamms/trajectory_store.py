@@ -0,0 +1,318 @@
+"""
+Storage of trajectory information as sorted, non-overlapping chunks
+"""
+
+import bisect
+
+import numpy as np
+import pandas as pd
+
+
+class TrajectoryStore:
+    """A store of trajectory information, made up of chunks covering
+    non-overlapping time intervals.
+
+    The store keeps track of which time intervals have been covered, and
+    with what settings (an arbitrary key, e.g. the resolution), so that new
+    requests only need to compute the missing sub-ranges. New chunks are
+    kept aside until the trajectory is next read, at which point they are
+    merged into the existing (already sorted) data in a single pass, rather
+    than re-sorting everything.
+
+    Region probabilities are also tracked per row, alongside the trajectory,
+    so that only rows added since the last lookup need to be processed.
+    """
+
+    def __init__(self):
+        # Sorted list of [start, end) intervals which have been computed
+        # (even if they contained no samples), and the key of each.
+        # Neighbouring intervals with the same key are merged.
+        self.coverage: list[tuple[np.datetime64, np.datetime64, object]] = []
+
+        self._frame: pd.DataFrame = pd.DataFrame()
+        self._pending: list[pd.DataFrame] = []
+
+        # Region probabilities for each row of self._frame, and which rows
+        # these have been found for. The key identifies how the probabilities
+        # were found (e.g. which map was used), and changing it invalidates
+        # all rows.
+        self._probabilities: np.ndarray = np.empty((0, 0))
+        self._probability_columns: list[str] = []
+        self._has_probabilities: np.ndarray = np.zeros(0, dtype=bool)
+        self._probability_key = None
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame):
+        """Create a store from an existing trajectory dataframe, which is
+        treated as covering the span from its first to last sample"""
+
+        store = cls()
+
+        if len(frame) > 0:
+            frame = frame.sort_values("Time", ignore_index=True)
+            times = frame["Time"].to_numpy(dtype="datetime64[ns]")
+            store.add(times[0], times[-1] + np.timedelta64(1, "ns"), frame)
+
+        return store
+
+    def missing(
+        self, start: np.datetime64, end: np.datetime64
+    ) -> list[tuple[np.datetime64, np.datetime64]]:
+        """Find the sub-ranges of [start, end) not yet covered
+
+        Params
+        ------
+        start: np.datetime64
+            Start of the requested range
+
+        end: np.datetime64
+            End of the requested range (exclusive)
+
+        Returns
+        -------
+        list[tuple[np.datetime64, np.datetime64]]
+            Uncovered [start, end) intervals, in chronological order
+        """
+
+        gaps = []
+        cursor = start
+
+        for covered_start, covered_end, _ in self.coverage:
+            if covered_end <= cursor:
+                continue
+            if covered_start >= end:
+                break
+
+            if covered_start > cursor:
+                gaps.append((cursor, covered_start))
+
+            cursor = max(cursor, covered_end)
+
+        if cursor < end:
+            gaps.append((cursor, end))
+
+        return gaps
+
+    def overlapping(
+        self, start: np.datetime64, end: np.datetime64
+    ) -> list[tuple[np.datetime64, np.datetime64, object]]:
+        """Find the covered intervals within [start, end), clipped to it
+
+        Returns
+        -------
+        list[tuple[np.datetime64, np.datetime64, object]]
+            The start, end, and key of each, in chronological order
+        """
+
+        return [
+            (max(covered_start, start), min(covered_end, end), key)
+            for covered_start, covered_end, key in self.coverage
+            if covered_start < end and covered_end > start
+        ]
+
+    def add(
+        self,
+        start: np.datetime64,
+        end: np.datetime64,
+        chunk: pd.DataFrame,
+        key=None,
+    ):
+        """Add a chunk of trajectory information covering [start, end)
+
+        Params
+        ------
+        start: np.datetime64
+            Start of the interval covered by the chunk
+
+        end: np.datetime64
+            End of the interval covered by the chunk (exclusive)
+
+        chunk: pd.DataFrame
+            Trajectory information, sorted by "Time", with all samples within
+            [start, end). This interval must not overlap any previously added.
+
+        key: {default None}
+            Identifies how the chunk was computed, see overlapping()
+        """
+
+        if self.missing(start, end) != [(start, end)]:
+            raise ValueError("Chunk overlaps existing trajectory information")
+
+        # Insert the interval, merging with any adjacent intervals with the
+        # same key
+        index = bisect.bisect_left([interval[0] for interval in self.coverage], start)
+        self.coverage.insert(index, (start, end, key))
+
+        merged = []
+        for interval in self.coverage:
+            if (
+                len(merged) > 0
+                and interval[0] <= merged[-1][1]
+                and interval[2] == merged[-1][2]
+            ):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], interval[1]), key)
+            else:
+                merged.append(interval)
+        self.coverage = merged
+
+        if len(chunk) > 0:
+            self._pending.append(chunk)
+
+    def remove(self, start: np.datetime64, end: np.datetime64):
+        """Remove all trajectory information within [start, end), and mark
+        it as no longer covered
+
+        Params
+        ------
+        start: np.datetime64
+            Start of the interval to remove
+
+        end: np.datetime64
+            End of the interval to remove (exclusive)
+        """
+
+        self._merge()
+
+        if len(self._frame) > 0:
+            times = self._frame["Time"].to_numpy(dtype="datetime64[ns]")
+            keep = (times < start) | (times >= end)
+
+            self._frame = self._frame[keep].reset_index(drop=True)
+            self._probabilities = self._probabilities[keep]
+            self._has_probabilities = self._has_probabilities[keep]
+
+        coverage = []
+        for covered_start, covered_end, key in self.coverage:
+            if covered_end <= start or covered_start >= end:
+                coverage.append((covered_start, covered_end, key))
+                continue
+
+            if covered_start < start:
+                coverage.append((covered_start, start, key))
+            if covered_end > end:
+                coverage.append((end, covered_end, key))
+
+        self.coverage = coverage
+
+    def _merge(self):
+        """Merge pending chunks into the stored dataframe"""
+
+        if len(self._pending) == 0:
+            return
+
+        pending = sorted(self._pending, key=lambda chunk: chunk["Time"].iloc[0])
+
+        # As the chunks don't overlap, each pending chunk slots into the
+        # existing data at a single position.
+        if len(self._frame) == 0:
+            times = np.array([], dtype="datetime64[ns]")
+        else:
+            times = self._frame["Time"].to_numpy(dtype="datetime64[ns]")
+
+        positions = np.searchsorted(
+            times,
+            [chunk["Time"].to_numpy(dtype="datetime64[ns]")[0] for chunk in pending],
+        )
+
+        n_columns = self._probabilities.shape[1]
+
+        frame_pieces = []
+        probability_pieces = []
+        mask_pieces = []
+        previous_position = 0
+        for position, chunk in zip(positions, pending):
+            frame_pieces += [self._frame.iloc[previous_position:position], chunk]
+
+            # New rows don't have probabilities yet
+            probability_pieces += [
+                self._probabilities[previous_position:position],
+                np.full((len(chunk), n_columns), np.nan),
+            ]
+            mask_pieces += [
+                self._has_probabilities[previous_position:position],
+                np.zeros(len(chunk), dtype=bool),
+            ]
+
+            previous_position = position
+
+        frame_pieces.append(self._frame.iloc[previous_position:])
+        probability_pieces.append(self._probabilities[previous_position:])
+        mask_pieces.append(self._has_probabilities[previous_position:])
+
+        self._frame = pd.concat(
+            [piece for piece in frame_pieces if len(piece) > 0], ignore_index=True
+        )
+        self._probabilities = np.concatenate(probability_pieces)
+        self._has_probabilities = np.concatenate(mask_pieces)
+        self._pending = []
+
+    def rows_without_probabilities(self, key) -> np.ndarray:
+        """Find which rows of self.frame do not yet have region
+        probabilities
+
+        Params
+        ------
+        key:
+            Identifies how probabilities are found, e.g. the map used. If this
+            differs from the key of the stored probabilities, all rows are
+            returned.
+
+        Returns
+        -------
+        np.ndarray
+            Row indices
+        """
+
+        self._merge()
+
+        if key != self._probability_key:
+            return np.arange(len(self._frame))
+
+        return np.flatnonzero(~self._has_probabilities)
+
+    def set_probabilities(self, rows: np.ndarray, probabilities: pd.DataFrame, key):
+        """Store region probabilities for some rows of self.frame
+
+        Params
+        ------
+        rows: np.ndarray
+            Row indices, as from rows_without_probabilities()
+
+        probabilities: pd.DataFrame
+            Region probabilities for these rows
+
+        key:
+            See rows_without_probabilities()
+        """
+
+        self._merge()
+
+        columns = list(probabilities.columns)
+
+        if key != self._probability_key or columns != self._probability_columns:
+            self._probabilities = np.full((len(self._frame), len(columns)), np.nan)
+            self._has_probabilities = np.zeros(len(self._frame), dtype=bool)
+            self._probability_columns = columns
+            self._probability_key = key
+
+        self._probabilities[rows] = probabilities.to_numpy(dtype=float)
+        self._has_probabilities[rows] = True
+
+    @property
+    def probabilities(self) -> pd.DataFrame:
+        """Region probabilities aligned with self.frame. Rows without
+        probabilities are nan."""
+
+        self._merge()
+
+        return pd.DataFrame(self._probabilities, columns=self._probability_columns)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """All trajectory information, sorted by time"""
+
+        self._merge()
+        return self._frame
+
+    def __len__(self):
+        return len(self._frame) + sum(len(chunk) for chunk in self._pending)